@@ -5,7 +5,8 @@ a convenient way to store standard object types, such as string, number,
 boolean, and container object.
 
 This file contains a class ``XmlPropertyListParser`` for parse
-a property list file and get back a python native data structure.
+a property list file and get back a python native data structure,
+and ``BinaryPropertyListParser`` for binary property list files.
 
     :copyright: 2008 by Takanori Ishikawa <takanori.ishikawa@gmail.com>
     :license: MIT (See LICENSE file for more details)
@@ -28,9 +29,93 @@ class XmlPropertyListParser(object):
         :copyright: 2008 by Takanori Ishikawa <takanori.ishikawa@gmail.com>
         :license: MIT License
 
+    If ``sidecar`` is true, ``parse()`` of a file stores the result in a
+    sidecar cache file (``<file>.cache``, or in the directory ``sidecar``
+    if it is a string), and loads it instead of parsing while the file's
+    modification time and size are not changed. The cache file is written
+    with ``marshal``, and only property list objects are read from it.
+
+    If ``intern_keys`` is true, equal dictionary keys in a property list
+    share a single string object, and so do equal ``<string>`` values up
+    to ``intern_strings`` characters long. This saves much memory for
+    repetitive property lists, like iTunes Library. After ``parse()``,
+    ``interned`` is the number of strings replaced by shared ones, and
+    ``interned_bytes`` is the estimated memory they took.
+
+    ``<date>`` is returned as a naive ``datetime`` in UTC by default.
+    If ``dates`` is ``'aware'``, it has ``tzinfo`` of UTC, and if
+    ``'epoch'``, it is the ``int`` seconds since 1970-01-01 instead.
+    Up to ``date_cache`` decoded dates are cached, since the same
+    timestamps often repeat.
+
+    ``<data>`` is returned as the decoded ``str`` by default. If ``data``
+    is ``'lazy'``, it is a ``Data`` object which decodes the contents on
+    access, and if ``'base64'``, a ``memoryview`` of the base64 text
+    (with whitespace, if any). If the base64 text is longer than
+    ``data_threshold``, it is decoded in pieces to a file object which
+    ``data_sink()`` returns (``tempfile.TemporaryFile()`` by default),
+    and the file rewound to the start is returned instead.
+
+    If ``arrays`` is ``'array'``, an ``<array>`` of only ``<integer>``
+    (which fit in a C ``long``) or only ``<real>`` is returned as a compact
+    ``array.array`` of ``'l'`` or ``'d'``, and if ``'numpy'``, as a NumPy
+    array of ``int64`` or ``float64`` (``array.array`` if NumPy is not
+    available). ``parse(lazy=True)`` ignores ``arrays``, since every
+    container is a ``LazyDict`` or ``LazyList``.
+
+    If ``stats`` is true, ``parse()`` collects statistics of the parse
+    into ``ParseStats``, which is ``stats`` of the parser afterwards.
+
+    For untrusted input, the parse can be limited by ``max_depth``
+    (nesting of containers), ``max_elements`` (number of elements),
+    ``max_string`` (characters of a text element other than ``<data>``),
+    ``max_data`` (decoded bytes of a ``<data>``) and ``max_bytes`` (size
+    of the input). ``PropertyListParseError`` is raised as soon as
+    a limit is exceeded.
+
     .. _Property List: http://developer.apple.com/documentation/Cocoa/Conceptual/PropertyLists/
     """
 
+    def __init__(self, sidecar=None, intern_keys=False, intern_strings=0,
+                 dates='naive', date_cache=1024, data='bytes', data_threshold=None,
+                 data_sink=None, arrays='list', stats=False, max_depth=None, max_elements=None,
+                 max_string=None, max_data=None, max_bytes=None):
+        if dates not in XmlPropertyListParser.DATE_FACTORIES:
+            raise ValueError("dates must be 'naive', 'aware' or 'epoch', but was %r" % (dates, ))
+        if data not in XmlPropertyListParser.DATA_FACTORIES:
+            raise ValueError("data must be 'bytes', 'lazy' or 'base64', but was %r" % (data, ))
+        if arrays not in XmlPropertyListParser.ARRAY_FACTORIES:
+            raise ValueError("arrays must be 'list', 'array' or 'numpy', but was %r" % (arrays, ))
+        self.__sidecar = sidecar
+        self.__intern_keys = intern_keys
+        self.__intern_strings = intern_strings
+        self.__date_factory = XmlPropertyListParser.DATE_FACTORIES[dates]
+        self.__date_cache_size = date_cache
+        self.__date_cache = {}
+        self.__data_factory = XmlPropertyListParser.DATA_FACTORIES[data]
+        self.__data_threshold = data_threshold
+        self.__data_sink = data_sink
+        self.__array_factory = XmlPropertyListParser.ARRAY_FACTORIES[arrays]
+        self.__compact_arrays = self.__array_factory is not None
+        self.__collect_stats = stats
+        self.stats = None
+        self.__limits = (max_depth, max_elements, max_string, max_data, max_bytes)
+        self.__limited = self.__limits != (None, ) * 5
+        self._reset_limits()
+        # For the parsers which decode a part of the same property list
+        # (lazy containers and parallel slices).
+        self.__options = {
+            'intern_keys': intern_keys, 'intern_strings': intern_strings,
+            'dates': dates, 'date_cache': date_cache,
+            'data': data, 'data_threshold': data_threshold, 'data_sink': data_sink,
+            'arrays': arrays,
+            'max_depth': max_depth, 'max_elements': max_elements, 'max_string': max_string,
+            'max_data': max_data, 'max_bytes': max_bytes,
+        }
+        self._reset_interned()
+        # Incremental parser being fed (see ``XmlPropertyListPushParser``)
+        self.__reader = None
+
     def _assert(self, test, message):
         if not test:
             raise PropertyListParseError(message)
@@ -57,6 +142,7 @@ class XmlPropertyListParser(object):
 
     def startDocument(self):
         self.__stack = []
+        self.__array_slots = []
         self.__plist = self.__key = self.__characters = None
         # For reducing runtime type checking, 
         # the parser caches top level object type.
@@ -69,6 +155,8 @@ class XmlPropertyListParser(object):
             "multiple objects at top level.")
 
     def startElement(self, name, attributes):
+        if self.__limited:
+            self._check_element(name)
         if name in XmlPropertyListParser.START_CALLBACKS:
             XmlPropertyListParser.START_CALLBACKS[name](self, name, attributes)
         if name in XmlPropertyListParser.PARSE_CALLBACKS:
@@ -80,6 +168,8 @@ class XmlPropertyListParser(object):
         if name in XmlPropertyListParser.PARSE_CALLBACKS:
             # Creates character string from buffered characters.
             content = ''.join(self.__characters)
+            if self.__limited:
+                self._check_text(name, content)
             # For compatibility with ``xml.etree`` and ``plistlib``,
             # convert text string to ascii, if possible
             try:
@@ -92,6 +182,8 @@ class XmlPropertyListParser(object):
     def characters(self, content):
         if self.__characters is not None:
             self.__characters.append(content)
+            if self.__limited:
+                self._check_characters(content)
 
     # ------------------------------------------------
     # XmlPropertyListParser private
@@ -120,6 +212,130 @@ class XmlPropertyListParser(object):
         self.__stack.pop()
         self.__in_dict = self.__stack and isinstance(self.__stack[-1], dict)
 
+    # ------------------------------------------------
+    # XmlPropertyListParser private: event streaming
+    # ------------------------------------------------
+    # These methods shadow ``_push_value``, ``_push_stack`` and ``_pop_stack``
+    # on the parser which ``iterparse()`` creates for itself, so the
+    # callbacks report events instead of filling containers. The stack holds only
+    # empty containers, which keeps ``__in_dict`` and error checks working.
+    #
+    # With ``select`` patterns, only selected objects are reported (and
+    # ``'start'`` of containers which may contain them, if ``__starts``).
+    # A selected container is built as usual (``__capture`` is the stack
+    # depth it started at) and reported as a single value when it ends.
+    def _emit_value(self, value):
+        capture = self.__capture
+        if capture is not None and len(self.__stack) > capture:
+            XmlPropertyListParser._push_value(self, value)
+            return
+
+        if not self.__stack:
+            self._assert(self.__plist is None, "Multiple objects at top level")
+            self.__plist = value
+            path = ()
+        elif self.__in_dict:
+            k = self.__key
+            if k is None:
+                raise PropertyListParseError("Missing key for dictionary.")
+            self.__key = None
+            path = self.__path[-1] + (k,)
+        else:
+            i = self.__indices[-1]
+            self.__indices[-1] = i + 1
+            path = self.__path[-1] + (i,)
+
+        if type(value) in (dict, list):
+            # reported by _emit_push_stack()
+            self.__pending = path
+        else:
+            self.__events.append(('value', path, value))
+
+    def _emit_push_stack(self, value):
+        capture = self.__capture
+        if capture is not None and len(self.__stack) > capture:
+            XmlPropertyListParser._push_stack(self, value)
+            return
+
+        XmlPropertyListParser._push_stack(self, value)
+        path = self.__pending
+        self.__path.append(path)
+        self.__indices.append(0)
+        if self.__select is None:
+            self.__events.append(('start', path, type(value)))
+        else:
+            self.__alive.append(self.__pending_alive)
+            if self.__starts:
+                self.__events.append(('start', path, type(value)))
+
+    def _emit_pop_stack(self):
+        value = self.__stack[-1]
+        XmlPropertyListParser._pop_stack(self)
+        capture = self.__capture
+        if capture is not None:
+            depth = len(self.__stack)
+            if depth > capture:
+                return
+            elif depth == capture:
+                self.__capture = None
+                self.__events.append(('value', self.__path[-1], value))
+
+        self.__indices.pop()
+        path = self.__path.pop()
+        if self.__select is None:
+            self.__events.append(('end', path, type(value)))
+        else:
+            self.__alive.pop()
+
+    def _compile_select(self, patterns):
+        import re, fnmatch
+
+        compiled = []
+        for pattern in patterns:
+            if isinstance(pattern, basestring):
+                pattern = pattern and pattern.split('/') or ()
+            compiled.append(tuple([
+                re.compile(fnmatch.translate('%s' % c)).match for c in pattern]))
+        return compiled
+
+    def _select_next(self, name):
+        # Returns True if the value element ``name`` which is about to
+        # start may contain selected objects. Otherwise, consumes its key
+        # (or array index) so that the caller can skip the element.
+        stack = self.__stack
+        if not stack:
+            depth, alive = 0, self.__select
+        else:
+            depth = len(self.__path[-1])
+            if self.__in_dict:
+                component = self.__key
+                if component is None:
+                    raise PropertyListParseError("Missing key for dictionary.")
+            else:
+                component = '%d' % self.__indices[-1]
+            alive = [p for p in self.__alive[-1] if p[depth](component)]
+            depth += 1
+
+        container = name == 'dict' or name == 'array'
+        for pattern in alive:
+            if len(pattern) == depth:
+                if container:
+                    self.__capture = len(stack)
+                return True
+        if alive and container:
+            self.__pending_alive = alive
+            return True
+
+        if not stack:
+            self._assert(self.__plist is None, "Multiple objects at top level")
+            # the top level object is skipped.
+            self.__plist = name
+        elif self.__in_dict:
+            self.__key = None
+        else:
+            self.__indices[-1] += 1
+        return False
+
     def _start_plist(self, name, attrs):
         self._assert(not self.__stack and self.__plist is None, "<plist> more than once.")
         self._assert(attrs.get('version', '1.0') == '1.0',
@@ -127,6 +343,12 @@ class XmlPropertyListParser(object):
 
     def _start_array(self, name, attrs):
         v = list()
+        if self.__compact_arrays:
+            # where the list is stored, to be replaced by ``_compact_array``
+            parent = None
+            if self.__stack:
+                parent = self.__stack[-1]
+            self.__array_slots.append((parent, self.__key))
         self._push_value(v)
         self._push_stack(v)
 
@@ -137,6 +359,10 @@ class XmlPropertyListParser(object):
 
     def _end_array(self, name):
         self._pop_stack()
+        # ``name`` is None for the container of ``_load_lazy``, which is
+        # the list of a ``LazyList``.
+        if self.__compact_arrays and name is not None:
+            self._compact_array()
 
     def _end_dict(self, name):
         if self.__key is not None:
@@ -152,14 +378,64 @@ class XmlPropertyListParser(object):
     def _parse_key(self, name, content):
         if not self.__in_dict:
             raise PropertyListParseError("<key> element must be in <dict> element.")
+        if self.__intern_keys:
+            content = self._intern(content)
         self.__key = content
 
     def _parse_string(self, name, content):
+        if len(content) <= self.__intern_strings:
+            content = self._intern(content)
         self._push_value(content)
 
-    def _parse_data(self, name, content):
+    def _bytes_data(content):
         import base64
-        self._push_value(base64.b64decode(content))
+        return base64.b64decode(content)
+
+    def _lazy_data(content):
+        return Data(content)
+
+    def _base64_data(content):
+        return memoryview(content)
+
+    DATA_FACTORIES = {
+        'bytes': _bytes_data,
+        'lazy': _lazy_data,
+        'base64': _base64_data,
+    }
+    del _bytes_data, _lazy_data, _base64_data
+
+    # Characters of the base64 text decoded at once to ``data_sink``
+    DATA_PIECE_SIZE = 64 * 1024
+
+    def _decode_data_to_sink(self, content):
+        import binascii
+        sink = self.__data_sink
+        if sink is None:
+            from tempfile import TemporaryFile as sink
+        fout = sink()
+        piece_size = XmlPropertyListParser.DATA_PIECE_SIZE
+        # Each piece is decoded without whitespace, and the characters
+        # which don't make a 4 character group are left for the next.
+        rest = ''
+        for i in xrange(0, len(content), piece_size):
+            piece = rest + ''.join(content[i:i + piece_size].split())
+            n = len(piece) & ~3
+            rest = piece[n:]
+            try:
+                fout.write(binascii.a2b_base64(piece[:n]))
+            except binascii.Error, e:
+                raise PropertyListParseError("Failed to decode <data>: %s" % e)
+        self._assert(not rest, "Incorrect padding of <data>")
+        if hasattr(fout, 'seek'):
+            fout.seek(0)
+        return fout
+
+    def _parse_data(self, name, content):
+        threshold = self.__data_threshold
+        if threshold is not None and len(content) > threshold:
+            self._push_value(self._decode_data_to_sink(content))
+        else:
+            self._push_value(self.__data_factory(content))
 
     # http://www.apple.com/DTDs/PropertyList-1.0.dtd says:
     #
@@ -169,26 +445,66 @@ class XmlPropertyListParser(object):
     import re
     DATETIME_PATTERN = re.compile(r"(?P<year>\d\d\d\d)(?:-(?P<month>\d\d)(?:-(?P<day>\d\d)(?:T(?P<hour>\d\d)(?::(?P<minute>\d\d)(?::(?P<second>\d\d))?)?)?)?)?Z$")
 
-    def _parse_date(self, name, content):
-        import datetime
-        
-        units = ('year', 'month', 'day', 'hour', 'minute', 'second', )
-        pattern = XmlPropertyListParser.DATETIME_PATTERN
-        match = pattern.match(content)
-        if not match:
-            raise PropertyListParseError("Failed to parse datetime '%s'" % content)
-
-        groups, components = match.groupdict(), []
-        for key in units:
-            value = groups[key]
-            if value is None:
-                break
-            components.append(int(value))
-        while len(components) < 3:
-            components.append(1)
+    import datetime
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    def _naive_date(components):
+        return XmlPropertyListParser.datetime.datetime(*components)
+
+    def _aware_date(components):
+        return XmlPropertyListParser.datetime.datetime(*components).replace(tzinfo=_UTC())
+
+    def _epoch_date(components):
+        delta = XmlPropertyListParser.datetime.datetime(*components) - XmlPropertyListParser.EPOCH
+        return delta.days * 86400 + delta.seconds
+
+    DATE_FACTORIES = {
+        'naive': _naive_date,
+        'aware': _aware_date,
+        'epoch': _epoch_date,
+    }
+    del _naive_date, _aware_date, _epoch_date
 
-        d = datetime.datetime(*components)
-        self._push_value(d)
+    def _decode_date(self, content):
+        # The full form is sliced at fixed offsets, and truncated forms
+        # are matched with ``DATETIME_PATTERN``.
+        if len(content) == 20 and content[19] == 'Z' and \
+           content[4] == content[7] == '-' and content[10] == 'T' and \
+           content[13] == content[16] == ':' and \
+           (content[:4] + content[5:7] + content[8:10] +
+            content[11:13] + content[14:16] + content[17:19]).isdigit():
+            components = (int(content[:4]), int(content[5:7]), int(content[8:10]),
+                          int(content[11:13]), int(content[14:16]), int(content[17:19]))
+        else:
+            units = ('year', 'month', 'day', 'hour', 'minute', 'second', )
+            pattern = XmlPropertyListParser.DATETIME_PATTERN
+            match = pattern.match(content)
+            if not match:
+                raise PropertyListParseError("Failed to parse datetime '%s'" % content)
+
+            groups, components = match.groupdict(), []
+            for key in units:
+                value = groups[key]
+                if value is None:
+                    break
+                components.append(int(value))
+            while len(components) < 3:
+                components.append(1)
+        try:
+            return self.__date_factory(components)
+        except ValueError, e:
+            raise PropertyListParseError("Failed to parse datetime '%s': %s" % (content, e))
+
+    def _parse_date(self, name, content):
+        cache = self.__date_cache
+        value = cache.get(content)
+        if value is None:
+            value = self._decode_date(content)
+            if self.__date_cache_size:
+                if len(cache) >= self.__date_cache_size:
+                    cache.clear()
+                cache[content] = value
+        self._push_value(value)
 
     def _parse_real(self, name, content):
         self._push_value(float(content))
@@ -196,6 +512,73 @@ class XmlPropertyListParser(object):
     def _parse_integer(self, name, content):
         self._push_value(int(content))
 
+    # ------------------------------------------------
+    # XmlPropertyListParser private: numeric arrays
+    # ------------------------------------------------
+    # Arrays are built as lists, and converted when they end. Every element
+    # has been decoded by then, so the types tell if the list is numeric.
+    def _numeric_typecode(values):
+        # Returns the ``array`` typecode for ``values``, or ``None`` if
+        # they are not all ``int`` or all ``float``.
+        if not values:
+            return None
+        types = set(map(type, values))
+        if not types - set([int, long]):
+            return 'l'
+        elif types == set([float]):
+            return 'd'
+        return None
+
+    def _array_array(values):
+        import array
+        typecode = XmlPropertyListParser._numeric_typecode(values)
+        if typecode is None:
+            return values
+        try:
+            return array.array(typecode, values)
+        except OverflowError:
+            return values
+
+    def _numpy_array(values):
+        try:
+            import numpy
+        except ImportError:
+            return XmlPropertyListParser._array_array(values)
+        typecode = XmlPropertyListParser._numeric_typecode(values)
+        if typecode is None:
+            return values
+        try:
+            return numpy.array(values, dtype=typecode == 'l' and numpy.int64 or numpy.float64)
+        except OverflowError:
+            return values
+
+    ARRAY_FACTORIES = {
+        'list': None,
+        'array': _array_array,
+        'numpy': _numpy_array,
+    }
+    _numeric_typecode = staticmethod(_numeric_typecode)
+    _array_array = staticmethod(_array_array)
+    del _numpy_array
+
+    def _compact_array(self):
+        parent, key = self.__array_slots.pop()
+        if parent is None:
+            values = self.__plist
+        elif key is None:
+            values = parent[-1]
+        else:
+            values = parent[key]
+        compact = self.__array_factory(values)
+        if compact is values:
+            return
+        if parent is None:
+            self.__plist = compact
+        elif key is None:
+            parent[-1] = compact
+        else:
+            parent[key] = compact
+
     START_CALLBACKS = {
         'plist': _start_plist,
         'array': _start_array,
@@ -218,6 +601,336 @@ class XmlPropertyListParser(object):
         'integer': _parse_integer,
     }
 
+    # ------------------------------------------------
+    # XmlPropertyListParser private: interning
+    # ------------------------------------------------
+    # The intern table lives as long as a property list is parsed (or as
+    # long as a lazy property list, which is decoded by its own parser),
+    # so the strings are released with the property list.
+    def _reset_interned(self):
+        import sys
+        self.__interned = {}
+        self.__sizeof = sys.getsizeof
+        self.interned = self.interned_bytes = 0
+
+    def _intern(self, value):
+        shared = self.__interned.setdefault(value, value)
+        if shared is not value:
+            self.interned += 1
+            self.interned_bytes += self.__sizeof(value)
+        return shared
+
+    # ------------------------------------------------
+    # XmlPropertyListParser private: resource limits
+    # ------------------------------------------------
+    # Every engine calls ``_check_element`` when an element starts, and
+    # ``_check_text`` with the text of a text element before decoding it.
+    # The engines which report text in pieces also call
+    # ``_check_characters``, which raises as soon as the text can't be in
+    # the limit, before the whole text is buffered. ``max_bytes`` is
+    # checked by reading the input through ``_LimitedStream``.
+    def _reset_limits(self):
+        self.__elements = 0
+        self.__text_size = 0
+        self.__text_bound = None
+        self.__text_is_data = False
+
+    def _check_element(self, name, skipped=0):
+        # ``skipped`` is the number of open elements which are not on the
+        # stack (skipped by ``select``).
+        max_depth, max_elements, max_string, max_data, max_bytes = self.__limits
+        self.__elements += 1
+        if max_elements is not None and self.__elements > max_elements:
+            raise PropertyListParseError("More than %d elements" % max_elements)
+        if name == 'dict' or name == 'array':
+            if max_depth is not None and len(self.__stack) + skipped >= max_depth:
+                raise PropertyListParseError(
+                    "Containers nested more than %d levels" % max_depth)
+        self.__text_size = 0
+        self.__text_is_data = name == 'data'
+        self.__text_bound = None
+        if name == 'data':
+            if max_data is not None:
+                # 4 characters of base64 for every 3 bytes
+                self.__text_bound = (max_data + 2) // 3 * 4
+        elif max_string is not None:
+            # UTF-8 takes up to 4 bytes per character.
+            self.__text_bound = max_string * 4
+
+    def _check_characters(self, text):
+        bound = self.__text_bound
+        if bound is not None:
+            if self.__text_is_data:
+                self.__text_size += len(''.join(text.split()))
+            else:
+                self.__text_size += len(text)
+            if self.__text_size > bound:
+                self._raise_text_limit(self.__text_is_data)
+
+    def _check_text(self, name, content):
+        max_depth, max_elements, max_string, max_data, max_bytes = self.__limits
+        if name == 'data':
+            if max_data is not None:
+                content = ''.join(content.split())
+                size = len(content) // 4 * 3 - content[-2:].count('=')
+                if size > max_data:
+                    self._raise_text_limit(True)
+        elif max_string is not None and len(content) > max_string:
+            if isinstance(content, str) and \
+               XmlPropertyListParser.NON_ASCII_PATTERN.search(content) is not None:
+                content = content.decode('utf-8')
+            if len(content) > max_string:
+                self._raise_text_limit(False)
+
+    def _raise_text_limit(self, data):
+        max_depth, max_elements, max_string, max_data, max_bytes = self.__limits
+        if data:
+            raise PropertyListParseError("<data> larger than %d bytes" % max_data)
+        raise PropertyListParseError("Text longer than %d characters" % max_string)
+
+    def _limit_input(self, xml_input):
+        # Returns ``xml_input`` which raises if it is larger than ``max_bytes``.
+        max_bytes = self.__limits[4]
+        if max_bytes is None:
+            return xml_input
+        if isinstance(xml_input, basestring):
+            self._assert(len(xml_input) <= max_bytes, "Input larger than %d bytes" % max_bytes)
+            return xml_input
+        return _LimitedStream(self._to_stream(xml_input), max_bytes)
+
+    def _limit_expat(self, parse_start, parse_end, texts, xml_input):
+        # Returns the element handlers and the character data handler of
+        # ``_parse_using_expat`` wrapped to check the limits, and the input.
+        # Checks are done inline with cheap bounds, and ``_check_element``
+        # and ``_check_text`` are called to decide (and raise) only when
+        # a bound is exceeded.
+        import sys
+        max_depth, max_elements, max_string, max_data, max_bytes = self.__limits
+        limit_texts = max_string is not None or max_data is not None
+        if max_depth is None:
+            max_depth = sys.maxint
+        if max_elements is None:
+            max_elements = sys.maxint
+        # Text in UTF-8 bytes, and base64 text without whitespace, can't be
+        # in the limit if it is longer than these.
+        if max_string is None:
+            max_string = string_bound = sys.maxint
+        else:
+            string_bound = max_string * 4
+        if max_data is None:
+            max_data = data_bound = sys.maxint
+        else:
+            data_bound = (max_data + 2) // 3 * 4
+        text_names = XmlPropertyListParser.PARSE_CALLBACKS
+        stack = self.__stack
+        # the number of elements, the name of the text element being parsed,
+        # the size of its text, and the size to check it again. Whitespace
+        # outside text elements is never checked.
+        state = [0, None, 0, sys.maxint]
+
+        def start(name, attrs):
+            state[0] = elements = state[0] + 1
+            if elements > max_elements or \
+               len(stack) >= max_depth and (name == 'dict' or name == 'array'):
+                self.__elements = elements - 1
+                self._check_element(name)
+            if name in text_names:
+                state[1], state[2] = name, 0
+                state[3] = name == 'data' and data_bound or string_bound
+            parse_start(name, attrs)
+
+        def end(name):
+            if name in text_names:
+                size = state[2]
+                if name == 'data' and size // 4 * 3 > max_data or \
+                   name != 'data' and size > max_string:
+                    self._check_text(name, ''.join(texts))
+            state[1], state[2], state[3] = None, 0, sys.maxint
+            parse_end(name)
+
+        def characters(text):
+            texts.append(text)
+            state[2] = size = state[2] + len(text)
+            if size > state[3]:
+                if state[1] != 'data':
+                    self._raise_text_limit(False)
+                # Whitespace isn't base64. The rest of the text can't
+                # exceed the limit before growing by the margin.
+                chars = len(''.join(''.join(texts).split()))
+                if chars > data_bound:
+                    self._raise_text_limit(True)
+                state[3] = size + data_bound - chars
+
+        if not limit_texts:
+            end, characters = parse_end, texts.append
+            if max_depth == max_elements == sys.maxint:
+                start = parse_start
+        return start, end, characters, self._limit_input(xml_input)
+
+    # ------------------------------------------------
+    # XmlPropertyListParser private: lazy containers
+    # ------------------------------------------------
+    # ``parse(lazy=True)`` scans only container tags to record where every
+    # container ends (``__ends``), and returns ``LazyDict`` or ``LazyList``.
+    # A proxy holds the span of its contents and calls ``_load_lazy`` on
+    # first access, which decodes its own children and creates proxies for
+    # nested containers, skipping over them by the recorded offsets.
+    CONTAINER_PATTERN = re.compile(
+        r'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<(/?)(dict|array)\s*(/?)>', re.S)
+    ELEMENT_PATTERN = re.compile(r'''
+        (?:\s+|<!--.*?-->)*
+        (?:
+          <(?P<container>dict|array)\s*>
+        | <(?P<empty>dict|array|true|false|key|string|data)\s*/>
+        | <(?P<element>key|string|integer|real|date|data)\s*>
+              (?P<content>(?:[^<]+|<!\[CDATA\[.*?\]\]>|<!--.*?-->)*)
+          </(?P=element)\s*>
+        )
+    ''', re.S | re.X)
+    ROOT_PATTERN = re.compile(r'<plist(?:\s[^>]*)?>', re.S)
+    END_PATTERN = re.compile(r'(?:\s+|<!--.*?-->)*</plist\s*>', re.S)
+    ENCODING_PATTERN = re.compile(r'''<\?xml[^>]*encoding\s*=\s*["']([\w.:\-]+)["']''')
+    TEXT_PATTERN = re.compile(
+        r'<!\[CDATA\[(.*?)\]\]>|&(#x[0-9A-Fa-f]+|#[0-9]+|\w+);|<!--.*?-->', re.S)
+    NON_ASCII_PATTERN = re.compile(r'[\x80-\xff]')
+    ENTITIES = {'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"', 'apos': "'"}
+
+    def _unescape_lazy_text(self, match):
+        cdata, entity = match.groups()
+        if cdata is not None:
+            return cdata
+        elif entity is None:
+            # comment
+            return ''
+        elif entity[0] != '#':
+            if entity not in XmlPropertyListParser.ENTITIES:
+                raise PropertyListParseError("Undefined entity '&%s;'" % entity)
+            return XmlPropertyListParser.ENTITIES[entity]
+        elif entity[1] == 'x':
+            return unichr(int(entity[2:], 16))
+        return unichr(int(entity[1:]))
+
+    def _lazy_text(self, content):
+        # Decodes the text content of an element in the same way as
+        # ``xml.etree``: ``str`` for ASCII text, ``unicode`` otherwise.
+        if isinstance(content, str) and \
+           XmlPropertyListParser.NON_ASCII_PATTERN.search(content) is not None:
+            content = content.decode(self.__encoding)
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        if '&' in content or '<' in content:
+            content = XmlPropertyListParser.TEXT_PATTERN.sub(self._unescape_lazy_text, content)
+        if isinstance(content, unicode):
+            try:
+                content = content.encode('ascii')
+            except UnicodeError:
+                pass
+        return content
+
+    def _scan_lazy(self, contents):
+        # Returns the proxy for the top level object, or ``None`` if it is
+        # not a container.
+        match = XmlPropertyListParser.ENCODING_PATTERN.match(contents)
+        self.__encoding = match and match.group(1).lower() or 'utf-8'
+        if isinstance(contents, str) and (
+           contents[:2] in ('\xfe\xff', '\xff\xfe') or self.__encoding.startswith('utf-16')):
+            # Offsets are meaningless in the encoding which is not
+            # a superset of ASCII.
+            contents = contents.decode(self.__encoding)
+        elif isinstance(contents, str) and contents.startswith('\xef\xbb\xbf'):
+            contents = contents[3:]
+        self.__contents = contents
+
+        ends, stack = {}, []
+        max_depth = self.__limits[0]
+        for match in XmlPropertyListParser.CONTAINER_PATTERN.finditer(contents):
+            closing, name, empty = match.groups()
+            if name is None:
+                # comment or CDATA section
+                continue
+            elif empty:
+                if max_depth is not None and len(stack) >= max_depth:
+                    raise PropertyListParseError(
+                        "Containers nested more than %d levels" % max_depth)
+            elif not closing:
+                stack.append((name, match.end()))
+                if max_depth is not None and len(stack) > max_depth:
+                    raise PropertyListParseError(
+                        "Containers nested more than %d levels" % max_depth)
+            else:
+                self._assert(stack and stack[-1][0] == name,
+                    "Unexpected </%s> at %d" % (name, match.start()))
+                ends[stack.pop()[1]] = (match.start(), match.end())
+        self._assert(not stack, "Unclosed <%s>" % (stack and stack[-1][0]))
+        self.__ends = ends
+
+        root = XmlPropertyListParser.ROOT_PATTERN.search(contents)
+        self._assert(root is not None, "A top level element must be <plist>.")
+        match = XmlPropertyListParser.ELEMENT_PATTERN.match(contents, root.end())
+        if match is None or match.lastgroup != 'container':
+            return None
+        if self.__limited:
+            # <plist> and the top level container
+            self._check_element('plist')
+            self._check_element(None)
+        start = match.end()
+        self._assert(XmlPropertyListParser.END_PATTERN.match(contents, ends[start][1]),
+            "Multiple objects at top level")
+        return self._lazy_proxy(match.group('container'), start)
+
+    def _lazy_proxy(self, name, start):
+        if name == 'dict':
+            return LazyDict(self, start, self.__ends[start][0])
+        return LazyList(self, start, self.__ends[start][0])
+
+    def _load_lazy(self, container, start, end):
+        contents = self.__contents
+        match_element = XmlPropertyListParser.ELEMENT_PATTERN.match
+        START_CALLBACKS = XmlPropertyListParser.START_CALLBACKS
+        END_CALLBACKS = XmlPropertyListParser.END_CALLBACKS
+        PARSE_CALLBACKS = XmlPropertyListParser.PARSE_CALLBACKS
+        limited = self.__limited
+
+        self.startDocument()
+        self._push_value(container)
+        self._push_stack(container)
+        pos = start
+        while True:
+            match = match_element(contents, pos, end)
+            if match is None:
+                # Only whitespace and comments may be left
+                self._assert(not contents[pos:end].strip(),
+                    "Unexpected contents at %d" % pos)
+                break
+            pos = match.end()
+            kind = match.lastgroup
+            if kind == 'container':
+                if limited:
+                    # Only counted, the depth was checked by the scan.
+                    self._check_element(None)
+                self._push_value(self._lazy_proxy(match.group(kind), pos))
+                pos = self.__ends[pos][1]
+            elif kind == 'content':
+                # ``content`` is the last group of an element
+                name = match.group('element')
+                content = self._lazy_text(match.group('content'))
+                if limited:
+                    self._check_element(name)
+                    self._check_text(name, content)
+                PARSE_CALLBACKS[name](self, name, content)
+            else:
+                name = match.group('empty')
+                if limited:
+                    self._check_element(name)
+                if name in START_CALLBACKS:
+                    START_CALLBACKS[name](self, name, {})
+                if name in END_CALLBACKS:
+                    END_CALLBACKS[name](self, name)
+                if name in PARSE_CALLBACKS:
+                    PARSE_CALLBACKS[name](self, name, '')
+        END_CALLBACKS[isinstance(container, dict) and 'dict' or 'array'](self, None)
+        self.endDocument()
+
     # ------------------------------------------------
     # XmlPropertyListParser
     # ------------------------------------------------
@@ -234,18 +947,24 @@ class XmlPropertyListParser(object):
     def _parse_using_etree(self, xml_input):
         from xml.etree.cElementTree import iterparse
 
-        parser = iterparse(self._to_stream(xml_input), events=('start', 'end'))
+        parser = iterparse(self._to_stream(self._limit_input(xml_input)),
+                           events=('start', 'end'))
+        limited = self.__limited
         self.startDocument()
         try:
             for action, element in parser:
                 name = element.tag
                 if action == 'start':
+                    if limited:
+                        self._check_element(name)
                     if name in XmlPropertyListParser.START_CALLBACKS:
                         XmlPropertyListParser.START_CALLBACKS[name](self, element.tag, element.attrib)
                 elif action == 'end':
                     if name in XmlPropertyListParser.END_CALLBACKS:
                         XmlPropertyListParser.END_CALLBACKS[name](self, name)
                     if name in XmlPropertyListParser.PARSE_CALLBACKS:
+                        if limited:
+                            self._check_text(name, element.text or "")
                         XmlPropertyListParser.PARSE_CALLBACKS[name](self, name, element.text or "")
                     element.clear()
         except SyntaxError, e:
@@ -254,11 +973,91 @@ class XmlPropertyListParser(object):
         self.endDocument()
         return self.__plist
 
+    def _iterparse_using_etree(self, xml_input, select=None, starts=False):
+        try:
+            from xml.etree.cElementTree import iterparse
+        except ImportError:
+            from xml.etree.ElementTree import iterparse
+
+        START_CALLBACKS = XmlPropertyListParser.START_CALLBACKS
+        END_CALLBACKS = XmlPropertyListParser.END_CALLBACKS
+        PARSE_CALLBACKS = XmlPropertyListParser.PARSE_CALLBACKS
+        # value elements, which are subject to the selection.
+        selectable = dict.fromkeys(START_CALLBACKS.keys() + PARSE_CALLBACKS.keys())
+        del selectable['plist'], selectable['key']
+
+        parser = iterparse(self._to_stream(self._limit_input(xml_input)),
+                           events=('start', 'end'))
+        limited = self.__limited
+        self._reset_limits()
+        if select is not None:
+            select = self._compile_select(select)
+        self.__select, self.__alive, self.__capture = select, [], None
+        self.__starts = starts
+        self.__pending = self.__pending_alive = None
+        events = self.__events = []
+        self.__path, self.__indices = [], []
+        self._reset_interned()
+        self._push_value = self._emit_value
+        self._push_stack = self._emit_push_stack
+        self._pop_stack = self._emit_pop_stack
+        # Containers on the stack are empty, except selected ones.
+        self.__compact_arrays = False
+        self.startDocument()
+        # Elements being parsed. Every element is detached from its parent
+        # when it ends, so the element tree never grows beyond one path.
+        elements = []
+        # Depth in the element being skipped, if any.
+        skipped = 0
+        try:
+            try:
+                for action, element in parser:
+                    name = element.tag
+                    if action == 'start':
+                        elements.append(element)
+                        if limited:
+                            self._check_element(name, skipped)
+                        if skipped:
+                            skipped += 1
+                            continue
+                        if select is not None and self.__capture is None and \
+                           name in selectable and not self._select_next(name):
+                            skipped = 1
+                            continue
+                        if name in START_CALLBACKS:
+                            START_CALLBACKS[name](self, name, element.attrib)
+                    elif action == 'end':
+                        elements.pop()
+                        if elements:
+                            del elements[-1][:]
+                        if skipped:
+                            skipped -= 1
+                            continue
+                        if name in END_CALLBACKS:
+                            END_CALLBACKS[name](self, name)
+                        if name in PARSE_CALLBACKS:
+                            if limited:
+                                self._check_text(name, element.text or "")
+                            PARSE_CALLBACKS[name](self, name, element.text or "")
+                    if events:
+                        for event in events:
+                            yield event
+                        del events[:]
+            except SyntaxError, e:
+                raise PropertyListParseError(e)
+            self.endDocument()
+        finally:
+            del self._push_value, self._push_stack, self._pop_stack
+            self.__compact_arrays = self.__array_factory is not None
+            self.__stack = self.__events = self.__path = self.__indices = None
+            self.__select = self.__alive = self.__capture = None
+            self.__interned.clear()
+
     def _parse_using_sax_parser(self, xml_input):
         from xml.sax import make_parser, handler, xmlreader, \
                             SAXParseException
         source = xmlreader.InputSource()
-        source.setByteStream(self._to_stream(xml_input))
+        source.setByteStream(self._to_stream(self._limit_input(xml_input)))
         reader = make_parser()
         reader.setContentHandler(self)
         try:
@@ -268,7 +1067,551 @@ class XmlPropertyListParser(object):
 
         return self.__plist
 
-    def parse(self, xml_input):
+    def _parse_using_expat(self, xml_input):
+        from xml.parsers import expat
+
+        # Tag names are reported as these strings, so comparing them with
+        # the literals is mostly done by identity.
+        names = {}
+        for name in ('plist', 'dict', 'array', 'key', 'string', 'integer',
+                     'real', 'date', 'data', 'true', 'false'):
+            names[name] = name
+        if isinstance(xml_input, unicode):
+            # Overrides the encoding declaration.
+            reader = expat.ParserCreate('utf-8', intern=names)
+            xml_input = xml_input.encode('utf-8')
+        else:
+            reader = expat.ParserCreate(intern=names)
+        # Text is reported as a UTF-8 ``str`` in one piece (as long as it
+        # fits in the buffer), so most text elements need no join.
+        reader.returns_unicode = False
+        reader.buffer_text = True
+        reader.buffer_size = 64 * 1024
+
+        texts = []
+        non_ascii = XmlPropertyListParser.NON_ASCII_PATTERN.search
+        self.startDocument()
+        stack, push = self.__stack, self._push_value
+        intern_keys, intern_strings = self.__intern_keys, self.__intern_strings
+
+        # Other handlers for each tag
+        starts, ends = {}, {}
+        for name, callback in XmlPropertyListParser.START_CALLBACKS.iteritems():
+            starts[name] = callback.__get__(self)
+        for name, callback in XmlPropertyListParser.END_CALLBACKS.iteritems():
+            ends[name] = callback.__get__(self)
+        for name, callback in XmlPropertyListParser.PARSE_CALLBACKS.iteritems():
+            # Other text elements can't be valid unless their text is ASCII.
+            ends[name] = lambda name, callback=callback: callback(self, name, ''.join(texts))
+
+        def start(name, attrs):
+            del texts[:]
+            handler = starts.get(name)
+            if handler is not None:
+                handler(name, attrs)
+
+        # The most common elements are handled inline, and their values
+        # are stored to the dictionary being parsed without calling
+        # ``_push_value``.
+        def end(name):
+            if name == 'key':
+                if not self.__in_dict:
+                    raise PropertyListParseError("<key> element must be in <dict> element.")
+                text = ''.join(texts)
+                if non_ascii(text) is not None:
+                    text = text.decode('utf-8')
+                if intern_keys:
+                    text = self._intern(text)
+                self.__key = text
+                return
+            elif name == 'string':
+                value = ''.join(texts)
+                # For compatibility with ``xml.etree``, non-ASCII text is
+                # ``unicode``.
+                if non_ascii(value) is not None:
+                    value = value.decode('utf-8')
+                if len(value) <= intern_strings:
+                    value = self._intern(value)
+            elif name == 'integer':
+                value = int(''.join(texts))
+            else:
+                handler = ends.get(name)
+                if handler is not None:
+                    handler(name)
+                return
+
+            key = self.__key
+            if key is not None and self.__in_dict:
+                stack[-1][key] = value
+                self.__key = None
+            else:
+                push(value)
+
+        characters = texts.append
+        if self.stats is not None:
+            start, end, xml_input = self._instrument_expat(start, end, xml_input)
+        if self.__limited:
+            start, end, characters, xml_input = self._limit_expat(start, end, texts, xml_input)
+        reader.StartElementHandler = start
+        reader.EndElementHandler = end
+        reader.CharacterDataHandler = characters
+        try:
+            if isinstance(xml_input, str):
+                reader.Parse(xml_input, True)
+            else:
+                reader.ParseFile(self._to_stream(xml_input))
+        except expat.ExpatError, e:
+            raise PropertyListParseError(e)
+        self.endDocument()
+        return self.__plist
+
+    # Categories of the time in ``ParseStats.times``
+    STATS_CATEGORIES = {
+        'plist': 'containers',
+        'dict': 'containers',
+        'array': 'containers',
+        'key': 'keys',
+        'string': 'strings',
+        'integer': 'numbers',
+        'real': 'numbers',
+        'date': 'dates',
+        'data': 'data',
+        'true': 'booleans',
+        'false': 'booleans',
+    }
+
+    def _instrument_expat(self, parse_start, parse_end, xml_input):
+        # Returns the element handlers of ``_parse_using_expat`` wrapped to
+        # collect statistics to ``self.stats``, and the input which counts
+        # bytes read.
+        import time
+        timer = time.time
+        stats = self.stats
+        elements, times = stats.elements, stats.times
+        categories = XmlPropertyListParser.STATS_CATEGORIES
+        stack = self.__stack
+
+        def start(name, attrs):
+            elements[name] = elements.get(name, 0) + 1
+            t = timer()
+            parse_start(name, attrs)
+            category = categories.get(name)
+            if category is not None:
+                times[category] = times.get(category, 0.0) + (timer() - t)
+                if name == 'dict' or name == 'array':
+                    stats.containers += 1
+                    if len(stack) > stats.max_depth:
+                        stats.max_depth = len(stack)
+
+        def end(name):
+            t = timer()
+            parse_end(name)
+            category = categories.get(name)
+            if category is not None:
+                times[category] = times.get(category, 0.0) + (timer() - t)
+
+        if isinstance(xml_input, str):
+            stats.bytes_read += len(xml_input)
+        else:
+            stream = self._to_stream(xml_input)
+            class CountingReader(object):
+                def read(self, size=-1):
+                    data = stream.read(size)
+                    stats.bytes_read += len(data)
+                    return data
+            xml_input = CountingReader()
+        return start, end, xml_input
+
+    def _parse_document(self, xml_input):
+        # Parses with the fastest engine available: ``pyexpat`` directly,
+        # ``xml.etree.cElementTree``, or ``xml.sax``.
+        try:
+            return self._parse_using_expat(xml_input)
+        except ImportError:
+            pass
+        try:
+            return self._parse_using_etree(xml_input)
+        except ImportError:
+            # No xml.etree.ccElementTree found.
+            return self._parse_using_sax_parser(xml_input)
+
+    def _create_push_reader(self):
+        # Returns an incremental parser, which has ``feed()`` and ``close()``
+        # and reports to this parser, the exception it raises for malformed
+        # documents, and the ``_EtreeTarget`` if any.
+        try:
+            from xml.etree.cElementTree import XMLParser
+        except ImportError:
+            from xml.sax import make_parser, handler, SAXParseException
+            reader = make_parser()
+            reader.setContentHandler(self)
+            # Never blocks on fetching the external DTD.
+            reader.setFeature(handler.feature_external_ges, False)
+            return reader, SAXParseException, None
+
+        self.startDocument()
+        target = _EtreeTarget(self)
+        return XMLParser(target=target), SyntaxError, target
+
+    def _feed(self, data):
+        if self.__reader is None:
+            self._reset_interned()
+            self._reset_limits()
+            self.__fed = 0
+            self.__reader = self._create_push_reader()
+        max_bytes = self.__limits[4]
+        if max_bytes is not None:
+            self.__fed += len(data)
+            if self.__fed > max_bytes:
+                self.__reader = None
+                raise PropertyListParseError("Input larger than %d bytes" % max_bytes)
+        reader, error, target = self.__reader
+        # If the document is broken, the next chunk starts a new one.
+        try:
+            try:
+                reader.feed(data)
+            except error, e:
+                self.__reader = None
+                self._raise_target_error(target)
+                raise PropertyListParseError(e)
+            self._raise_target_error(target)
+        except:
+            self.__reader = None
+            raise
+
+    def _close(self):
+        self._assert(self.__reader is not None, "No data was fed.")
+        (reader, error, target), self.__reader = self.__reader, None
+        self.__interned.clear()
+        try:
+            reader.close()
+        except error, e:
+            self._raise_target_error(target)
+            raise PropertyListParseError(e)
+        self._raise_target_error(target)
+        return self.__plist
+
+    def _raise_target_error(self, target):
+        # ``xml.etree`` loses exceptions raised in the target.
+        if target is not None and target.error is not None:
+            raise target.error[0], target.error[1], target.error[2]
+
+    def _index_containers(self, contents, max_depth=None):
+        # Returns the prolog up to ``<plist>``, and the spans ``(offset,
+        # length)`` by path of every container (up to ``max_depth``) and
+        # every value in the top level container, for ``XmlPropertyListIndex``.
+        # Returns ``None`` if the top level object is not a container, or
+        # offsets are not for bytes.
+        root = self._scan_lazy(contents)
+        if root is None or isinstance(self.__contents, unicode):
+            return None
+        # the byte order mark removed by the scan
+        base = len(contents) - len(self.__contents)
+        contents = self.__contents
+        ends = self.__ends
+        match_element = XmlPropertyListParser.ELEMENT_PATTERN.match
+        plist = XmlPropertyListParser.ROOT_PATTERN.search(contents)
+        match = match_element(contents, plist.end())
+        spans = {(): (match.start('container') - 1, ends[root._start][1])}
+
+        stack = [((), root._start, root._end, type(root) is LazyDict)]
+        while stack:
+            path, pos, end, in_dict = stack.pop()
+            key, index = None, 0
+            while True:
+                match = match_element(contents, pos, end)
+                if match is None:
+                    self._assert(not contents[pos:end].strip(),
+                        "Unexpected contents at %d" % pos)
+                    break
+                pos = match.end()
+                kind = match.lastgroup
+                if kind == 'content':
+                    name = match.group('element')
+                else:
+                    name = match.group(kind)
+                if name == 'key':
+                    self._assert(in_dict, "<key> element must be in <dict> element.")
+                    key = ''
+                    if kind == 'content':
+                        key = self._lazy_text(match.group('content'))
+                    continue
+                if in_dict:
+                    self._assert(key is not None, "Missing key for dictionary.")
+                    child, key = path + (key,), None
+                else:
+                    child, index = path + (index,), index + 1
+                start = match.start(kind == 'content' and 'element' or kind) - 1
+                if kind == 'container':
+                    content_end, pos = ends[pos]
+                    if max_depth is None or len(child) <= max_depth:
+                        spans[child] = (start, pos)
+                        stack.append((child, match.end(), content_end, name == 'dict'))
+                elif not path or (name == 'dict' or name == 'array') and \
+                     (max_depth is None or len(child) <= max_depth):
+                    # values in the top level container, and empty containers
+                    spans[child] = (start, pos)
+
+        for path, (start, end) in spans.iteritems():
+            spans[path] = (start + base, end - start)
+        return contents[:plist.end()], spans
+
+    # ------------------------------------------------
+    # XmlPropertyListParser private: parallel parsing
+    # ------------------------------------------------
+    # ``parse(workers=N)`` finds the container to split with the container
+    # scan of the lazy mode: the top level container, or its child which
+    # takes the most of it, recursively. The children of the container
+    # are cut into slices at the ends of child containers. Worker processes
+    # parse the slices, while this process parses the rest of the document
+    # (the container emptied), then the results are merged in order.
+    def _child_containers(self, start, end):
+        # Returns ``(content start, content end, end)`` of container
+        # elements directly in the span.
+        contents, ends = self.__contents, self.__ends
+        search = XmlPropertyListParser.CONTAINER_PATTERN.search
+        children = []
+        pos = start
+        while True:
+            match = search(contents, pos, end)
+            if match is None:
+                break
+            pos = match.end()
+            if match.group(2) is not None and not match.group(3):
+                content_end, pos = ends[match.end()]
+                children.append((match.end(), content_end, pos))
+        return children
+
+    def _split_lazy(self, root, count):
+        # Returns the path to the container to split, the container and
+        # ``count`` (or fewer) slices of its contents.
+        path, container = (), root
+        while True:
+            children = self._child_containers(container._start, container._end)
+            if not children:
+                return path, container, [(container._start, container._end)]
+            largest = max(children, key=lambda child: child[1] - child[0])
+            if (largest[1] - largest[0]) * 2 < container._end - container._start:
+                break
+            if type(container) is LazyDict:
+                items = container.iteritems()
+            else:
+                items = enumerate(container)
+            for key, value in items:
+                if type(value) in (LazyDict, LazyList) and value._start == largest[0]:
+                    path, container = path + (key,), value
+                    break
+            else:
+                # The child is overridden by a later value of the same key,
+                # so it is not in the result. Splits this container.
+                break
+
+        size = float(container._end - container._start) / count
+        slices, start = [], container._start
+        for content_start, content_end, end in children:
+            if end - start >= size:
+                slices.append((start, end))
+                start = end
+        slices.append((start, container._end))
+        return path, container, slices
+
+    def _parse_in_parallel(self, xml_input, workers):
+        import multiprocessing
+
+        if not isinstance(xml_input, basestring):
+            xml_input = self._to_stream(xml_input).read()
+        loader = XmlPropertyListParser()
+        root = loader._scan_lazy(xml_input)
+        contents = loader.__contents
+        if root is None or isinstance(contents, unicode):
+            # Not worth it, or offsets are not for bytes
+            return self._parse_document(xml_input)
+
+        path, container, slices = loader._split_lazy(root, workers * 4)
+        # Each slice is parsed as a document with the same prolog
+        name = type(container) is LazyDict and 'dict' or 'array'
+        prolog = contents[:XmlPropertyListParser.ROOT_PATTERN.search(contents).end()]
+        pool = multiprocessing.Pool(workers, _init_parallel_worker,
+                                    (contents, prolog + '<%s>' % name, '</%s></plist>' % name,
+                                     self.__options))
+        try:
+            results = pool.map_async(_parse_parallel_slice, slices)
+            plist = self._parse_document(
+                contents[:container._start] + contents[container._end:])
+            parts = results.get()
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+        parent, merged = None, plist
+        for key in path:
+            parent, merged = merged, merged[key]
+        for part in parts:
+            if name == 'dict':
+                merged.update(part)
+            else:
+                merged.extend(part)
+        if name == 'array' and self.__compact_arrays:
+            # Each part is compacted by itself.
+            compact = self.__array_factory(merged)
+            if parent is None:
+                plist = compact
+            else:
+                parent[path[-1]] = compact
+        return plist
+
+    # ------------------------------------------------
+    # XmlPropertyListParser private: sidecar cache
+    # ------------------------------------------------
+    # A sidecar cache file contains two ``marshal`` objects: the header
+    # ``(SIDECAR_MAGIC, mtime, size, dates, data, arrays, limits)`` of the
+    # source file, and the result encoded by ``_encode_cached``. Unlike
+    # pickle, ``marshal`` creates only builtin objects without running any
+    # code, and ``_decode_cached`` accepts only property list objects, so
+    # a cache file written by anyone else can't do more than a wrong result.
+    SIDECAR_MAGIC = 'plist_parser sidecar 6'
+    CACHED_SCALARS = dict.fromkeys([str, unicode, int, long, float, bool])
+
+    def _encode_cached(self, value):
+        # Returns ``value`` in objects which ``marshal`` writes. Objects
+        # other than containers and scalars are tagged tuples.
+        import datetime, array
+
+        if isinstance(value, dict):
+            return dict([(k, self._encode_cached(v)) for k, v in value.iteritems()])
+        elif isinstance(value, list):
+            return [self._encode_cached(v) for v in value]
+        elif isinstance(value, datetime.datetime):
+            return ('date', value.year, value.month, value.day, value.hour, value.minute,
+                    value.second, value.microsecond, value.tzinfo is not None)
+        elif isinstance(value, Data):
+            return ('data', str(value))
+        elif isinstance(value, array.array):
+            return ('array', value.typecode, value.tostring())
+        elif hasattr(value, 'dtype'):
+            # NumPy array
+            return ('numpy', value.dtype.str, value.tostring())
+        return value
+
+    def _decode_cached(self, value):
+        # Returns the property list encoded by ``_encode_cached``, or raises
+        # ``ValueError`` for anything else.
+        kind = type(value)
+        if kind in XmlPropertyListParser.CACHED_SCALARS:
+            return value
+        elif kind is dict:
+            decoded = {}
+            for k, v in value.iteritems():
+                if type(k) not in (str, unicode):
+                    raise ValueError("Invalid key in the cache")
+                decoded[k] = self._decode_cached(v)
+            return decoded
+        elif kind is list:
+            return [self._decode_cached(v) for v in value]
+        elif kind is not tuple or not value:
+            raise ValueError("Invalid object in the cache")
+        tag = value[0]
+        if tag == 'date' and len(value) == 9:
+            date = XmlPropertyListParser.datetime.datetime(*value[1:8])
+            if value[8]:
+                date = date.replace(tzinfo=_UTC())
+            return date
+        elif tag == 'data' and len(value) == 2 and type(value[1]) is str:
+            return Data(bytes=value[1])
+        elif tag == 'array' and len(value) == 3 and value[1] in ('l', 'd') and \
+             type(value[2]) is str:
+            import array
+            decoded = array.array(value[1])
+            decoded.fromstring(value[2])
+            return decoded
+        elif tag == 'numpy' and len(value) == 3 and value[1][1:] in ('i8', 'f8') and \
+             type(value[2]) is str:
+            import numpy
+            return numpy.fromstring(value[2], dtype=numpy.dtype(value[1]))
+        raise ValueError("Invalid object in the cache")
+
+    def _sidecar_entry(self, xml_input):
+        # Returns the path of the sidecar cache file, the header and the
+        # permission bits for ``xml_input``, or ``None`` if it is not
+        # a regular file.
+        import os
+
+        path = getattr(xml_input, 'name', None)
+        if not isinstance(path, basestring) or not os.path.isfile(path):
+            return None
+        try:
+            st = os.fstat(xml_input.fileno())
+        except (AttributeError, EnvironmentError, ValueError):
+            return None
+
+        if isinstance(self.__sidecar, basestring):
+            import hashlib
+            name = hashlib.sha1(os.path.realpath(path)).hexdigest() + '.cache'
+            cache = os.path.join(self.__sidecar, name)
+        else:
+            cache = path + '.cache'
+        header = (XmlPropertyListParser.SIDECAR_MAGIC, st.st_mtime, st.st_size,
+                  self.__options['dates'], self.__options['data'], self.__options['arrays'],
+                  self.__limits)
+        return cache, header, st.st_mode & 0666
+
+    def _load_sidecar(self, cache, header, decode):
+        # Returns ``decode()`` of the contents of the file ``cache``, or
+        # ``None`` if it is missing, outdated or broken.
+        import marshal
+
+        try:
+            fin = open(cache, 'rb')
+        except EnvironmentError:
+            return None
+        try:
+            try:
+                if marshal.load(fin) == header:
+                    return decode(marshal.load(fin))
+            except Exception:
+                # A broken cache file is rebuilt.
+                pass
+        finally:
+            fin.close()
+        return None
+
+    def _save_sidecar(self, cache, header, mode, value):
+        # ``value`` is of the objects which ``marshal`` writes.
+        import os, tempfile, marshal
+
+        # Written to a temporary file and renamed, so other processes never
+        # read a partial cache file.
+        directory = os.path.dirname(cache) or os.curdir
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            fd, temp = tempfile.mkstemp(dir=directory)
+        except EnvironmentError:
+            # The cache is optional.
+            return
+        try:
+            try:
+                fout = os.fdopen(fd, 'wb')
+                try:
+                    marshal.dump(header, fout, 2)
+                    marshal.dump(value, fout, 2)
+                finally:
+                    fout.close()
+                os.chmod(temp, mode)
+                try:
+                    os.rename(temp, cache)
+                except OSError:
+                    # Windows can't rename to an existing file.
+                    os.remove(cache)
+                    os.rename(temp, cache)
+            except EnvironmentError:
+                pass
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def parse(self, xml_input, select=None, lazy=False, workers=None):
         """
         Parse the property list (`.plist`, `.xml, for example) ``xml_input``,
         which can be either a string or a file-like object.
@@ -278,12 +1621,2084 @@ class XmlPropertyListParser(object):
         ...              r'<dict><key>Python</key><string>.py</string></dict>'
         ...              r'</plist>')
         {'Python': '.py'}
+
+        If ``select`` is given, it returns a list of ``(path, value)`` for
+        objects matched by any of the ``select`` patterns instead. A pattern
+        is a path of keys and array indices joined by ``/`` (or a sequence
+        of them), and each component may contain shell-style wildcards.
+        Subtrees which no pattern can match are skipped without decoding.
+
+        >>> parser.parse(r'<plist version="1.0"><array>'
+        ...              r'<dict><key>Name</key><string>A</string>'
+        ...              r'<key>Total Time</key><integer>10</integer></dict>'
+        ...              r'<dict><key>Name</key><string>B</string></dict>'
+        ...              r'</array></plist>', select=['*/Name'])
+        [((0, 'Name'), 'A'), ((1, 'Name'), 'B')]
+
+        If ``lazy`` is true, containers are returned as ``LazyDict`` and
+        ``LazyList``, which decode their contents on first access. Only
+        container tags are scanned in advance, and other errors are raised
+        when the broken part is accessed.
+
+        >>> plist = parser.parse(r'<plist version="1.0">'
+        ...                      r'<dict><key>Python</key><array><string>.py</string></array></dict>'
+        ...                      r'</plist>', lazy=True)
+        >>> isinstance(plist, LazyDict), plist['Python'][0]
+        (True, '.py')
+
+        If ``workers`` is more than 1, a huge top level ``<dict>`` or
+        ``<array>`` (or the child which takes the most of it, recursively)
+        is split at its children and parsed in ``workers`` processes.
+        The result is the same.
+        """
+        self.stats = None
+        if select is not None:
+            return [(path, value) for event, path, value in self.iterparse(xml_input, select)]
+        if lazy:
+            if not isinstance(xml_input, basestring):
+                xml_input = self._to_stream(self._limit_input(xml_input)).read()
+            else:
+                self._limit_input(xml_input)
+            # Each lazy property list has its own parser, which decodes
+            # containers on access.
+            loader = XmlPropertyListParser(**self.__options)
+            plist = loader._scan_lazy(xml_input)
+            if plist is not None:
+                return plist
+
+        self._reset_interned()
+        if self.__collect_stats:
+            import time
+            self.stats, started = ParseStats(), time.time()
+        # Files and memory views can't be written to the sidecar cache,
+        # or pickled from worker processes.
+        picklable = self.__data_threshold is None and self.__options['data'] != 'base64'
+        sidecar = picklable and self.__sidecar and self._sidecar_entry(xml_input)
+        if sidecar:
+            plist = self._load_sidecar(sidecar[0], sidecar[1], self._decode_cached)
+            if plist is not None:
+                if self.stats is not None:
+                    self.stats.cache_hit = True
+                    self.stats.total_time = time.time() - started
+                return plist
+        self._reset_limits()
+        # Statistics are collected, and limits are checked, only in this
+        # process.
+        if picklable and workers is not None and workers > 1 and \
+           self.stats is None and not self.__limited:
+            plist = self._parse_in_parallel(xml_input, workers)
+        else:
+            plist = self._parse_document(xml_input)
+        self.__interned.clear()
+        if self.stats is not None:
+            stats = self.stats
+            stats.total_time = time.time() - started
+            stats.times['xml'] = max(0.0, stats.total_time - sum(stats.times.values()))
+        if sidecar:
+            self._save_sidecar(sidecar[0], sidecar[1], sidecar[2], self._encode_cached(plist))
+        return plist
+
+    def iterparse(self, xml_input, select=None):
+        """
+        Parse the property list ``xml_input`` incrementally and generate
+        ``(event, path, value)`` tuples instead of building the whole tree,
+        so huge property lists can be processed in constant memory.
+
+        ``path`` is a tuple of dictionary keys and array indices leading
+        from the top level object. ``event`` is ``'start'`` or ``'end'``
+        for a container, with its type (``dict`` or ``list``) as ``value``,
+        and ``'value'`` for any other object.
+
+        >>> parser = XmlPropertyListParser()
+        >>> for event in parser.iterparse(r'<plist version="1.0">'
+        ...     r'<dict><key>Python</key><array><string>.py</string></array></dict>'
+        ...     r'</plist>'):
+        ...     print event
+        ('start', (), <type 'dict'>)
+        ('start', ('Python',), <type 'list'>)
+        ('value', ('Python', 0), '.py')
+        ('end', ('Python',), <type 'list'>)
+        ('end', (), <type 'dict'>)
+
+        If ``select`` patterns are given (see ``parse()``), only
+        ``'value'`` events for the matched objects are generated.
+        """
+        # A parser of its own, so that this parser can be used while the
+        # generator is suspended.
+        parser = XmlPropertyListParser(**self.__options)
+        return parser._iterparse_using_etree(xml_input, select)
+
+    def parse_columns(self, xml_input, path, columns=None):
         """
+        Parse the records (dictionaries) in the container at ``path`` of
+        the property list ``xml_input`` into ``Columns``, without building
+        the records. ``path`` is a path of keys and array indices like
+        ``select`` patterns of ``parse()``, and ``columns`` is the list of
+        the fields to extract (all by default).
+
+        >>> table = XmlPropertyListParser().parse_columns(r'<plist version="1.0">'
+        ...     r'<dict><key>Tracks</key><dict>'
+        ...     r'<key>1</key><dict><key>Name</key><string>A</string>'
+        ...     r'<key>Size</key><integer>10</integer></dict>'
+        ...     r'<key>2</key><dict><key>Name</key><string>B</string></dict>'
+        ...     r'</dict></dict></plist>', 'Tracks')
+        >>> table.keys, list(table['Name']), list(table['Size'])
+        (['1', '2'], ['A', 'B'], [10, 0])
+
+        Every record has a row, even if it has none of ``columns``.
+        """
+        import re
         try:
-            return self._parse_using_etree(xml_input)
+            import numpy
         except ImportError:
-            # No xml.etree.ccElementTree found.
-            return self._parse_using_sax_parser(xml_input)
+            numpy = None
+
+        if isinstance(path, basestring):
+            path = path and path.split('/') or ()
+        path = tuple(path)
+        depth = len(path)
+        if columns is None:
+            fields = ['*']
+        else:
+            # Field names are not patterns.
+            fields = [re.sub(r'([*?[])', r'[\1]', name) for name in columns]
+        select = [path + ('*', field) for field in fields]
+
+        keys, builders = [], {}
+        row = -1
+        # ``'start'`` events of records make rows for the records without
+        # any of the fields.
+        parser = XmlPropertyListParser(**self.__options)
+        for event, value_path, value in parser._iterparse_using_etree(xml_input, select, True):
+            if event == 'start':
+                if len(value_path) == depth + 1:
+                    row += 1
+                    keys.append(value_path[depth])
+                continue
+            name = value_path[depth + 1]
+            builder = builders.get(name)
+            if builder is None:
+                builder = builders[name] = _ColumnBuilder()
+            builder.append(row, value)
+
+        for name in columns or ():
+            if name not in builders:
+                builders[name] = _ColumnBuilder()
+        table = Columns(keys, {}, {})
+        for name, builder in builders.iteritems():
+            table.columns[name], table.masks[name] = builder.build(len(keys), numpy)
+        return table
+
+
+def _init_parallel_worker(contents, header, footer, options):
+    global _parallel_document
+    _parallel_document = (contents, header, footer, options)
+
+
+def _parse_parallel_slice(span):
+    # Parses the slice ``span`` of the container split by
+    # ``XmlPropertyListParser.parse(workers=N)``.
+    contents, header, footer, options = _parallel_document
+    return XmlPropertyListParser(**options).parse(header + contents[span[0]:span[1]] + footer)
+
+
+class ParseStats(object):
+    """
+    Statistics of a parse collected by ``XmlPropertyListParser(stats=True)``.
+
+    ``elements`` is the number of elements by tag, ``bytes_read`` the size
+    of the input, ``max_depth`` the deepest nesting of containers, and
+    ``containers`` the number of ``dict`` and ``list`` created.
+
+    ``times`` is the seconds spent by category: ``'containers'``
+    (building containers), ``'keys'``, ``'strings'``, ``'numbers'``,
+    ``'dates'``, ``'data'``, ``'booleans'``, and ``'xml'`` (the rest,
+    which is mostly tokenizing XML). ``total_time`` is the seconds of
+    the whole ``parse()``.
+
+    ``cache_hit`` is true if the result was loaded from the sidecar cache.
+    Then only ``total_time`` is filled.
+
+    >>> parser = XmlPropertyListParser(stats=True)
+    >>> parser.parse(r'<plist version="1.0">'
+    ...              r'<dict><key>Python</key><array><string>.py</string></array></dict>'
+    ...              r'</plist>')
+    {'Python': ['.py']}
+    >>> parser.stats.elements['key'], parser.stats.max_depth, parser.stats.containers
+    (1, 2, 2)
+    """
+
+    def __init__(self):
+        self.elements = {}
+        self.bytes_read = 0
+        self.max_depth = 0
+        self.containers = 0
+        self.times = {}
+        self.total_time = 0.0
+        self.cache_hit = False
+
+    def as_dict(self):
+        """Return the statistics as a dictionary"""
+        return {
+            'elements': dict(self.elements),
+            'bytes_read': self.bytes_read,
+            'max_depth': self.max_depth,
+            'containers': self.containers,
+            'times': dict(self.times),
+            'total_time': self.total_time,
+            'cache_hit': self.cache_hit,
+        }
+
+    def __repr__(self):
+        return '<ParseStats %d bytes, %d elements, %.3f sec>' % (
+            self.bytes_read, sum(self.elements.values()), self.total_time)
+
+
+class Columns(object):
+    """
+    Records extracted by ``XmlPropertyListParser.parse_columns()``.
+
+    ``keys`` is the list of the keys (or indices) of the records,
+    ``columns`` maps each field to its values in the order of ``keys``,
+    and ``masks`` maps each field to flags, which are true for the records
+    without the field.
+
+    With NumPy, a column is a NumPy array of ``int64``, ``float64``,
+    ``bool``, ``datetime64[us]`` or ``object`` (strings and others).
+    Otherwise, it is an ``array.array`` of ``'l'``, ``'d'`` or ``'b'``,
+    or a list. Missing values are 0, ``NaT`` or ``None``. A field of
+    integers and reals is a column of reals, and a field of any other
+    mixed types is a column of objects. Equal strings share a single
+    object.
+    """
+
+    def __init__(self, keys, columns, masks):
+        self.keys = keys
+        self.columns = columns
+        self.masks = masks
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __repr__(self):
+        return '<Columns of %d records: %s>' % (len(self.keys), ', '.join(sorted(self.columns)))
+
+
+class _ColumnBuilder(object):
+    # Collects the values of a field for ``Columns``, in an ``array.array``
+    # as long as they have the same numeric type.
+    import array, datetime
+
+    KINDS = {
+        bool: 'bool',
+        int: 'int',
+        long: 'int',
+        float: 'float',
+        datetime.datetime: 'date',
+        str: 'string',
+        unicode: 'string',
+    }
+    TYPECODES = {'int': 'l', 'float': 'd', 'bool': 'b'}
+
+    def __init__(self):
+        self.kind = None
+        self.rows = _ColumnBuilder.array.array('l')
+        self.values = []
+        self.interned = {}
+
+    def _convert(self, kind):
+        if self.kind is None:
+            self.kind = kind
+            if kind in _ColumnBuilder.TYPECODES:
+                self.values = _ColumnBuilder.array.array(_ColumnBuilder.TYPECODES[kind])
+        elif self.kind == 'int' and kind == 'float':
+            self.kind = 'float'
+            self.values = _ColumnBuilder.array.array('d', self.values)
+        elif not (self.kind == 'float' and kind == 'int'):
+            self.kind = 'object'
+            self.values = list(self.values)
+
+    def append(self, row, value):
+        kind = _ColumnBuilder.KINDS.get(value.__class__, 'object')
+        if kind != self.kind and self.kind != 'object':
+            self._convert(kind)
+        if self.kind == 'string':
+            value = self.interned.setdefault(value, value)
+        try:
+            self.values.append(value)
+        except OverflowError:
+            self._convert('object')
+            self.values.append(value)
+        self.rows.append(row)
+
+    def build(self, size, numpy=None):
+        # Returns the column and the mask of ``size`` records.
+        kind, rows, values = self.kind, self.rows, self.values
+        if numpy is not None:
+            index = numpy.array(rows, dtype=numpy.intp)
+            mask = numpy.ones(size, dtype=bool)
+            mask[index] = False
+            if kind == 'int':
+                column = numpy.zeros(size, dtype=numpy.int64)
+            elif kind == 'float':
+                column = numpy.zeros(size, dtype=numpy.float64)
+            elif kind == 'bool':
+                column = numpy.zeros(size, dtype=bool)
+            elif kind == 'date':
+                column = numpy.empty(size, dtype='datetime64[us]')
+                column[:] = numpy.datetime64('NaT')
+            else:
+                column = numpy.empty(size, dtype=object)
+                for i in xrange(len(rows)):
+                    column[rows[i]] = values[i]
+                return column, mask
+            if len(rows):
+                column[index] = numpy.array(values, dtype=column.dtype)
+            return column, mask
+
+        mask = _ColumnBuilder.array.array('b', [1]) * size
+        for row in rows:
+            mask[row] = 0
+        if len(rows) == size:
+            return values, mask
+        if kind in _ColumnBuilder.TYPECODES:
+            column = _ColumnBuilder.array.array(_ColumnBuilder.TYPECODES[kind], [0]) * size
+        else:
+            column = [None] * size
+        for i in xrange(len(rows)):
+            column[rows[i]] = values[i]
+        return column, mask
+
+
+class _UTC(XmlPropertyListParser.datetime.tzinfo):
+    # ``tzinfo`` of UTC for ``XmlPropertyListParser(dates='aware')``.
+    def utcoffset(self, dt):
+        return XmlPropertyListParser.datetime.timedelta(0)
+
+    def dst(self, dt):
+        return XmlPropertyListParser.datetime.timedelta(0)
+
+    def tzname(self, dt):
+        return 'UTC'
+
+    def __repr__(self):
+        return '_UTC()'
+
+
+class _EtreeTarget(object):
+    # Adapts the SAX ContentHandler methods of ``XmlPropertyListParser``
+    # to the target of ``xml.etree.cElementTree.XMLParser``. The parser
+    # doesn't stop at an exception raised in the target, so the first one
+    # is kept in ``error`` (as ``sys.exc_info()``) to be raised by the
+    # caller, and later calls are ignored.
+    def __init__(self, handler):
+        self.handler = handler
+        self.error = None
+
+    def _call(self, method, *args):
+        if self.error is None:
+            try:
+                return method(*args)
+            except Exception:
+                import sys
+                self.error = sys.exc_info()
+
+    def start(self, name, attributes):
+        self._call(self.handler.startElement, name, attributes)
+
+    def end(self, name):
+        self._call(self.handler.endElement, name)
+
+    def data(self, content):
+        self._call(self.handler.characters, content)
+
+    def close(self):
+        self._call(self.handler.endDocument)
+
+
+class _LimitedStream(object):
+    # Reads ``stream`` and raises if more than ``max_bytes`` are read.
+    def __init__(self, stream, max_bytes):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise PropertyListParseError("Input larger than %d bytes" % self.max_bytes)
+        return data
+
+    def close(self):
+        if hasattr(self.stream, 'close'):
+            self.stream.close()
+
+
+class XmlPropertyListPushParser(XmlPropertyListParser):
+    """
+    The ``XmlPropertyListPushParser`` class parses a property list
+    incrementally from chunks of data pushed by ``feed()``, such as the
+    data received from sockets and pipes, instead of reading a stream.
+    The parse state is kept between chunks, and ``close()`` returns
+    the property list.
+
+    >>> parser = XmlPropertyListPushParser()
+    >>> parser.feed('<plist version="1.0"><dict><key>Pyt')
+    >>> parser.feed('hon</key><string>.py</string></dict></plist>')
+    >>> parser.close()
+    {'Python': '.py'}
+    """
+
+    def feed(self, data):
+        """
+        Feed the chunk ``data`` (a string) to the parser. It raises
+        ``PropertyListParseError`` as soon as the document turns out to be
+        broken, and the next chunk starts a new document.
+        """
+        self._feed(data)
+
+    def close(self):
+        """
+        Finish the document, and return the property list. The parser
+        can be used again for the next document.
+        """
+        return self._close()
+
+
+def _parse_xml_contents(contents):
+    return XmlPropertyListParser().parse(contents)
+
+
+class _AsyncParse(object):
+    # Parses ``xml_input`` on the event loop in steps, each of which takes
+    # about ``budget`` seconds at most, and resolves ``future`` with the
+    # result. Only reading is done on the loop if ``offload`` is true.
+
+    def __init__(self, asyncio, loop, xml_input, offload, executor, budget, chunk_size):
+        self.asyncio, self.loop = asyncio, loop
+        self.input = xml_input
+        self.offload, self.executor = offload, executor
+        self.budget, self.chunk_size = budget, chunk_size
+        self.future = asyncio.Future(loop=loop)
+        self.parser = XmlPropertyListPushParser()
+        self.chunks = []
+        self.data, self.offset = '', 0
+        # Bytes fed at once, which is adapted to the budget
+        self.feed_size = 4096
+        loop.call_soon(self._read)
+
+    def _fail(self, e):
+        if not self.future.done():
+            self.future.set_exception(e)
+
+    def _read(self):
+        if self.future.done():
+            # cancelled
+            return
+        try:
+            if isinstance(self.input, basestring):
+                data, self.input = self.input, ''
+            else:
+                data = self.input.read(self.chunk_size)
+        except Exception, e:
+            self._fail(e)
+            return
+        if isinstance(data, basestring):
+            self._consume(data)
+        else:
+            # A coroutine of ``asyncio.StreamReader``
+            ensure_future = getattr(self.asyncio, 'ensure_future', None) or \
+                            getattr(self.asyncio, 'async')
+            ensure_future(data, loop=self.loop).add_done_callback(self._read_done)
+
+    def _read_done(self, task):
+        if self.future.done():
+            return
+        if task.exception() is not None:
+            self._fail(task.exception())
+        else:
+            self._consume(task.result())
+
+    def _consume(self, data):
+        if not data:
+            self._finish()
+        elif self.offload:
+            self.chunks.append(data)
+            self.loop.call_soon(self._read)
+        else:
+            self.data, self.offset = data, 0
+            self._feed()
+
+    def _feed(self):
+        if self.future.done():
+            return
+        time = self.loop.time
+        budget = self.budget
+        deadline = time() + budget
+        data, size = self.data, len(self.data)
+        try:
+            while self.offset < size:
+                piece = data[self.offset:self.offset + self.feed_size]
+                start = time()
+                self.parser.feed(piece)
+                elapsed = time() - start
+                self.offset += len(piece)
+                if elapsed > 0 and len(piece) >= 1024:
+                    # Aims at a half of the budget for each feed
+                    self.feed_size = max(1024, min(
+                        self.chunk_size, int(len(piece) * budget / 2 / elapsed)))
+                # Yields if the next feed would exceed the budget
+                if self.offset < size and time() + elapsed >= deadline:
+                    self.loop.call_soon(self._feed)
+                    return
+        except Exception, e:
+            self._fail(e)
+            return
+        self.loop.call_soon(self._read)
+
+    def _finish(self):
+        if not self.offload:
+            try:
+                self.future.set_result(self.parser.close())
+            except Exception, e:
+                self._fail(e)
+            return
+
+        parsed = self.loop.run_in_executor(
+            self.executor, _parse_xml_contents, ''.join(self.chunks))
+        def done(parsed):
+            if self.future.done():
+                return
+            elif parsed.exception() is not None:
+                self._fail(parsed.exception())
+            else:
+                self.future.set_result(parsed.result())
+        parsed.add_done_callback(done)
+
+
+def parse_async(xml_input, loop=None, offload=False, executor=None,
+                budget=0.01, chunk_size=64 * 1024):
+    """
+    Parse the property list ``xml_input`` on the ``asyncio`` (or
+    ``trollius`` on Python 2) event loop ``loop``, and return a future
+    of the result. ``xml_input`` can be a string, a file-like object,
+    or an ``asyncio.StreamReader``, which are read in ``chunk_size``
+    chunks.
+
+    The input is parsed incrementally, and the loop can run other
+    callbacks every ``budget`` seconds. If ``offload`` is true, only
+    the input is read on the loop, and it is parsed in ``executor``
+    (the loop's default executor if ``None``). Note that a thread pool
+    executor still takes the GIL, so use a process pool executor for
+    huge property lists.
+
+        plist = yield From(parse_async(reader))
+    """
+    try:
+        import asyncio
+    except ImportError:
+        import trollius as asyncio
+
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    return _AsyncParse(asyncio, loop, xml_input, offload, executor,
+                       budget, chunk_size).future
+
+
+class Data(object):
+    """
+    The contents of a ``<data>`` element returned by
+    ``XmlPropertyListParser(data='lazy')``. The base64 text is decoded
+    on the first ``str()``, and then released. A ``Data`` is equal to
+    the decoded ``str``.
+
+    >>> data = XmlPropertyListParser(data='lazy').parse(
+    ...     '<plist version="1.0"><data>UHl0aG9u</data></plist>')
+    >>> data
+    Data(base64='UHl0aG9u')
+    >>> str(data), data == 'Python'
+    ('Python', True)
+    """
+
+    __slots__ = ('_base64', '_bytes')
+
+    def __init__(self, base64=None, bytes=None):
+        self._base64, self._bytes = base64, bytes
+
+    def __str__(self):
+        if self._bytes is None:
+            import base64
+            try:
+                self._bytes = base64.b64decode(self._base64)
+            except TypeError, e:
+                raise PropertyListParseError("Failed to decode <data>: %s" % e)
+            self._base64 = None
+        return self._bytes
+
+    def base64(self):
+        """Return the base64 text, without decoding if possible."""
+        if self._base64 is not None:
+            return ''.join(self._base64.split())
+        import base64
+        return base64.b64encode(self._bytes)
+
+    def __len__(self):
+        return len(str(self))
+
+    def __eq__(self, other):
+        if isinstance(other, Data):
+            other = str(other)
+        return isinstance(other, str) and str(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        if self._base64 is not None:
+            return 'Data(base64=%r)' % self._base64
+        return 'Data(bytes=%r)' % self._bytes
+
+    def __reduce__(self):
+        return (Data, (self._base64, self._bytes))
+
+
+class _LazyContainer(object):
+    # Holds the span of a container in the property list, and the ``dict``
+    # or ``list`` decoded from it on first access. Proxies don't subclass
+    # ``dict`` or ``list``, whose storage functions in C (``dict(d)`` and
+    # ``json.dumps()``, for example) read directly, and would see it empty.
+
+    __slots__ = ('_parser', '_start', '_end', '_value')
+    __hash__ = None
+
+    def __init__(self, parser, start, end):
+        self._parser, self._start, self._end = parser, start, end
+        self._value = None
+
+    def _load(self):
+        value = self._type()
+        self._parser._load_lazy(value, self._start, self._end)
+        self._parser, self._value = None, value
+        return value
+
+
+class LazyDict(_LazyContainer):
+    """
+    A ``dict`` proxy returned by ``XmlPropertyListParser.parse(lazy=True)``.
+    Its contents are decoded from the property list on first access.
+
+    It is not a ``dict`` subclass. ``dict(d)`` and ``d.copy()`` return
+    a ``dict``.
+    """
+
+    __slots__ = ()
+    _type = dict
+
+    def __reduce_ex__(self, protocol):
+        # Pickled (and copied) as a ``dict``
+        return (dict, (), None, None, self.iteritems())
+
+
+class LazyList(_LazyContainer):
+    """
+    A ``list`` proxy returned by ``XmlPropertyListParser.parse(lazy=True)``.
+    Its contents are decoded from the property list on first access.
+
+    It is not a ``list`` subclass. ``list(l)`` returns a ``list``.
+    """
+
+    __slots__ = ()
+    _type = list
+
+    def __reduce_ex__(self, protocol):
+        # Pickled (and copied) as a ``list``
+        return (list, (), None, iter(self))
+
+    def __radd__(self, other):
+        value = self._value
+        if value is None:
+            value = self._load()
+        return other + value
+
+
+def _loading(cls, name, operand=False):
+    # Returns the method ``name`` of ``LazyDict`` or ``LazyList`` ``cls``,
+    # which loads the container and calls the method of the decoded one.
+    # If ``operand`` is true, a proxy given as the argument is loaded too.
+    def load_and_call(self, *args, **kwargs):
+        value = self._value
+        if value is None:
+            value = self._load()
+        if operand and args and isinstance(args[0], _LazyContainer):
+            other = args[0]._value
+            if other is None:
+                other = args[0]._load()
+            args = (other, ) + args[1:]
+        result = getattr(value, name)(*args, **kwargs)
+        if result is value:
+            # ``+=`` and ``*=`` keep the proxy.
+            return self
+        return result
+    load_and_call.__name__ = name
+    load_and_call.__doc__ = getattr(cls._type, name).__doc__
+    return load_and_call
+
+for cls, names, operand_names in (
+    (LazyDict, ('__contains__', '__delitem__', '__getitem__', '__iter__',
+                '__len__', '__repr__', '__setitem__', 'clear', 'copy', 'get',
+                'has_key', 'items', 'iteritems', 'iterkeys', 'itervalues',
+                'keys', 'pop', 'popitem', 'setdefault', 'values', 'viewitems',
+                'viewkeys', 'viewvalues'),
+               ('__eq__', '__ge__', '__gt__', '__le__', '__lt__',
+                '__ne__', 'update')),
+    (LazyList, ('__contains__', '__delitem__', '__delslice__', '__getitem__',
+                '__getslice__', '__imul__', '__iter__', '__len__', '__mul__',
+                '__repr__', '__reversed__', '__rmul__', '__setitem__',
+                '__setslice__', 'append', 'count', 'extend', 'index', 'insert',
+                'pop', 'remove', 'reverse', 'sort'),
+               ('__add__', '__eq__', '__ge__', '__gt__', '__iadd__', '__le__',
+                '__lt__', '__ne__'))):
+    for name in names:
+        setattr(cls, name, _loading(cls, name))
+    for name in operand_names:
+        setattr(cls, name, _loading(cls, name, True))
+del cls, names, operand_names, name
+
+
+class DictItems(object):
+    """
+    Wraps an iterable of ``(key, value)`` pairs, so that property list
+    writers write it as a dictionary without building a ``dict``.
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+    def iteritems(self):
+        return iter(self.items)
+
+
+def _is_file(value):
+    # ``array.array`` has a deprecated ``read`` method in Python 2.
+    return hasattr(value, 'read') and not hasattr(value, 'typecode')
+
+
+def _file_pieces(fileobj, size=48 * 1024):
+    # Generates the contents of ``fileobj`` from the current position in
+    # pieces of a multiple of 3 bytes (except the last), which can be
+    # encoded to base64 one by one. The position is restored at the end,
+    # so the file can be written again.
+    position = None
+    if hasattr(fileobj, 'tell') and hasattr(fileobj, 'seek'):
+        position = fileobj.tell()
+    rest = ''
+    while True:
+        data = fileobj.read(size)
+        if not data:
+            break
+        data = rest + data
+        n = len(data) - len(data) % 3
+        rest = data[n:]
+        if n:
+            yield data[:n]
+    if rest:
+        yield rest
+    if position is not None:
+        fileobj.seek(position)
+
+
+class XmlPropertyListWriter(object):
+    """
+    The ``XmlPropertyListWriter`` class provides methods that
+    convert python objects to `Property Lists`_ in xml format.
+    It accepts the objects ``XmlPropertyListParser`` returns: ``str``
+    is written as a string if it is ASCII, or as data otherwise.
+
+    Arrays can be any iterable, and dictionaries any object with
+    ``iteritems()`` (see ``DictItems``), so that huge property lists
+    can be written without building them in memory. The output is
+    buffered and written to the stream in large chunks.
+
+    .. _Property List: http://developer.apple.com/documentation/Cocoa/Conceptual/PropertyLists/
+    """
+
+    import re
+    import binascii
+    import datetime
+
+    HEADER = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" '
+        '"http://www.apple.com/DTDs/PropertyList-1.0.dtd">\n'
+        '<plist version="1.0">\n')
+    FOOTER = '</plist>\n'
+
+    NON_ASCII_PATTERN = re.compile(r'[\x80-\xff]')
+    ESCAPE_PATTERN = re.compile(r'[&<>\r\x00-\x08\x0b\x0c\x0e-\x1f]')
+    INVALID_CHARACTER_PATTERN = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+    # ``str`` which can be written as is.
+    PLAIN_TEXT_PATTERN = re.compile(r'[^&<>\r\x00-\x08\x0b\x0c\x0e-\x1f\x80-\xff]*\Z')
+
+    # Flushes the output to the stream at this size.
+    BUFFER_SIZE = 64 * 1024
+
+    # ------------------------------------------------
+    # XmlPropertyListWriter private
+    # ------------------------------------------------
+    def _escape(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        if XmlPropertyListWriter.ESCAPE_PATTERN.search(text) is None:
+            return text
+        if XmlPropertyListWriter.INVALID_CHARACTER_PATTERN.search(text) is not None:
+            raise ValueError("Strings can't contain control characters: %r" % text)
+        return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;') \
+                   .replace('\r', '&#13;')
+
+    def _format_scalar(self, value):
+        # Returns the element for ``value``, or None if it is not a scalar.
+        if isinstance(value, str):
+            if XmlPropertyListWriter.NON_ASCII_PATTERN.search(value) is None:
+                return '<string>%s</string>' % self._escape(value)
+            return '<data>%s</data>' % XmlPropertyListWriter.binascii.b2a_base64(value)[:-1]
+        elif isinstance(value, unicode):
+            return '<string>%s</string>' % self._escape(value)
+        elif isinstance(value, bool):
+            return value and '<true/>' or '<false/>'
+        elif isinstance(value, (int, long)):
+            return '<integer>%d</integer>' % value
+        elif isinstance(value, float):
+            return '<real>%r</real>' % value
+        elif isinstance(value, Data):
+            return '<data>%s</data>' % value.base64()
+        elif isinstance(value, XmlPropertyListWriter.datetime.datetime):
+            if value.tzinfo is not None:
+                value = value.replace(tzinfo=None) - value.utcoffset()
+            return '<date>%04d-%02d-%02dT%02d:%02d:%02dZ</date>' % (
+                value.year, value.month, value.day,
+                value.hour, value.minute, value.second)
+        return None
+
+    # ------------------------------------------------
+    # XmlPropertyListWriter
+    # ------------------------------------------------
+    def write(self, plist, stream):
+        """
+        Write the python object ``plist`` to the file-like object
+        ``stream`` as a xml property list.
+
+        >>> from cStringIO import StringIO
+        >>> stream = StringIO()
+        >>> XmlPropertyListWriter().write(
+        ...     DictItems([('Python', (ext for ext in ('.py', '.pyc')))]), stream)
+        >>> XmlPropertyListParser().parse(stream.getvalue())
+        {'Python': ['.py', '.pyc']}
+        """
+        buffer_size = XmlPropertyListWriter.BUFFER_SIZE
+        escape, format_scalar = self._escape, self._format_scalar
+        plain_text = XmlPropertyListWriter.PLAIN_TEXT_PATTERN.match
+        chunks = [XmlPropertyListWriter.HEADER]
+        size = 0
+        indents = ['']
+        # (iterator, is dictionary, closing tag) for containers being written.
+        # Containers are written without recursion, so iterators are
+        # consumed only as fast as the output is written.
+        stack = [(iter((plist,)), False, None)]
+        while stack:
+            iterator, in_dict, close = stack[-1]
+            depth = len(stack) - 1
+            if depth == len(indents):
+                indents.append('\t' * depth)
+            indent = indents[depth]
+            for value in iterator:
+                if in_dict:
+                    key, value = value
+                    if key.__class__ is not str or plain_text(key) is None:
+                        if not isinstance(key, basestring):
+                            raise TypeError("Dictionary keys must be strings, but was %s" % type(key))
+                        key = escape(key)
+                    line = '%s<key>%s</key>\n' % (indent, key)
+                    chunks.append(line)
+                    size += len(line)
+
+                # Fast paths for common objects
+                cls = value.__class__
+                if cls is str and plain_text(value) is not None:
+                    element = '<string>%s</string>' % value
+                elif cls is int:
+                    element = '<integer>%d</integer>' % value
+                else:
+                    element = format_scalar(value)
+                if element is None:
+                    if _is_file(value):
+                        # A file, like ``<data>`` decoded to ``data_sink``,
+                        # is written in pieces.
+                        chunks.append(indent + '<data>\n')
+                        size += depth + 7
+                        for piece in _file_pieces(value):
+                            line = '%s%s\n' % (
+                                indent, XmlPropertyListWriter.binascii.b2a_base64(piece)[:-1])
+                            chunks.append(line)
+                            size += len(line)
+                            if size >= buffer_size:
+                                stream.write(''.join(chunks))
+                                chunks, size = [], 0
+                        element = '</data>'
+                    elif hasattr(value, 'iteritems'):
+                        if isinstance(value, dict) and not value:
+                            element = '<dict/>'
+                        else:
+                            chunks.append(indent + '<dict>\n')
+                            size += depth + 7
+                            stack.append((value.iteritems(), True, '</dict>'))
+                    elif hasattr(value, '__iter__'):
+                        if isinstance(value, (list, tuple)) and not value:
+                            element = '<array/>'
+                        else:
+                            chunks.append(indent + '<array>\n')
+                            size += depth + 8
+                            stack.append((iter(value), False, '</array>'))
+                    else:
+                        raise TypeError("Can't write %s to a property list." % type(value))
+                    if element is None:
+                        break
+
+                line = '%s%s\n' % (indent, element)
+                chunks.append(line)
+                size += len(line)
+                if size >= buffer_size:
+                    stream.write(''.join(chunks))
+                    chunks, size = [], 0
+            else:
+                stack.pop()
+                if close is not None:
+                    chunks.append('%s%s\n' % (indents[depth - 1], close))
+                    size += depth + len(close)
+        chunks.append(XmlPropertyListWriter.FOOTER)
+        stream.write(''.join(chunks))
+
+
+class BinaryPropertyListParser(object):
+    """
+    The ``BinaryPropertyListParser`` class provides methods that
+    convert `Property Lists`_ objects from binary format (``bplist00``).
+    It returns the same objects as ``XmlPropertyListParser``.
+
+    The input is memory-mapped when possible, and objects are decoded
+    only when they are reached from the top level object.
+
+    .. _Property List: http://developer.apple.com/documentation/Cocoa/Conceptual/PropertyLists/
+    """
+
+    import struct
+    import datetime
+
+    MAGIC = 'bplist00'
+    TRAILER = struct.Struct('>6xBBQQQ')
+    UINT_FORMATS = {1: 'B', 2: 'H', 4: 'L', 8: 'Q'}
+    SINT64 = struct.Struct('>q')
+    SINT128 = struct.Struct('>qQ')
+    FLOAT32 = struct.Struct('>f')
+    FLOAT64 = struct.Struct('>d')
+
+    # CFAbsoluteTime is seconds since 2001-01-01 00:00:00 (GMT)
+    EPOCH = datetime.datetime(2001, 1, 1)
+
+    def _assert(self, test, message):
+        if not test:
+            raise PropertyListParseError(message)
+
+    # ------------------------------------------------
+    # BinaryPropertyListParser private
+    # ------------------------------------------------
+    def _read_uints(self, offset, count, size):
+        import struct
+
+        buf = self.__buffer
+        if size in BinaryPropertyListParser.UINT_FORMATS:
+            return struct.unpack_from(
+                '>%d%s' % (count, BinaryPropertyListParser.UINT_FORMATS[size]), buf, offset)
+        values = []
+        for i in xrange(offset, offset + count * size, size):
+            value = 0
+            for c in buf[i:i + size]:
+                value = (value << 8) | ord(c)
+            values.append(value)
+        return values
+
+    def _read_length(self, offset, info):
+        # Returns (length, offset of contents)
+        if info != 0xF:
+            return info, offset + 1
+        marker = ord(self.__buffer[offset + 1])
+        self._assert(marker & 0xF0 == 0x10, "Invalid length marker 0x%02x" % marker)
+        size = 1 << (marker & 0xF)
+        return self._read_uints(offset + 2, 1, size)[0], offset + 2 + size
+
+    def _object(self, ref):
+        objects = self.__objects
+        if ref in objects:
+            return objects[ref]
+        if ref >= self.__count:
+            raise PropertyListParseError("Object reference %d out of range." % ref)
+
+        buf = self.__buffer
+        offset = self.__offsets[ref]
+        marker = ord(buf[offset])
+        kind = marker >> 4
+
+        # Object types are tested in order of frequency.
+        if kind == 0x5 or kind == 0x4:
+            length = marker & 0xF
+            if length == 0xF:
+                length, offset = self._read_length(offset, length)
+            else:
+                offset += 1
+            value = buf[offset:offset + length]
+        elif kind == 0x1:
+            size = 1 << (marker & 0xF)
+            if size == 16:
+                high, low = BinaryPropertyListParser.SINT128.unpack_from(buf, offset + 1)
+                value = (high << 64) | low
+            elif size == 8:
+                value = BinaryPropertyListParser.SINT64.unpack_from(buf, offset + 1)[0]
+            else:
+                value = self._read_uints(offset + 1, 1, size)[0]
+        elif kind == 0xD or kind == 0xA or kind == 0xC:
+            self._assert(ref not in self.__reached, "Object %d refers to itself." % ref)
+            length, offset = self._read_length(offset, marker & 0xF)
+            self.__reached[ref] = True
+            try:
+                if kind == 0xD:
+                    refs = self._read_uints(offset, length * 2, self.__ref_size)
+                    value = dict(zip(
+                        map(self._object, refs[:length]),
+                        map(self._object, refs[length:])))
+                else:
+                    refs = self._read_uints(offset, length, self.__ref_size)
+                    value = map(self._object, refs)
+            finally:
+                del self.__reached[ref]
+            # Shared by references, like plistlib and CoreFoundation, so
+            # that a container referenced many times is decoded once.
+        elif kind == 0x3:
+            import datetime
+
+            self._assert(marker == 0x33, "Invalid date marker 0x%02x" % marker)
+            seconds = BinaryPropertyListParser.FLOAT64.unpack_from(buf, offset + 1)[0]
+            value = BinaryPropertyListParser.EPOCH + datetime.timedelta(seconds=seconds)
+        elif kind == 0x2:
+            if marker == 0x22:
+                value = BinaryPropertyListParser.FLOAT32.unpack_from(buf, offset + 1)[0]
+            else:
+                self._assert(marker == 0x23, "Invalid real size 0x%02x" % marker)
+                value = BinaryPropertyListParser.FLOAT64.unpack_from(buf, offset + 1)[0]
+        elif kind == 0x0:
+            if marker == 0x08:
+                value = False
+            elif marker == 0x09:
+                value = True
+            elif marker == 0x00 or marker == 0x0F:
+                value = None
+            else:
+                raise PropertyListParseError("Unknown object marker 0x%02x" % marker)
+        elif kind == 0x6:
+            length, offset = self._read_length(offset, marker & 0xF)
+            value = buf[offset:offset + length * 2].decode('utf-16be')
+            # For compatibility with ``XmlPropertyListParser``,
+            # convert text string to ascii, if possible
+            try:
+                value = value.encode('ascii')
+            except UnicodeError:
+                pass
+        elif kind == 0x8:
+            value = self._read_uints(offset + 1, 1, (marker & 0xF) + 1)[0]
+        else:
+            raise PropertyListParseError("Unknown object marker 0x%02x" % marker)
+
+        objects[ref] = value
+        return value
+
+    def _parse_buffer(self, buf):
+        import struct
+
+        self._assert(buf[:8] == BinaryPropertyListParser.MAGIC,
+            "A binary property list must start with '%s'." % BinaryPropertyListParser.MAGIC)
+        trailer_size = BinaryPropertyListParser.TRAILER.size
+        self._assert(len(buf) >= 8 + trailer_size, "Missing trailer.")
+        (offset_size, self.__ref_size, self.__count, top,
+         offset_table) = BinaryPropertyListParser.TRAILER.unpack_from(
+            buf, len(buf) - trailer_size)
+        self._assert(
+            offset_table + self.__count * offset_size <= len(buf) - trailer_size,
+            "Offset table out of range.")
+
+        self.__buffer = buf
+        self.__objects, self.__reached = {}, {}
+        try:
+            try:
+                self.__offsets = self._read_uints(offset_table, self.__count, offset_size)
+                return self._object(top)
+            except (struct.error, IndexError, TypeError, ValueError, OverflowError), e:
+                raise PropertyListParseError(e)
+        finally:
+            self.__buffer = self.__offsets = self.__objects = self.__reached = None
+
+    # ------------------------------------------------
+    # BinaryPropertyListParser
+    # ------------------------------------------------
+    def parse(self, binary_input):
+        """
+        Parse the binary property list ``binary_input``, which can be
+        either a string or a file-like object.
+
+        >>> parser = BinaryPropertyListParser()
+        >>> parser.parse('bplist00\\xd1\\x01\\x02VPythonS.py'
+        ...              '\\x08\\x0b\\x12' + '\\x00' * 6 + '\\x01\\x01' +
+        ...              '\\x00' * 7 + '\\x03' + '\\x00' * 15 + '\\x16')
+        {'Python': '.py'}
+        """
+        if isinstance(binary_input, basestring):
+            return self._parse_buffer(binary_input)
+        elif not (hasattr(binary_input, 'read') and callable(getattr(binary_input, 'read'))):
+            raise TypeError('Can\'t convert %s to file-like-object' % type(binary_input))
+
+        try:
+            import mmap
+            buf = mmap.mmap(binary_input.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ImportError, AttributeError, EnvironmentError, ValueError):
+            # Not a regular file (or an empty file)
+            return self._parse_buffer(binary_input.read())
+        try:
+            return self._parse_buffer(buf)
+        finally:
+            buf.close()
+
+
+class BinaryPropertyListWriter(object):
+    """
+    The ``BinaryPropertyListWriter`` class provides methods that
+    convert python objects to `Property Lists`_ in binary format
+    (``bplist00``). It accepts the objects ``XmlPropertyListParser``
+    returns: ``str`` is written as an ASCII string if possible, or as
+    data otherwise.
+
+    Equal strings, numbers and dates are written only once and shared by
+    references, and references and offsets are as small as possible.
+
+    .. _Property List: http://developer.apple.com/documentation/Cocoa/Conceptual/PropertyLists/
+    """
+
+    import re
+    import struct
+    import datetime
+
+    MAGIC = BinaryPropertyListParser.MAGIC
+    TRAILER = BinaryPropertyListParser.TRAILER
+    EPOCH = BinaryPropertyListParser.EPOCH
+    UINT_FORMATS = BinaryPropertyListParser.UINT_FORMATS
+    UINT16 = struct.Struct('>H')
+    UINT32 = struct.Struct('>L')
+    SINT64 = BinaryPropertyListParser.SINT64
+    SINT128 = BinaryPropertyListParser.SINT128
+    FLOAT64 = BinaryPropertyListParser.FLOAT64
+    NON_ASCII_PATTERN = XmlPropertyListWriter.NON_ASCII_PATTERN
+    MEMOIZABLE_TYPES = dict.fromkeys([str, unicode, int, long, bool])
+
+    # Flushes written objects to the stream at this size.
+    BUFFER_SIZE = 64 * 1024
+
+    # ------------------------------------------------
+    # BinaryPropertyListWriter private
+    # ------------------------------------------------
+    def _uint_size(self, value):
+        if value < 1 << 8:
+            return 1
+        elif value < 1 << 16:
+            return 2
+        elif value < 1 << 32:
+            return 4
+        return 8
+
+    def _encode_int(self, value):
+        if 0 <= value < 1 << 8:
+            return '\x10' + chr(value)
+        elif 0 <= value < 1 << 16:
+            return '\x11' + BinaryPropertyListWriter.UINT16.pack(value)
+        elif 0 <= value < 1 << 32:
+            return '\x12' + BinaryPropertyListWriter.UINT32.pack(value)
+        elif -(1 << 63) <= value < 1 << 63:
+            return '\x13' + BinaryPropertyListWriter.SINT64.pack(value)
+        elif 0 <= value < 1 << 64:
+            # Unsigned 64-bit integers are stored in 128-bit.
+            return '\x14' + BinaryPropertyListWriter.SINT128.pack(0, value)
+        raise OverflowError("%d is too large for a property list integer." % value)
+
+    def _encode_length(self, marker, length):
+        if length < 15:
+            return chr(marker | length)
+        return chr(marker | 0xF) + self._encode_int(length)
+
+    def _encode_scalar(self, value):
+        # Returns the encoded ``value``, or None if it is not a scalar.
+        if isinstance(value, str):
+            if BinaryPropertyListWriter.NON_ASCII_PATTERN.search(value) is None:
+                return self._encode_length(0x50, len(value)) + value
+            return self._encode_length(0x40, len(value)) + value
+        elif isinstance(value, Data):
+            value = str(value)
+            return self._encode_length(0x40, len(value)) + value
+        elif _is_file(value):
+            # A file, like ``<data>`` decoded to ``data_sink``
+            value = ''.join(_file_pieces(value))
+            return self._encode_length(0x40, len(value)) + value
+        elif isinstance(value, unicode):
+            try:
+                encoded = value.encode('ascii')
+            except UnicodeError:
+                encoded = value.encode('utf-16be')
+                return self._encode_length(0x60, len(encoded) // 2) + encoded
+            return self._encode_length(0x50, len(encoded)) + encoded
+        elif isinstance(value, bool):
+            return value and '\x09' or '\x08'
+        elif isinstance(value, (int, long)):
+            return self._encode_int(value)
+        elif isinstance(value, float):
+            return '\x23' + BinaryPropertyListWriter.FLOAT64.pack(value)
+        elif isinstance(value, BinaryPropertyListWriter.datetime.datetime):
+            if value.tzinfo is not None:
+                value = value.replace(tzinfo=None) - value.utcoffset()
+            d = value - BinaryPropertyListWriter.EPOCH
+            return '\x33' + BinaryPropertyListWriter.FLOAT64.pack(
+                d.days * 86400 + d.seconds + d.microseconds / 1000000.0)
+        elif value is None:
+            return '\x00'
+        return None
+
+    def _flatten(self, value):
+        # Appends ``value`` and its contents to the object table,
+        # and returns the reference to ``value``.
+        objects = self.__objects
+        cls = value.__class__
+        if cls in BinaryPropertyListWriter.MEMOIZABLE_TYPES:
+            # Fast path for repeated values. Objects of other types may
+            # be equal but encoded differently (-0.0 and 0.0, for example).
+            key = (cls, value)
+            ref = self.__memo.get(key)
+            if ref is not None:
+                return ref
+        else:
+            key = None
+
+        encoded = self._encode_scalar(value)
+        if encoded is not None:
+            ref = self.__refs.get(encoded)
+            if ref is None:
+                ref = self.__refs[encoded] = len(objects)
+                objects.append(encoded)
+            if key is not None:
+                self.__memo[key] = ref
+            return ref
+
+        ref = len(objects)
+        objects.append(None)
+        if hasattr(value, 'iteritems'):
+            keys, values = [], []
+            for k, v in value.iteritems():
+                if not isinstance(k, basestring):
+                    raise TypeError("Dictionary keys must be strings, but was %s" % type(k))
+                keys.append(self._flatten(k))
+                values.append(self._flatten(v))
+            objects[ref] = (0xD0, len(keys), keys + values)
+        elif hasattr(value, '__iter__'):
+            refs = [self._flatten(v) for v in value]
+            objects[ref] = (0xA0, len(refs), refs)
+        else:
+            raise TypeError("Can't write %s to a property list." % type(value))
+        return ref
+
+    # ------------------------------------------------
+    # BinaryPropertyListWriter
+    # ------------------------------------------------
+    def write(self, plist, stream):
+        """
+        Write the python object ``plist`` to the file-like object
+        ``stream`` as a binary property list.
+
+        >>> from cStringIO import StringIO
+        >>> stream = StringIO()
+        >>> BinaryPropertyListWriter().write({'Python': '.py'}, stream)
+        >>> BinaryPropertyListParser().parse(stream.getvalue())
+        {'Python': '.py'}
+        """
+        import struct
+
+        UINT_FORMATS = BinaryPropertyListWriter.UINT_FORMATS
+        buffer_size = BinaryPropertyListWriter.BUFFER_SIZE
+        objects = self.__objects = []
+        self.__refs, self.__memo = {}, {}
+        try:
+            self._flatten(plist)
+            self.__refs = self.__memo = None
+
+            ref_size = self._uint_size(len(objects) - 1)
+            ref_format = '>%d' + UINT_FORMATS[ref_size]
+            offsets = []
+            position = 0
+            chunks, size = [BinaryPropertyListWriter.MAGIC], 8
+            for obj in objects:
+                offsets.append(position + size)
+                if type(obj) is not str:
+                    marker, length, refs = obj
+                    obj = self._encode_length(marker, length) + \
+                        struct.pack(ref_format % len(refs), *refs)
+                chunks.append(obj)
+                size += len(obj)
+                if size >= buffer_size:
+                    stream.write(''.join(chunks))
+                    position += size
+                    chunks, size = [], 0
+            position += size
+
+            offset_size = self._uint_size(offsets[-1])
+            chunks.append(struct.pack(
+                '>%d%s' % (len(offsets), UINT_FORMATS[offset_size]), *offsets))
+            chunks.append(BinaryPropertyListWriter.TRAILER.pack(
+                offset_size, ref_size, len(objects), 0, position))
+            stream.write(''.join(chunks))
+        finally:
+            self.__objects = self.__refs = self.__memo = None
+
+
+class AsciiPropertyListParser(object):
+    """
+    The ``AsciiPropertyListParser`` class provides methods that
+    convert `Property Lists`_ objects from old-style ASCII (OpenStep)
+    format, including ``.strings`` files and GNUstep extensions
+    (``<*I1>``, ``<*R1.5>``, ``<*BY>`` and ``<*D...>``). It returns
+    the same objects as ``XmlPropertyListParser``.
+
+    The input is split into tokens by a single regular expression,
+    so there is no loop over each character in python.
+
+    .. _Property List: http://developer.apple.com/documentation/Cocoa/Conceptual/PropertyLists/
+    """
+
+    import re
+
+    # Each token absorbs the whitespace and comments before it, and the most
+    # common form ``key = "string";`` (or ``key = <*I1>;``) of dictionary
+    # entries is matched as one token, to reduce the iterations of the parser
+    # loop.
+    TOKEN_PATTERN = re.compile(r'''
+        (?:\s+|//[^\n]*|/\*.*?\*/)*
+        (?:
+          (?P<entry>(?P<entry_key>%(string)s)
+              (?:\s+|//[^\n]*|/\*.*?\*/)* = (?:\s+|//[^\n]*|/\*.*?\*/)*
+              (?P<entry_value>%(string)s|<\*[IRBD][^>]*>)
+              (?:\s+|//[^\n]*|/\*.*?\*/)* ;)
+        | (?P<string>%(string)s)
+        | (?P<punctuation>[{}()=;,])
+        | <\*(?P<typed>[IRBD][^>]*)>
+        | <(?P<data>[\s0-9A-Fa-f]*)>
+        | (?P<invalid>\S)
+        | (?P<end>\Z)
+        )
+    ''' % {'string': r'''"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[\w$+/:.\-]+'''},
+        re.S | re.X)
+    ESCAPE_PATTERN = re.compile(r'\\(?:([0-7]{1,3})|U([0-9A-Fa-f]{1,4})|(.))', re.S)
+    ESCAPES = {
+        'a': '\a', 'b': '\b', 'f': '\f', 'n': '\n',
+        'r': '\r', 't': '\t', 'v': '\v',
+    }
+    NON_ASCII_PATTERN = re.compile(r'[\x80-\xff]')
+    WHITESPACE_PATTERN = re.compile(r'\s+')
+    DATETIME_PATTERN = re.compile(
+        r'(\d\d\d\d)-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d) ([+-])(\d\d)(\d\d)$')
+
+    # Parser states of a container
+    KEY, EQUALS, VALUE, SEPARATOR = range(4)
+
+    def _assert(self, test, message):
+        if not test:
+            raise PropertyListParseError(message)
+
+    # ------------------------------------------------
+    # AsciiPropertyListParser private
+    # ------------------------------------------------
+    def _unescape(self, match):
+        octal, hexadecimal, c = match.groups()
+        if octal is not None:
+            # NeXTSTEP encoding is approximated by Latin-1.
+            return unichr(int(octal, 8))
+        elif hexadecimal is not None:
+            return unichr(int(hexadecimal, 16))
+        return AsciiPropertyListParser.ESCAPES.get(c, c)
+
+    def _parse_string(self, token):
+        quote = token[0]
+        if quote == '"' or quote == "'":
+            token = token[1:-1]
+            if '\\' in token:
+                token = AsciiPropertyListParser.ESCAPE_PATTERN.sub(self._unescape, token)
+        if isinstance(token, unicode):
+            # For compatibility with ``XmlPropertyListParser``,
+            # convert text string to ascii, if possible
+            try:
+                token = token.encode('ascii')
+            except UnicodeError:
+                pass
+        return token
+
+    def _parse_data(self, text):
+        import binascii
+
+        text = AsciiPropertyListParser.WHITESPACE_PATTERN.sub('', text)
+        try:
+            return binascii.unhexlify(text)
+        except TypeError, e:
+            raise PropertyListParseError("Invalid data <%s>: %s" % (text, e))
+
+    def _parse_typed(self, kind, text):
+        try:
+            if kind == 'I':
+                return int(text)
+            elif kind == 'R':
+                return float(text)
+            elif kind == 'B':
+                self._assert(text in ('Y', 'N'), "Invalid boolean <*B%s>" % text)
+                return text == 'Y'
+        except ValueError, e:
+            raise PropertyListParseError(e)
+
+        import datetime
+
+        match = AsciiPropertyListParser.DATETIME_PATTERN.match(text)
+        self._assert(match is not None, "Failed to parse datetime '%s'" % text)
+        groups = match.groups()
+        d = datetime.datetime(*[int(v) for v in groups[:6]])
+        offset = datetime.timedelta(hours=int(groups[7]), minutes=int(groups[8]))
+        if groups[6] == '+':
+            return d - offset
+        return d + offset
+
+    def _decode(self, contents):
+        # Returns the text to be tokenized. It is ``str`` if ``contents``
+        # is ASCII, or ``unicode`` otherwise.
+        import codecs
+
+        if isinstance(contents, unicode):
+            return contents
+        for bom, encoding in ((codecs.BOM_UTF8, 'utf-8'),
+                              (codecs.BOM_UTF16_BE, 'utf-16-be'),
+                              (codecs.BOM_UTF16_LE, 'utf-16-le')):
+            if contents.startswith(bom):
+                return contents[len(bom):].decode(encoding)
+        if AsciiPropertyListParser.NON_ASCII_PATTERN.search(contents) is None:
+            return contents
+        try:
+            return contents.decode('utf-8')
+        except UnicodeError:
+            return contents.decode('latin-1')
+
+    def _parse_text(self, text):
+        KEY = AsciiPropertyListParser.KEY
+        EQUALS = AsciiPropertyListParser.EQUALS
+        VALUE = AsciiPropertyListParser.VALUE
+        SEPARATOR = AsciiPropertyListParser.SEPARATOR
+        parse_string = self._parse_string
+
+        # Open containers as [container, state, key, closing token]. The top
+        # level dictionary of a ``.strings`` file has no closing token.
+        stack = []
+        frame = None
+        plist = None
+        for match in AsciiPropertyListParser.TOKEN_PATTERN.finditer(text):
+            kind = match.lastgroup
+            if kind == 'entry':
+                if frame is None and plist is None:
+                    # ``"key" = "value";`` at top level starts a ``.strings`` file.
+                    frame = [{}, KEY, None, None]
+                    stack.append(frame)
+                    plist = frame[0]
+                if frame is None or frame[1] != KEY or frame[3] == ')':
+                    raise PropertyListParseError(
+                        "Unexpected dictionary entry at %d" % match.start(kind))
+                value = match.group('entry_value')
+                if value[0] == '<':
+                    value = self._parse_typed(value[2], value[3:-1])
+                else:
+                    value = parse_string(value)
+                frame[0][parse_string(match.group('entry_key'))] = value
+                continue
+
+            elif kind == 'end':
+                break
+
+            token = match.group(kind)
+            is_string = container = False
+            if kind == 'string':
+                value, is_string = parse_string(token), True
+            elif kind == 'typed':
+                value = self._parse_typed(token[0], token[1:])
+            elif kind == 'data':
+                value = self._parse_data(token)
+            elif kind == 'invalid':
+                raise PropertyListParseError(
+                    "Unexpected character %r at %d" % (token, match.start(kind)))
+            elif token == '{':
+                value, container = {}, '}'
+            elif token == '(':
+                value, container = [], ')'
+            else:
+                # Punctuations
+                if frame is None:
+                    # ``"key";`` at top level starts a ``.strings`` file.
+                    self._assert(isinstance(plist, basestring) and token in '=;',
+                        "Unexpected '%s' at %d" % (token, match.start(kind)))
+                    frame = [{}, EQUALS, plist, None]
+                    stack.append(frame)
+                    plist = frame[0]
+                state = frame[1]
+                if token == '=' and state == EQUALS:
+                    frame[1] = VALUE
+                elif token == ';' and state == SEPARATOR and frame[3] != ')':
+                    frame[1] = KEY
+                elif token == ';' and state == EQUALS and frame[3] != ')':
+                    # ``"key";`` in ``.strings`` files is ``"key" = "key";``
+                    frame[0][frame[2]] = frame[2]
+                    frame[1] = KEY
+                elif token == ',' and state == SEPARATOR and frame[3] == ')':
+                    frame[1] = VALUE
+                elif token == frame[3] and (state == KEY or (
+                        token == ')' and (state == VALUE or state == SEPARATOR))):
+                    stack.pop()
+                    frame = stack and stack[-1] or None
+                else:
+                    raise PropertyListParseError(
+                        "Unexpected '%s' at %d" % (token, match.start(kind)))
+                continue
+
+            # Adds the value to the current container
+            if frame is None:
+                self._assert(plist is None, "Multiple objects at top level")
+                plist = value
+            else:
+                state = frame[1]
+                if state == VALUE:
+                    if frame[3] == ')':
+                        frame[0].append(value)
+                    else:
+                        frame[0][frame[2]] = value
+                    frame[1] = SEPARATOR
+                elif state == KEY:
+                    self._assert(is_string,
+                        "Dictionary key must be a string at %d" % match.start(kind))
+                    frame[2] = value
+                    frame[1] = EQUALS
+                else:
+                    raise PropertyListParseError(
+                        "Missing separator before %d" % match.start(kind))
+            if container:
+                frame = [value, container == ')' and VALUE or KEY, None, container]
+                stack.append(frame)
+
+        if stack:
+            self._assert(len(stack) == 1 and frame[3] is None and frame[1] == KEY,
+                "Unexpected end of property list.")
+        elif plist is None:
+            # An empty ``.strings`` file
+            plist = {}
+        return plist
+
+    # ------------------------------------------------
+    # AsciiPropertyListParser
+    # ------------------------------------------------
+    def parse(self, ascii_input):
+        """
+        Parse the old-style ASCII property list ``ascii_input``, which can
+        be either a string or a file-like object.
+
+        >>> parser = AsciiPropertyListParser()
+        >>> parser.parse('{ Python = (".py", <2e7079>); }')
+        {'Python': ['.py', '.py']}
+        >>> parser.parse('"Python" = "Monty";')
+        {'Python': 'Monty'}
+        """
+        if isinstance(ascii_input, basestring):
+            contents = ascii_input
+        elif hasattr(ascii_input, 'read') and callable(getattr(ascii_input, 'read')):
+            contents = ascii_input.read()
+        else:
+            raise TypeError('Can\'t convert %s to file-like-object' % type(ascii_input))
+        return self._parse_text(self._decode(contents))
+
+
+# The start of XML property lists, after a byte order mark or whitespace
+_XML_PREFIXES = ('<?xml', '<!DOCTYPE', '<!--', '<plist')
+
+
+def _parse_file(path):
+    # Parses the property list file at ``path`` in any format, and returns
+    # ``(path, plist)``, or ``(path, PropertyListParseError)`` if failed.
+    try:
+        fin = open(path, 'rb')
+        try:
+            contents = fin.read()
+        finally:
+            fin.close()
+        if contents.startswith(BinaryPropertyListParser.MAGIC):
+            return path, BinaryPropertyListParser().parse(contents)
+        # An old-style property list may start with ``<`` of data too.
+        # Null bytes are of UTF-16.
+        head = contents[:128].replace('\x00', '').lstrip('\xef\xbb\xbf\xfe\xff \t\r\n')
+        for prefix in _XML_PREFIXES:
+            if head.startswith(prefix):
+                return path, XmlPropertyListParser().parse(contents)
+        return path, AsciiPropertyListParser().parse(contents)
+    except PropertyListParseError, e:
+        return path, e
+    except Exception, e:
+        # e.g. IOError, or ValueError for a broken number
+        return path, PropertyListParseError('%s: %s' % (path, e))
+
+
+def parse_many(paths, workers=None, chunksize=64, ordered=True):
+    """
+    Parse property list files at ``paths`` in ``workers`` processes
+    (the number of CPUs by default), and generate ``(path, plist)``.
+    XML, binary and old-style ASCII formats are detected.
+
+    Results are generated in order of ``paths``, or as they complete if
+    ``ordered`` is false. ``chunksize`` paths are sent to a worker at once.
+    If a file can't be parsed, ``plist`` is a ``PropertyListParseError``
+    instead, and other files are parsed as usual.
+
+    >>> for path, plist in parse_many(['/nonexistent'], workers=1):
+    ...     print path, isinstance(plist, PropertyListParseError)
+    /nonexistent True
+    """
+    if workers is None:
+        import multiprocessing
+        workers = multiprocessing.cpu_count()
+    if workers <= 1:
+        # No worker process is needed.
+        for path in paths:
+            yield _parse_file(path)
+        return
+
+    import multiprocessing
+    pool = multiprocessing.Pool(workers)
+    try:
+        if ordered:
+            results = pool.imap(_parse_file, paths, chunksize)
+        else:
+            results = pool.imap_unordered(_parse_file, paths, chunksize)
+        for result in results:
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class FrozenDict(dict):
+    """
+    A read-only ``dict`` returned by ``CachedPlistLoader(frozen=True)``.
+    Copies (``copy.deepcopy()``, for example) are plain ``dict``.
+    """
+
+    __slots__ = ()
+
+    def __reduce_ex__(self, protocol):
+        return (dict, (), None, None, self.iteritems())
+
+
+class FrozenList(list):
+    """
+    A read-only ``list`` returned by ``CachedPlistLoader(frozen=True)``.
+    Copies (``copy.deepcopy()``, for example) are plain ``list``.
+    """
+
+    __slots__ = ()
+
+    def __reduce_ex__(self, protocol):
+        return (list, (), None, iter(self))
+
+
+def _read_only(name):
+    def raise_error(self, *args, **kwargs):
+        raise TypeError("'%s' object is read-only" % type(self).__name__)
+    raise_error.__name__ = name
+    return raise_error
+
+for cls, names in (
+    (FrozenDict, ('__delitem__', '__setitem__', 'clear', 'pop', 'popitem',
+                  'setdefault', 'update')),
+    (FrozenList, ('__delitem__', '__delslice__', '__iadd__', '__imul__',
+                  '__setitem__', '__setslice__', 'append', 'extend', 'insert',
+                  'pop', 'remove', 'reverse', 'sort'))):
+    for name in names:
+        setattr(cls, name, _read_only(name))
+del cls, names, name
+
+
+def _copy_plist(value, dict_type=dict, list_type=list):
+    # Copies the containers of the property list ``value``. Other objects
+    # are immutable, and shared.
+    if isinstance(value, dict):
+        return dict_type([(k, _copy_plist(v, dict_type, list_type))
+                          for k, v in value.iteritems()])
+    elif isinstance(value, list):
+        return list_type([_copy_plist(v, dict_type, list_type) for v in value])
+    return value
+
+
+class CachedPlistLoader(object):
+    """
+    The ``CachedPlistLoader`` class loads property list files, and keeps
+    parsed results in a LRU cache. A cached result is used while the
+    resolved path, modification time and size of the file (and its
+    contents hash, if ``hash_contents`` is true) are not changed.
+
+    The cache holds at most ``max_entries`` files, and if ``max_bytes``
+    is given, results estimated at most ``max_bytes`` in total.
+
+    Each call of ``load()`` returns a new copy of the result, or the
+    cached result itself made of ``FrozenDict`` and ``FrozenList`` if
+    ``frozen`` is true, which is faster.
+
+    ``hits`` and ``misses`` count the calls of ``load()``.
+
+    >>> import tempfile, os
+    >>> fd, path = tempfile.mkstemp()
+    >>> os.write(fd, '<plist version="1.0"><dict><key>Python</key><string>.py</string></dict></plist>')
+    79
+    >>> os.close(fd)
+    >>> loader = CachedPlistLoader(frozen=True)
+    >>> loader.load(path)
+    {'Python': '.py'}
+    >>> loader.load(path)
+    {'Python': '.py'}
+    >>> loader.hits, loader.misses
+    (1, 1)
+    >>> os.remove(path)
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None, hash_contents=False,
+                 frozen=False, parser=XmlPropertyListParser):
+        import threading
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hash_contents = hash_contents
+        self.frozen = frozen
+        self.parser = parser
+        self.hits = self.misses = 0
+        # Estimated size of cached results
+        self.size = 0
+        self.__lock = threading.Lock()
+        # realpath -> [previous, next, realpath, signature, plist, size]
+        # The circular list from the sentinel ``__root`` is in order of use.
+        self.__entries = {}
+        root = self.__root = []
+        root[:] = [root, root, None, None, None, 0]
+
+    # ------------------------------------------------
+    # CachedPlistLoader private
+    # ------------------------------------------------
+    def _estimate_size(self, plist):
+        import sys
+
+        getsizeof = sys.getsizeof
+        size, stack = 0, [plist]
+        while stack:
+            value = stack.pop()
+            size += getsizeof(value)
+            if isinstance(value, dict):
+                stack.extend(value.iterkeys())
+                stack.extend(value.itervalues())
+            elif isinstance(value, list):
+                stack.extend(value)
+        return size
+
+    def _unlink(self, entry):
+        previous, next = entry[0], entry[1]
+        previous[1], next[0] = next, previous
+        del self.__entries[entry[2]]
+        self.size -= entry[5]
+
+    def _append(self, entry):
+        root = self.__root
+        last = root[0]
+        entry[0], entry[1] = last, root
+        last[1] = root[0] = entry
+        self.__entries[entry[2]] = entry
+        self.size += entry[5]
+
+    def _evict(self):
+        root = self.__root
+        while root[1] is not root and (
+              len(self.__entries) > self.max_entries or
+              (self.max_bytes is not None and self.size > self.max_bytes)):
+            self._unlink(root[1])
+
+    # ------------------------------------------------
+    # CachedPlistLoader
+    # ------------------------------------------------
+    def load(self, path):
+        """
+        Return the property list in the file at ``path``, parsing it only
+        if it is not cached or changed.
+        """
+        import os
+
+        realpath = os.path.realpath(path)
+        st = os.stat(realpath)
+        signature = (getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size)
+        contents = None
+        if self.hash_contents:
+            import hashlib
+
+            fin = open(realpath, 'rb')
+            try:
+                contents = fin.read()
+            finally:
+                fin.close()
+            signature += (hashlib.sha1(contents).digest(),)
+
+        self.__lock.acquire()
+        try:
+            entry = self.__entries.get(realpath)
+            if entry is not None and entry[3] == signature:
+                self.hits += 1
+                self._unlink(entry)
+                self._append(entry)
+                plist = entry[4]
+            else:
+                self.misses += 1
+                if entry is not None:
+                    self._unlink(entry)
+                plist = None
+        finally:
+            self.__lock.release()
+
+        if plist is not None:
+            if self.frozen:
+                return plist
+            return _copy_plist(plist)
+
+        # Parses the file outside of the lock
+        if contents is None:
+            fin = open(realpath, 'rb')
+            try:
+                plist = self.parser().parse(fin)
+            finally:
+                fin.close()
+        else:
+            plist = self.parser().parse(contents)
+        cached = _copy_plist(plist, FrozenDict, FrozenList)
+        size = 0
+        if self.max_bytes is not None:
+            size = self._estimate_size(cached)
+        if self.max_bytes is None or size <= self.max_bytes:
+            self.__lock.acquire()
+            try:
+                entry = self.__entries.get(realpath)
+                if entry is not None:
+                    self._unlink(entry)
+                self._append([None, None, realpath, signature, cached, size])
+                self._evict()
+            finally:
+                self.__lock.release()
+        if self.frozen:
+            return cached
+        return plist
+
+    def clear(self):
+        """Remove all cached results."""
+        self.__lock.acquire()
+        try:
+            root = self.__root
+            root[:] = [root, root, None, None, None, 0]
+            self.__entries.clear()
+            self.size = 0
+        finally:
+            self.__lock.release()
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+class XmlPropertyListIndex(object):
+    """
+    The ``XmlPropertyListIndex`` class looks up objects in a large XML
+    property list file by path, parsing only the container (or the value
+    in the top level container) which holds it.
+
+    The byte offset and length of every container (up to ``max_depth``
+    levels deep) and every value in the top level container are found in
+    a pass over the file, and saved in an index file (``<file>.index``,
+    or in the directory ``index_dir``). The index file is written with
+    ``marshal``, and is used while the file's modification time and size
+    are not changed.
+
+    The file is parsed by ``parser()``. If the file is not in an encoding
+    compatible with ASCII, such as UTF-16, nothing is indexed, and the
+    whole file is parsed instead.
+
+    >>> import tempfile, os
+    >>> fd, path = tempfile.mkstemp()
+    >>> os.write(fd, '<plist version="1.0"><dict><key>Tracks</key><dict>'
+    ...     '<key>1</key><dict><key>Name</key><string>A</string></dict>'
+    ...     '<key>2</key><dict><key>Name</key><string>B</string></dict>'
+    ...     '</dict></dict></plist>')
+    188
+    >>> os.close(fd)
+    >>> index = XmlPropertyListIndex(path)
+    >>> index.spans['Tracks', '2']
+    (120, 46)
+    >>> index.lookup('Tracks/2/Name')
+    'B'
+    >>> os.remove(path)
+    >>> os.remove(path + '.index')
+    """
+
+    # An index file contains two ``marshal`` objects: the header
+    # ``(INDEX_MAGIC, mtime, size, max_depth)`` of the file, and
+    # ``(prolog, spans)``, which is checked by ``_check_index``.
+    INDEX_MAGIC = 'plist_parser index 2'
+
+    def __init__(self, path, index_dir=None, max_depth=None, parser=XmlPropertyListParser):
+        self.path = path
+        self.index_dir = index_dir
+        self.max_depth = max_depth
+        self.parser = parser
+        self._load()
+
+    # ------------------------------------------------
+    # XmlPropertyListIndex private
+    # ------------------------------------------------
+    def _index_path(self):
+        import os
+
+        if self.index_dir is None:
+            return self.path + '.index'
+        import hashlib
+        name = hashlib.sha1(os.path.realpath(self.path)).hexdigest() + '.index'
+        return os.path.join(self.index_dir, name)
+
+    def _check_index(self, index):
+        # Returns ``index`` read from an index file, or raises ``ValueError``
+        # if it is not ``(prolog, spans)``.
+        if type(index) is not tuple or len(index) != 2:
+            raise ValueError("Invalid index")
+        prolog, spans = index
+        if not (prolog is None or type(prolog) is str) or type(spans) is not dict:
+            raise ValueError("Invalid index")
+        for path, span in spans.iteritems():
+            if type(path) is not tuple or type(span) is not tuple or len(span) != 2:
+                raise ValueError("Invalid index")
+            for component in path:
+                if type(component) not in (str, unicode, int, long):
+                    raise ValueError("Invalid index")
+            for number in span:
+                if type(number) not in (int, long):
+                    raise ValueError("Invalid index")
+        return index
+
+    def _load(self):
+        # Loads the index file, or builds it if it is missing or outdated.
+        import os
+
+        st = os.stat(self.path)
+        header = (XmlPropertyListIndex.INDEX_MAGIC,
+                  getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size, self.max_depth)
+        index_path = self._index_path()
+        # The sidecar cache files of the parser have the same format.
+        cache = XmlPropertyListParser()
+        index = cache._load_sidecar(index_path, header, self._check_index)
+        if index is None:
+            fin = open(self.path, 'rb')
+            try:
+                contents = fin.read()
+            finally:
+                fin.close()
+            index = XmlPropertyListParser()._index_containers(contents, self.max_depth)
+            if index is None:
+                index = (None, {})
+            cache._save_sidecar(index_path, header, st.st_mode & 0666, index)
+        self.__header = header
+        self.prolog, self.spans = index
+
+    def _resolve(self, path):
+        # Returns the longest prefix of ``path`` which is indexed, in the
+        # form of the index (array indices are ``int``).
+        if isinstance(path, basestring):
+            path = path and path.split('/') or ()
+        spans = self.spans
+        resolved = ()
+        for component in path:
+            if resolved + (component,) in spans:
+                resolved += (component,)
+            elif isinstance(component, basestring) and component.isdigit() and \
+                 resolved + (int(component),) in spans:
+                resolved += (int(component),)
+            else:
+                break
+        return resolved, tuple(path[len(resolved):])
+
+    # ------------------------------------------------
+    # XmlPropertyListIndex
+    # ------------------------------------------------
+    def lookup(self, path):
+        """
+        Return the object at ``path``, a path of keys and array indices
+        joined by ``/`` (or a sequence of them). ``KeyError`` or
+        ``IndexError`` is raised if there is no such object.
+        """
+        import os
+
+        st = os.stat(self.path)
+        if (getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size) != self.__header[1:3]:
+            self._load()
+        indexed, rest = self._resolve(path)
+        fin = open(self.path, 'rb')
+        try:
+            if indexed not in self.spans:
+                plist = self.parser().parse(fin)
+            else:
+                offset, length = self.spans[indexed]
+                fin.seek(offset)
+                plist = self.parser().parse(self.prolog + fin.read(length) + '</plist>')
+        finally:
+            fin.close()
+        for component in rest:
+            if isinstance(plist, dict):
+                plist = plist[component]
+            else:
+                plist = plist[int(component)]
+        return plist
+
+    def __contains__(self, path):
+        indexed, rest = self._resolve(path)
+        return not rest and indexed in self.spans
+
+    def __len__(self):
+        return len(self.spans)
 
 
 if __name__ == '__main__':
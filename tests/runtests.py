@@ -2,11 +2,27 @@
 
 import os
 import sys
+import array
+import copy
+import marshal
+import base64
+import pickle
+import shutil
+import struct
+import tempfile
+import datetime
 import unittest
+from cStringIO import StringIO
 from test import test_support
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from plist_parser import XmlPropertyListParser, PropertyListParseError
+from plist_parser import XmlPropertyListParser, PropertyListParseError, Data, \
+                         LazyDict, LazyList, XmlPropertyListPushParser, \
+                         XmlPropertyListWriter, DictItems, \
+                         BinaryPropertyListParser, BinaryPropertyListWriter, \
+                         AsciiPropertyListParser, CachedPlistLoader, \
+                         FrozenDict, FrozenList, ParseStats, XmlPropertyListIndex, \
+                         parse_many, parse_async
 
 # the directory contains sample .plist files
 PLIST_DIR = os.path.join(os.path.dirname(__file__), 'plist')
@@ -180,6 +196,1371 @@ class XmlPropertyListEtreeParserTest(XmlPropertyListGenericParserTest):
         return parser._parse_using_sax_parser(xmlin)
 
 
+class XmlPropertyListExpatParserTest(unittest.TestCase):
+
+    def parse(self, xmlin):
+        parser = XmlPropertyListParser()
+        return parser._parse_using_expat(xmlin)
+
+    def test_same_as_etree(self):
+        for name in ('elements.plist', 'datetime.plist', 'utf8.plist', 'simple.plist',
+                     'empty_dict.plist', 'empty_array.plist'):
+            contents = readPropertyListContents(name)
+            self.assertEqual(self.parse(contents),
+                             XmlPropertyListParser()._parse_using_etree(contents))
+        contents = '<plist version="1.0"><array><string>&lt;%s&gt;</string>' \
+                   '<string/><integer> -1 </integer><data>YQ==</data></array></plist>' % (
+            JP_HELLO.encode('utf-8') * 20000)
+        plist = self.parse(StringIO(contents))
+        self.assertEqual(plist, XmlPropertyListParser()._parse_using_etree(contents))
+        self.assertEqual(plist[1:], ['', -1, 'a'])
+        self.assertEqual(self.parse(contents.decode('utf-8')), plist)
+
+    def test_invalid_plist(self):
+        for name in ('invalid_key.plist', 'multiple_top_level.plist',
+                     'multiple_plist.plist', 'notxml.plist'):
+            self.assertRaises(PropertyListParseError,
+                              self.parse, readPropertyListContents(name))
+        self.assertRaises(PropertyListParseError, self.parse,
+                          '<plist version="1.0"><array><key>a</key></array></plist>')
+        self.assertRaises(PropertyListParseError, self.parse,
+                          '<plist version="1.0"><dict><key>a</key></dict></plist>')
+
+
+class XmlPropertyListIterparseTest(unittest.TestCase):
+
+    def iterparse(self, xmlin):
+        return list(XmlPropertyListParser().iterparse(xmlin))
+
+    def iterparsePropertyList(self, name):
+        return self.iterparse(readPropertyListContents(name))
+
+    def _build(self, events):
+        # Rebuilds the property list from ``events``.
+        root = None
+        stack = []
+        for event, path, value in events:
+            if event == 'end':
+                stack.pop()
+                continue
+            if event == 'start':
+                value = value()
+            if not stack:
+                root = value
+            elif isinstance(stack[-1], dict):
+                stack[-1][path[-1]] = value
+            else:
+                self.assertEqual(path[-1], len(stack[-1]))
+                stack[-1].append(value)
+            if event == 'start':
+                stack.append(value)
+        return root
+
+    def test_simple_plist(self):
+        self.assertEqual(self.iterparsePropertyList('simple.plist'), [
+            ('start', (), dict),
+            ('value', ('item 1',), 'Hello'),
+            ('end', (), dict),
+        ])
+
+    def test_empty_array_plist(self):
+        self.assertEqual(self.iterparsePropertyList('empty_array.plist'), [
+            ('start', (), list),
+            ('end', (), list),
+        ])
+
+    def test_top_level_value(self):
+        self.assertEqual(
+            self.iterparse('<plist version="1.0"><integer>1</integer></plist>'),
+            [('value', (), 1)])
+
+    def test_nested_paths(self):
+        events = self.iterparsePropertyList('elements.plist')
+        self.assert_(('value', ('nested dictionary', 'array item', 0), 'hello') in events)
+        self.assert_(('value', ('nested dictionary', 'array item', 2, 0, 'item'), 1) in events)
+        self.assert_(('start', ('nested dictionary', 'array item', 2), list) in events)
+
+    def test_same_as_parse(self):
+        for name in ('elements.plist', 'datetime.plist', 'utf8.plist', 'empty_dict.plist'):
+            plist = XmlPropertyListParser().parse(readPropertyListContents(name))
+            self.assertEqual(self._build(self.iterparsePropertyList(name)), plist)
+
+    def test_invalid_plist(self):
+        for name in ('invalid_key.plist', 'multiple_top_level.plist',
+                     'multiple_plist.plist', 'notxml.plist'):
+            self.assertRaises(
+                PropertyListParseError,
+                self.iterparsePropertyList, name)
+
+    def test_suspended(self):
+        # The parser can be used while a generator is suspended.
+        parser = XmlPropertyListParser()
+        contents = readPropertyListContents('simple.plist')
+        events = parser.iterparse(contents)
+        first = events.next()
+        self.assertEqual(parser.parse(contents), {'item 1': 'Hello'})
+        self.assertEqual([first] + list(events), self.iterparse(contents))
+
+
+class XmlPropertyListSelectTest(unittest.TestCase):
+
+    def select(self, name, patterns):
+        parser = XmlPropertyListParser()
+        return parser.parse(readPropertyListContents(name), select=patterns)
+
+    def test_select_values(self):
+        self.assertEqual(
+            self.select('elements.plist', ['string item', 'integer number item']),
+            [(('string item',), 'string value'), (('integer number item',), 12345)])
+
+    def test_select_container(self):
+        self.assertEqual(
+            self.select('elements.plist', ['nested dictionary/array item/2']),
+            [(('nested dictionary', 'array item', 2), [{'item': 1}])])
+
+    def test_select_wildcards(self):
+        self.assertEqual(
+            self.select('elements.plist', ['nested*/*/[12]/*']),
+            [(('nested dictionary', 'array item', 2, 0), {'item': 1})])
+        self.assertEqual(
+            self.select('elements.plist', ['nested dictionary/*e item']),
+            [(('nested dictionary', 'true item'), True),
+             (('nested dictionary', 'false item'), False)])
+
+    def test_select_sequence_pattern(self):
+        self.assertEqual(
+            self.select('datetime.plist', [(5,)]),
+            [((5,), XmlPropertyListParser().parse(
+                '<plist version="1.0"><date>2008Z</date></plist>'))])
+
+    def test_select_top_level(self):
+        plist = XmlPropertyListParser().parse(readPropertyListContents('elements.plist'))
+        self.assertEqual(self.select('elements.plist', ['']), [((), plist)])
+
+    def test_select_nothing(self):
+        self.assertEqual(self.select('elements.plist', ['no such item/*']), [])
+        self.assertEqual(self.select('elements.plist', []), [])
+
+    def test_skipped_values_are_not_decoded(self):
+        parser = XmlPropertyListParser()
+        xml = ('<plist version="1.0"><dict>'
+               '<key>a</key><date>invalid</date>'
+               '<key>b</key><array><data>%%%</data></array>'
+               '<key>c</key><integer>3</integer>'
+               '</dict></plist>')
+        self.assertEqual(parser.parse(xml, select=['c']), [(('c',), 3)])
+        self.assertRaises(PropertyListParseError, parser.parse, xml, select=['a'])
+
+    def test_invalid_plist(self):
+        self.assertRaises(
+            PropertyListParseError,
+            self.select, 'invalid_key.plist', ['*'])
+        self.assertRaises(
+            PropertyListParseError,
+            self.select, 'multiple_top_level.plist', ['nothing'])
+
+
+class XmlPropertyListLazyTest(unittest.TestCase):
+
+    def parse(self, xmlin):
+        return XmlPropertyListParser().parse(xmlin, lazy=True)
+
+    def parsePropertyList(self, name):
+        return self.parse(readPropertyListContents(name))
+
+    def test_same_as_parse(self):
+        for name in ('elements.plist', 'datetime.plist', 'utf8.plist',
+                     'simple.plist', 'empty_dict.plist', 'empty_array.plist'):
+            plist = XmlPropertyListParser().parse(readPropertyListContents(name))
+            self.assertEqual(self.parsePropertyList(name), plist)
+            self.assertEqual(plist, self.parsePropertyList(name))
+
+    def test_proxies(self):
+        plist = self.parsePropertyList('elements.plist')
+        self.assert_(isinstance(plist, LazyDict))
+        items = plist['nested dictionary']['array item']
+        self.assert_(isinstance(items, LazyList))
+        self.assertEqual(len(items), 3)
+        self.assertEqual(type(plist.copy()), dict)
+        self.assertEqual(type(copy.deepcopy(items)), list)
+        self.assertEqual(pickle.loads(pickle.dumps(items)), items)
+
+    def test_c_readers(self):
+        # Functions reading ``dict`` or ``list`` in C see the contents, or
+        # raise.
+        expected = XmlPropertyListParser().parse(readPropertyListContents('elements.plist'))
+        plist = self.parsePropertyList('elements.plist')
+        self.assertEqual(dict(plist), expected)
+        self.assertEqual(plist, expected)
+        updated = {}
+        updated.update(self.parsePropertyList('elements.plist'))
+        self.assertEqual(updated, expected)
+        self.assertEqual((lambda **kwargs: kwargs)(**self.parsePropertyList('simple.plist')),
+                         {'item 1': 'Hello'})
+        items = self.parsePropertyList('elements.plist')['nested dictionary']['array item']
+        self.assertEqual(list(items), expected['nested dictionary']['array item'])
+        self.assertEqual([0] + items, [0] + expected['nested dictionary']['array item'])
+        items += [1]
+        self.assert_(isinstance(items, LazyList))
+        try:
+            import json
+        except ImportError:
+            pass
+        else:
+            self.assertRaises(TypeError, json.dumps, self.parsePropertyList('elements.plist'))
+
+    def test_text(self):
+        plist = self.parse(
+            '<?xml version="1.0" encoding="UTF-8"?>\n<plist version="1.0"><array>'
+            '<string>a &amp; &lt;b&gt; &#65;&#x42;</string>'
+            '<string><![CDATA[<c>&amp;]]></string>'
+            '<string>%s</string><string>1\r\n2</string>'
+            '<!-- <dict> --><string/><true/><dict/>'
+            '<string>x<!-- <c> -->y</string></array></plist>' % JP_HELLO.encode('utf-8'))
+        self.assertEqual(plist, ['a & <b> AB', '<c>&amp;', JP_HELLO, '1\n2', '', True, {}, 'xy'])
+
+    def test_top_level_value(self):
+        self.assertEqual(self.parse('<plist version="1.0"><integer>1</integer></plist>'), 1)
+
+    def test_errors_on_access(self):
+        plist = self.parse('<plist version="1.0"><dict>'
+                           '<key>a</key><string>b</string>'
+                           '<key>c</key><array><date>x</date></array>'
+                           '</dict></plist>')
+        self.assertEqual(plist['a'], 'b')
+        self.assertRaises(PropertyListParseError, len, plist['c'])
+        # raised again, not returning a partial list
+        self.assertRaises(PropertyListParseError, len, plist['c'])
+
+    def test_invalid_plist(self):
+        for name in ('multiple_top_level.plist', 'multiple_plist.plist', 'notxml.plist'):
+            self.assertRaises(PropertyListParseError, self.parsePropertyList, name)
+        self.assertRaises(PropertyListParseError, self.parse,
+                          '<plist version="1.0"><dict><array></dict></array></plist>')
+        plist = self.parsePropertyList('invalid_key.plist')
+        self.assertRaises(PropertyListParseError, len, plist)
+
+
+class XmlPropertyListPushParserTest(unittest.TestCase):
+
+    def feed(self, contents, size):
+        parser = XmlPropertyListPushParser()
+        for i in range(0, len(contents), size):
+            parser.feed(contents[i:i + size])
+        return parser.close()
+
+    def test_same_as_parse(self):
+        for name in ('elements.plist', 'datetime.plist', 'utf8.plist',
+                     'simple.plist', 'empty_dict.plist', 'empty_array.plist'):
+            contents = readPropertyListContents(name)
+            plist = XmlPropertyListParser().parse(contents)
+            for size in (1, 7, len(contents)):
+                self.assertEqual(self.feed(contents, size), plist)
+
+    def test_invalid_plist(self):
+        for name in ('invalid_key.plist', 'multiple_top_level.plist',
+                     'multiple_plist.plist', 'notxml.plist'):
+            self.assertRaises(PropertyListParseError,
+                              self.feed, readPropertyListContents(name), 16)
+        self.assertRaises(PropertyListParseError, XmlPropertyListPushParser().close)
+
+    def test_unfinished_plist(self):
+        parser = XmlPropertyListPushParser()
+        parser.feed('<plist version="1.0"><dict>')
+        self.assertRaises(PropertyListParseError, parser.close)
+
+    def test_reuse(self):
+        parser = XmlPropertyListPushParser()
+        self.assertRaises(PropertyListParseError, parser.feed, '<plist><</plist>')
+        for name in ('simple.plist', 'empty_array.plist'):
+            parser.feed(readPropertyListContents(name))
+            self.assertEqual(parser.close(),
+                XmlPropertyListParser().parse(readPropertyListContents(name)))
+
+
+class XmlPropertyListSidecarTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'a.plist')
+        self.write({'a': ['b']})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, value):
+        xmlout = open(self.path, 'wb')
+        try:
+            XmlPropertyListWriter().write(value, xmlout)
+        finally:
+            xmlout.close()
+
+    def parse(self, sidecar=True):
+        xmlin = open(self.path, 'rb')
+        try:
+            return XmlPropertyListParser(sidecar=sidecar).parse(xmlin)
+        finally:
+            xmlin.close()
+
+    def replaceCache(self, cache, value, dump=marshal.dump):
+        # Keeps the header, so that ``value`` is loaded from ``cache``.
+        fin = open(cache, 'rb')
+        try:
+            header = marshal.load(fin)
+        finally:
+            fin.close()
+        fout = open(cache, 'wb')
+        try:
+            dump(header, fout, 2)
+            dump(value, fout, 2)
+        finally:
+            fout.close()
+
+    def test_cache_file(self):
+        cache = self.path + '.cache'
+        self.assertEqual(self.parse(), {'a': ['b']})
+        self.assert_(os.path.isfile(cache))
+        self.replaceCache(cache, 'cached')
+        self.assertEqual(self.parse(), 'cached')
+        self.assertEqual(self.parse(sidecar=None), {'a': ['b']})
+
+    def test_cache_directory(self):
+        directory = os.path.join(self.directory, 'cache')
+        self.assertEqual(self.parse(directory), {'a': ['b']})
+        self.assertEqual(len(os.listdir(directory)), 1)
+        self.replaceCache(os.path.join(directory, os.listdir(directory)[0]), 'cached')
+        self.assertEqual(self.parse(directory), 'cached')
+        self.assert_(not os.path.exists(self.path + '.cache'))
+
+    def test_stale_cache(self):
+        self.parse()
+        self.write({'a': ['bc']})
+        self.assertEqual(self.parse(), {'a': ['bc']})
+        self.assertEqual(self.parse(), {'a': ['bc']})
+
+    def test_broken_cache(self):
+        self.parse()
+        fout = open(self.path + '.cache', 'wb')
+        try:
+            fout.write('broken')
+        finally:
+            fout.close()
+        self.assertEqual(self.parse(), {'a': ['b']})
+        self.replaceCache(self.path + '.cache', 'rebuilt')
+        self.assertEqual(self.parse(), 'rebuilt')
+
+    def test_options(self):
+        value = {'date': datetime.datetime(2008, 8, 2, 5, 25, 50), 'data': Data(bytes='\xff'),
+                 'ints': [1, 2], 'reals': [0.5]}
+        self.write(value)
+        for options in ({}, {'dates': 'aware', 'data': 'lazy'}, {'arrays': 'array'},
+                        {'arrays': 'numpy'}, {'dates': 'epoch'}):
+            xmlin = open(self.path, 'rb')
+            try:
+                expected = XmlPropertyListParser(**options).parse(xmlin)
+                for i in range(2):
+                    xmlin.seek(0)
+                    plist = XmlPropertyListParser(sidecar=True, **options).parse(xmlin)
+                    self.assertEqual(plist, expected)
+                    self.assertEqual(
+                        [type(plist[k]) for k in sorted(plist)],
+                        [type(expected[k]) for k in sorted(expected)])
+            finally:
+                xmlin.close()
+            os.remove(self.path + '.cache')
+
+    def test_untrusted_cache(self):
+        # Only property list objects are read, and pickles never loaded.
+        self.parse()
+        marker = os.path.join(self.directory, 'marker')
+        class Exploit(object):
+            def __reduce__(self):
+                return (os.mkdir, (marker, ))
+        self.replaceCache(self.path + '.cache', Exploit(), pickle.dump)
+        self.assertEqual(self.parse(), {'a': ['b']})
+        self.assert_(not os.path.exists(marker))
+        self.replaceCache(self.path + '.cache', {'a': (1, )})
+        self.assertEqual(self.parse(), {'a': ['b']})
+
+    def test_stats(self):
+        for cache_hit in (False, True):
+            xmlin = open(self.path, 'rb')
+            try:
+                parser = XmlPropertyListParser(sidecar=True, stats=True)
+                self.assertEqual(parser.parse(xmlin), {'a': ['b']})
+            finally:
+                xmlin.close()
+            self.assertEqual(parser.stats.cache_hit, cache_hit)
+            self.assertEqual(parser.stats.as_dict()['cache_hit'], cache_hit)
+            if cache_hit:
+                self.assertEqual(parser.stats.elements, {})
+            else:
+                self.assertEqual(parser.stats.elements['string'], 1)
+
+    def test_string_input(self):
+        contents = readPropertyListContents('simple.plist')
+        self.assertEqual(XmlPropertyListParser(sidecar=True).parse(contents),
+                         {'item 1': 'Hello'})
+
+
+class XmlPropertyListParallelTest(unittest.TestCase):
+
+    def write(self, value):
+        stream = StringIO()
+        XmlPropertyListWriter().write(value, stream)
+        return stream.getvalue()
+
+    def assertSameAsParse(self, contents):
+        expected = XmlPropertyListParser().parse(contents)
+        self.assertEqual(XmlPropertyListParser().parse(contents, workers=2), expected)
+
+    def test_same_as_parse(self):
+        for name in ('elements.plist', 'datetime.plist', 'utf8.plist',
+                     'simple.plist', 'empty_dict.plist', 'empty_array.plist'):
+            self.assertSameAsParse(readPropertyListContents(name))
+
+    def test_split_nested_container(self):
+        tracks = dict([(str(i), {'Name': 'Track %d' % i, 'Play Count': i})
+                       for i in range(100)])
+        self.assertSameAsParse(self.write({
+            'Major Version': 1,
+            'Tracks': tracks,
+            'Playlists': [{'Name': 'Library', 'Items': range(10)}],
+        }))
+        self.assertSameAsParse(self.write([[i, 'a' * i, [i]] for i in range(100)]))
+
+    def test_duplicated_key(self):
+        # The larger container is overridden by the later one.
+        large = ''.join(['<key>%d</key><integer>%d</integer>' % (i, i) for i in range(200)])
+        self.assertSameAsParse('<plist version="1.0"><dict>'
+                               '<key>a</key><dict>%s</dict>'
+                               '<key>a</key><dict><key>b</key><true/></dict>'
+                               '</dict></plist>' % large)
+
+    def test_invalid_plist(self):
+        contents = self.write([[i] for i in range(100)]).replace(
+            '<integer>50</integer>', '<key>50</key>')
+        self.assertRaises(PropertyListParseError,
+                          XmlPropertyListParser().parse, contents, workers=2)
+
+
+class XmlPropertyListInternTest(unittest.TestCase):
+
+    def setUp(self):
+        stream = StringIO()
+        XmlPropertyListWriter().write(
+            [{'Name': 'Track %d' % i, 'Kind': 'MPEG audio file'} for i in range(3)], stream)
+        self.contents = stream.getvalue()
+
+    def assertShared(self, plist, keys, strings):
+        names = [[k for k in track if k == 'Name'][0] for track in plist]
+        kinds = [track['Kind'] for track in plist]
+        self.assertEqual(names[0] is names[1] is names[2], keys)
+        self.assertEqual(kinds[0] is kinds[1] is kinds[2], strings)
+
+    def test_intern_keys(self):
+        parser = XmlPropertyListParser(intern_keys=True)
+        plist = parser.parse(self.contents)
+        self.assertEqual(plist, XmlPropertyListParser().parse(self.contents))
+        self.assertShared(plist, True, False)
+        # 2 keys in the 2nd and 3rd dictionaries
+        self.assertEqual(parser.interned, 4)
+        self.assert_(parser.interned_bytes > 4 * len('Kind'))
+
+    def test_intern_strings(self):
+        parser = XmlPropertyListParser(intern_keys=True, intern_strings=15)
+        self.assertShared(parser.parse(self.contents), True, True)
+        self.assertEqual(parser.interned, 6)
+        parser = XmlPropertyListParser(intern_strings=14)
+        self.assertShared(parser.parse(self.contents), False, False)
+        self.assertEqual((parser.interned, parser.interned_bytes), (0, 0))
+
+    def test_push_lazy_and_iterparse(self):
+        parser = XmlPropertyListPushParser(intern_keys=True, intern_strings=64)
+        parser.feed(self.contents)
+        self.assertShared(parser.close(), True, True)
+        parser = XmlPropertyListParser(intern_keys=True, intern_strings=64)
+        self.assertShared(parser.parse(self.contents, lazy=True), True, True)
+        values = [value for event, path, value in parser.iterparse(self.contents)
+                  if path[-1:] == ('Kind',)]
+        self.assert_(values[0] is values[1] is values[2])
+
+
+class XmlPropertyListDateTest(unittest.TestCase):
+
+    def parse(self, contents, **options):
+        return XmlPropertyListParser(**options).parse(contents)
+
+    def dates(self, *dates):
+        return '<plist><array>%s</array></plist>' % ''.join(
+            ['<date>%s</date>' % d for d in dates])
+
+    def test_naive(self):
+        plist = self.parse(readPropertyListContents('datetime.plist'))
+        self.assertEqual(plist[0], datetime.datetime(2008, 8, 2, 5, 25, 50))
+        self.assertEqual(plist[1], datetime.datetime(2008, 8, 2, 5, 25))
+        self.assertEqual(plist[5], datetime.datetime(2008, 1, 1))
+        self.assertEqual(plist, self.parse(readPropertyListContents('datetime.plist'),
+                                           date_cache=0))
+
+    def test_aware_and_epoch(self):
+        contents = readPropertyListContents('datetime.plist')
+        naive = self.parse(contents)
+        aware = self.parse(contents, dates='aware')
+        self.assertEqual([d.replace(tzinfo=None) for d in aware], naive)
+        self.assertEqual(aware[0].utcoffset(), datetime.timedelta(0))
+        self.assertEqual(pickle.loads(pickle.dumps(aware, 2)), aware)
+        self.assertEqual(self.parse(contents, dates='epoch')[0], 1217654750)
+        self.assertEqual(self.parse(self.dates('1970-01-01T00:00:00Z', '1969Z'),
+                                    dates='epoch'), [0, -31536000])
+        self.assertRaises(ValueError, XmlPropertyListParser, dates='local')
+
+    def test_cache(self):
+        parser = XmlPropertyListParser(date_cache=2)
+        contents = self.dates('2008-08-02T05:25:50Z', '2008Z', '2009Z', '2008-08-02T05:25:50Z')
+        plist = parser.parse(contents)
+        self.assertEqual(plist[0], plist[3])
+        self.assert_(plist[0] is not plist[3])
+        self.assertEqual(parser.parse(contents), plist)
+        plist = self.parse(self.dates('2008Z', '2008Z'))
+        self.assert_(plist[0] is plist[1])
+
+    def test_lazy_and_workers(self):
+        contents = self.dates(*['20%02dZ' % i for i in range(50)])
+        expected = self.parse(contents, dates='epoch')
+        parser = XmlPropertyListParser(dates='epoch')
+        self.assertEqual(list(parser.parse(contents, lazy=True)), expected)
+        self.assertEqual(parser.parse(contents, workers=2), expected)
+
+    def test_invalid_date(self):
+        for date in ('2008-13-02T05:25:50Z', '2008-08-02T05:25:5xZ', '2008-08-02 05:25:50Z',
+                     '08-08-02Z', ''):
+            self.assertRaises(PropertyListParseError, self.parse, self.dates(date))
+
+
+class XmlPropertyListDataTest(unittest.TestCase):
+
+    def setUp(self):
+        stream = StringIO()
+        self.blobs = ['\xff' * 100, '\x00\x80' * 50000]
+        XmlPropertyListWriter().write({'blobs': self.blobs}, stream)
+        self.contents = stream.getvalue()
+
+    def parse(self, **options):
+        return XmlPropertyListParser(**options).parse(self.contents)['blobs']
+
+    def test_lazy(self):
+        blobs = self.parse(data='lazy')
+        self.assert_(isinstance(blobs[0], Data))
+        self.assertEqual(blobs, self.blobs)
+        self.assertEqual((str(blobs[1]), len(blobs[1])), (self.blobs[1], 100000))
+        self.assertEqual(pickle.loads(pickle.dumps(blobs, 2)), self.blobs)
+        stream = StringIO()
+        XmlPropertyListWriter().write(self.parse(data='lazy'), stream)
+        self.assertEqual(XmlPropertyListParser().parse(stream.getvalue()), self.blobs)
+        stream = StringIO()
+        BinaryPropertyListWriter().write(blobs, stream)
+        self.assertEqual(BinaryPropertyListParser().parse(stream.getvalue()), self.blobs)
+        broken = XmlPropertyListParser(data='lazy').parse(
+            '<plist version="1.0"><data>AAA</data></plist>')
+        self.assertRaises(PropertyListParseError, str, broken)
+
+    def test_base64(self):
+        blobs = self.parse(data='base64')
+        self.assert_(isinstance(blobs[0], memoryview))
+        self.assertEqual([base64.b64decode(b.tobytes()) for b in blobs], self.blobs)
+
+    def test_sink(self):
+        blobs = self.parse(data_threshold=1000, data='lazy')
+        self.assert_(isinstance(blobs[0], Data))
+        self.assertEqual(blobs[1].read(), self.blobs[1])
+        files = []
+        def sink():
+            files.append(StringIO())
+            return files[-1]
+        XmlPropertyListParser.DATA_PIECE_SIZE, size = 77, XmlPropertyListParser.DATA_PIECE_SIZE
+        try:
+            blobs = self.parse(data_threshold=0, data_sink=sink)
+        finally:
+            XmlPropertyListParser.DATA_PIECE_SIZE = size
+        self.assertEqual(blobs, files)
+        self.assertEqual([f.getvalue() for f in files], self.blobs)
+        self.assertRaises(PropertyListParseError, XmlPropertyListParser(data_threshold=0).parse,
+                          '<plist version="1.0"><data>AAA</data></plist>')
+
+    def test_sink_roundtrip(self):
+        blobs = self.parse(data_threshold=0)
+        for writer, parser in [(XmlPropertyListWriter, XmlPropertyListParser),
+                               (BinaryPropertyListWriter, BinaryPropertyListParser)]:
+            for i in range(2):
+                stream = StringIO()
+                writer().write(blobs, stream)
+                self.assertEqual(parser().parse(stream.getvalue()), self.blobs)
+
+    def test_options(self):
+        self.assertRaises(ValueError, XmlPropertyListParser, data='str')
+        parser = XmlPropertyListParser(data='base64')
+        self.assertEqual(parser.parse(self.contents, workers=2), parser.parse(self.contents))
+        self.assert_(isinstance(parser.parse(self.contents, lazy=True)['blobs'][0], memoryview))
+
+
+class XmlPropertyListArraysTest(unittest.TestCase):
+
+    def setUp(self):
+        self.plist = {'ints': range(-5, 100), 'reals': [0.5, 1e100],
+                      'nested': [[1, 2], [[3.0]], []],
+                      'mixed': [1, 2.0], 'bools': [True, False], 'long': [2 ** 70]}
+        stream = StringIO()
+        XmlPropertyListWriter().write(self.plist, stream)
+        self.contents = stream.getvalue()
+
+    def tolist(self, plist):
+        if isinstance(plist, dict):
+            return dict([(k, self.tolist(v)) for k, v in plist.items()])
+        elif isinstance(plist, (list, array.array)):
+            return [self.tolist(v) for v in plist]
+        return plist
+
+    def test_array(self):
+        plist = XmlPropertyListParser(arrays='array').parse(self.contents)
+        self.assertEqual(self.tolist(plist), self.plist)
+        self.assertEqual((plist['ints'].typecode, plist['reals'].typecode), ('l', 'd'))
+        self.assertEqual(plist['nested'][0].typecode, 'l')
+        self.assertEqual(plist['nested'][1][0].typecode, 'd')
+        for key in ('mixed', 'bools', 'long'):
+            self.assertEqual(type(plist[key]), list)
+        self.assertEqual(type(plist['nested'][2]), list)
+        top = XmlPropertyListParser(arrays='array').parse(
+            '<plist version="1.0"><array><real>1</real></array></plist>')
+        self.assertEqual(top, array.array('d', [1.0]))
+        stream = StringIO()
+        XmlPropertyListWriter().write(plist, stream)
+        self.assertEqual(XmlPropertyListParser().parse(stream.getvalue()), self.plist)
+
+    def test_numpy(self):
+        plist = XmlPropertyListParser(arrays='numpy').parse(self.contents)
+        try:
+            import numpy
+        except ImportError:
+            self.assert_(isinstance(plist['ints'], array.array))
+        else:
+            self.assert_(isinstance(plist['ints'], numpy.ndarray))
+            self.assertEqual(plist['reals'].dtype, numpy.float64)
+        self.assertEqual(list(plist['ints']), self.plist['ints'])
+        self.assertEqual(type(plist['mixed']), list)
+
+    def test_options(self):
+        self.assertRaises(ValueError, XmlPropertyListParser, arrays='tuple')
+        parser = XmlPropertyListParser(arrays='array')
+        self.assertEqual(type(parser.parse(self.contents, workers=2)['ints']), array.array)
+        self.assertEqual(parser.parse(self.contents, select=['ints']),
+                         [(('ints', ), self.plist['ints'])])
+        # ignored in lazy mode
+        plist = parser.parse(self.contents, lazy=True)
+        self.assertEqual(type(plist['ints']), LazyList)
+        self.assertEqual(type(plist['nested'][0]), LazyList)
+        self.assertEqual(plist, self.plist)
+        self.assertEqual(parser.parse('<plist version="1.0"><dict><key>a</key>'
+                                      '<array><integer>1</integer></array></dict></plist>'),
+                         {'a': array.array('l', [1])})
+
+
+class XmlPropertyListColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        added = datetime.datetime(2008, 8, 2, 5, 25, 50)
+        self.tracks = DictItems([
+            ('10', {'Name': 'A', 'Size': 1, 'Rate': 1, 'Added': added, 'Tags': ['x']}),
+            ('20', {'Name': u'\u65e5', 'Rate': 0.5, 'Loved': True, 'Tags': 'y'}),
+            ('30', {'Name': 'A', 'Size': 2 ** 70, 'Rate': 2, 'Loved': False, 'Added': added}),
+        ])
+        self.added = added
+        stream = StringIO()
+        XmlPropertyListWriter().write(
+            DictItems([('Tracks', self.tracks), ('Playlists', [{'Name': 'P'}])]), stream)
+        self.contents = stream.getvalue()
+
+    def masks(self, table, name):
+        return [bool(flag) for flag in table.masks[name]]
+
+    def test_columns(self):
+        table = XmlPropertyListParser().parse_columns(self.contents, 'Tracks')
+        self.assertEqual(table.keys, ['10', '20', '30'])
+        self.assertEqual(len(table), 3)
+        self.assertEqual(sorted(table), ['Added', 'Loved', 'Name', 'Rate', 'Size', 'Tags'])
+        self.assertEqual(list(table['Name']), ['A', u'\u65e5', 'A'])
+        self.assert_(table['Name'][0] is table['Name'][2])
+        self.assertEqual(list(table['Rate']), [1.0, 0.5, 2.0])
+        self.assertEqual(list(table['Loved']), [False, True, False])
+        self.assertEqual(self.masks(table, 'Loved'), [True, False, False])
+        self.assertEqual(self.masks(table, 'Added'), [False, True, False])
+        # a long which doesn't fit, and mixed types
+        self.assertEqual(list(table['Size']), [1, None, 2 ** 70])
+        self.assertEqual(list(table['Tags']), [['x'], 'y', None])
+        try:
+            import numpy
+        except ImportError:
+            self.assertEqual(table['Rate'].typecode, 'd')
+            self.assertEqual(table['Added'], [self.added, None, self.added])
+        else:
+            self.assertEqual(table['Rate'].dtype, numpy.float64)
+            self.assertEqual(table['Added'].dtype, numpy.dtype('datetime64[us]'))
+
+    def test_select(self):
+        table = XmlPropertyListParser().parse_columns(
+            self.contents, ['Tracks'], ['Size', 'Loved', 'Missing'])
+        self.assertEqual(sorted(table), ['Loved', 'Missing', 'Size'])
+        self.assertEqual(table.keys, ['10', '20', '30'])
+        self.assertEqual(self.masks(table, 'Missing'), [True, True, True])
+        # a record without any of the columns
+        table = XmlPropertyListParser().parse_columns(self.contents, 'Tracks', ['Loved'])
+        self.assertEqual(table.keys, ['10', '20', '30'])
+        self.assertEqual(self.masks(table, 'Loved'), [True, False, False])
+        table = XmlPropertyListParser().parse_columns(self.contents, 'Playlists')
+        self.assertEqual((table.keys, list(table['Name'])), ([0], ['P']))
+        table = XmlPropertyListParser().parse_columns(self.contents, 'Tracks', ['N*'])
+        self.assertEqual(list(table), ['N*'])
+
+
+class XmlPropertyListStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        stream = StringIO()
+        self.plist = {'Tracks': {'1': {'Name': u'\u65e5', 'Size': 1, 'Played': True},
+                                 '2': {'Name': 'b', 'Rate': 0.5, 'Data': '\xff'}},
+                      'Dates': [datetime.datetime(2008, 8, 2, 5, 25, 50)]}
+        XmlPropertyListWriter().write(self.plist, stream)
+        self.contents = stream.getvalue()
+
+    def test_disabled(self):
+        parser = XmlPropertyListParser()
+        parser.parse(self.contents)
+        self.assertEqual(parser.stats, None)
+
+    def test_stats(self):
+        parser = XmlPropertyListParser(stats=True)
+        for contents in (self.contents, StringIO(self.contents)):
+            self.assertEqual(parser.parse(contents), self.plist)
+            stats = parser.stats
+            self.assert_(isinstance(stats, ParseStats))
+            self.assertEqual(stats.elements,
+                             {'plist': 1, 'dict': 4, 'array': 1, 'key': 10, 'string': 2,
+                              'integer': 1, 'real': 1, 'true': 1, 'data': 1, 'date': 1})
+            self.assertEqual(stats.bytes_read, len(self.contents))
+            self.assertEqual((stats.max_depth, stats.containers), (3, 5))
+            self.assertEqual(sorted(stats.times),
+                             ['booleans', 'containers', 'data', 'dates', 'keys',
+                              'numbers', 'strings', 'xml'])
+            self.assert_(stats.total_time >= sum(stats.times.values()) - 1e-6)
+            self.assertEqual(stats.as_dict()['elements']['key'], 10)
+
+    def test_serial(self):
+        parser = XmlPropertyListParser(stats=True)
+        self.assertEqual(parser.parse(self.contents, workers=2), self.plist)
+        self.assertEqual(parser.stats.containers, 5)
+        parser.parse(self.contents, lazy=True)
+        self.assertEqual(parser.stats, None)
+
+
+class XmlPropertyListLimitsTest(unittest.TestCase):
+
+    DEEP = '<plist version="1.0">' + '<array>' * 20 + '</array>' * 20 + '</plist>'
+
+    def setUp(self):
+        stream = StringIO()
+        XmlPropertyListWriter().write(
+            [u'\u65e5\u672c\u8a9e', 'abc', '\xff' * 30, {'key': 1}], stream)
+        # without DOCTYPE, which makes ``xml.sax`` fetch the DTD
+        header, doctype, contents = stream.getvalue().split('\n', 2)
+        self.contents = header + '\n' + contents
+
+    def assertLimit(self, contents, **limits):
+        # The limit itself is allowed, and exceeding it raises in every way
+        # of parsing.
+        XmlPropertyListParser(**limits).parse(contents)
+        for name, value in limits.items():
+            limits[name] = value - 1
+        parser = XmlPropertyListParser(**limits)
+        self.assertRaises(PropertyListParseError, parser.parse, contents)
+        self.assertRaises(PropertyListParseError, parser._parse_using_etree, contents)
+        self.assertRaises(PropertyListParseError, parser._parse_using_sax_parser, contents)
+        self.assertRaises(PropertyListParseError,
+                          lambda: copy.deepcopy(parser.parse(contents, lazy=True)))
+        self.assertRaises(PropertyListParseError, list, parser.iterparse(contents))
+        try:
+            parser.parse(contents)
+        except PropertyListParseError, e:
+            message = str(e)
+        # The whole document in a chunk, or in small chunks
+        for size in (len(contents), 7):
+            pusher = XmlPropertyListPushParser(**limits)
+            try:
+                for i in xrange(0, len(contents), size):
+                    pusher.feed(contents[i:i + size])
+                pusher.close()
+            except PropertyListParseError, e:
+                self.assertEqual(str(e), message)
+            else:
+                self.fail('PropertyListParseError not raised')
+
+    def test_depth(self):
+        self.assertLimit(self.DEEP, max_depth=20)
+        parser = XmlPropertyListParser(max_depth=19)
+        self.assertRaises(PropertyListParseError, parser.parse, self.DEEP, select=['0/0'])
+        for empty in ('<array/>', '<dict/>'):
+            contents = '<plist version="1.0"><array><array>%s</array></array></plist>' % empty
+            self.assertLimit(contents, max_depth=3)
+            parser = XmlPropertyListParser(max_depth=2)
+            self.assertRaises(PropertyListParseError, parser.parse, contents, lazy=True)
+
+    def test_elements(self):
+        self.assertLimit(self.contents, max_elements=8)
+
+    def test_string(self):
+        # in characters, not in bytes
+        self.assertLimit(self.contents, max_string=3)
+
+    def test_indented(self):
+        # Whitespace between elements isn't text of any element.
+        stream = StringIO()
+        XmlPropertyListWriter().write({'a': [[{'b': ['ab', '\xff' * 3]}]]}, stream)
+        header, doctype, contents = stream.getvalue().split('\n', 2)
+        self.assertLimit(header + '\n' + contents, max_string=2)
+        self.assertLimit(header + '\n' + contents, max_data=3)
+        contents = '<plist version="1.0"><array><string>ab</string>%s</array></plist>' % (' ' * 20)
+        self.assertEqual(XmlPropertyListParser(max_string=2).parse(contents), ['ab'])
+
+    def test_data(self):
+        self.assertLimit(self.contents, max_data=30)
+
+    def test_bytes(self):
+        self.assertLimit(self.contents, max_bytes=len(self.contents))
+        parser = XmlPropertyListParser(max_bytes=len(self.contents) - 1)
+        self.assertRaises(PropertyListParseError, parser.parse, StringIO(self.contents))
+
+    def test_early(self):
+        # A stream which never ends
+        class Endless(object):
+            def __init__(self, head, body):
+                self.head, self.body = head, body
+            def read(self, size=-1):
+                head, self.head = self.head, ''
+                return head + self.body * ((size - len(head)) // len(self.body))
+        for element, limits in (('string', {'max_string': 1000}),
+                                ('data', {'max_data': 1000}),
+                                ('array', {'max_depth': 1000}),
+                                ('string', {'max_bytes': 100000})):
+            stream = Endless('<plist version="1.0"><%s>' % element,
+                             element == 'array' and '<array>' or 'AAAA')
+            self.assertRaises(PropertyListParseError,
+                              XmlPropertyListParser(**limits).parse, stream)
+
+
+class XmlPropertyListIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'a.plist')
+        self.plist = {
+            'Version': 1,
+            'Tracks': dict([('%d' % i, {'Name': u'T\u65e5 %d' % i, 'Size': i, 'Tags': [i]})
+                            for i in range(50)]),
+            'Playlists': [{'Name': 'P', 'Items': [1, 2]}, {'Name': 'Q', 'Empty': {}}],
+            'Data': '\xff\x00',
+        }
+        self.write(self.plist)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, value, prefix=''):
+        stream = StringIO()
+        XmlPropertyListWriter().write(value, stream)
+        xmlout = open(self.path, 'wb')
+        try:
+            xmlout.write(prefix + stream.getvalue())
+        finally:
+            xmlout.close()
+
+    def assertLookups(self, index):
+        for path, value in [('Version', self.plist['Version']), ('Data', '\xff\x00'),
+                            ('Tracks/7', self.plist['Tracks']['7']),
+                            (('Tracks', '42', 'Name'), u'T\u65e5 42'),
+                            ('Tracks/42/Tags/0', 42),
+                            ('Playlists/1', self.plist['Playlists'][1]),
+                            ((u'Playlists', 0, 'Items'), [1, 2]), ('Playlists/1/Empty', {}),
+                            ('', self.plist)]:
+            self.assertEqual(index.lookup(path), value)
+        self.assertRaises(KeyError, index.lookup, 'Tracks/50')
+        self.assertRaises(IndexError, index.lookup, 'Playlists/2')
+
+    def test_lookup(self):
+        index = XmlPropertyListIndex(self.path)
+        self.assert_(os.path.exists(self.path + '.index'))
+        self.assert_('Tracks/7' in index and ('Playlists', 0, 'Items') in index)
+        self.assert_('Tracks/7/Name' not in index)
+        self.assertEqual(len(index), 4 + 1 + 50 * 2 + 2 + 2)
+        fin = open(self.path, 'rb')
+        try:
+            offset, length = index.spans['Playlists', 0]
+            fin.seek(offset)
+            self.assertEqual(XmlPropertyListParser().parse(fin.read(length)),
+                             self.plist['Playlists'][0])
+        finally:
+            fin.close()
+        self.assertLookups(index)
+        # The index file is used, and rebuilt when the file is changed.
+        self.assertEqual(XmlPropertyListIndex(self.path).spans, index.spans)
+        self.plist['Version'] = 12345
+        self.write(self.plist, '\xef\xbb\xbf')
+        self.assertEqual(index.lookup('Version'), 12345)
+        self.assertLookups(XmlPropertyListIndex(self.path))
+
+    def test_options(self):
+        index = XmlPropertyListIndex(self.path, index_dir=self.directory, max_depth=1)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.assert_('Tracks' in index and 'Tracks/7' not in index)
+        self.assertLookups(index)
+        self.write(['a'])
+        self.assertEqual(XmlPropertyListIndex(self.path, index_dir=self.directory).lookup('0'), 'a')
+        self.write('a')
+        index = XmlPropertyListIndex(self.path)
+        self.assertEqual((len(index), index.lookup('')), (0, 'a'))
+
+    def test_untrusted_index(self):
+        # An index file of another shape, or a pickle, is rebuilt.
+        spans = XmlPropertyListIndex(self.path).spans
+        index_path = self.path + '.index'
+        fin = open(index_path, 'rb')
+        try:
+            header = marshal.load(fin)
+        finally:
+            fin.close()
+        for dump, value in [(marshal.dump, ('', {('Version', ): (0, 1, 2)})),
+                            (marshal.dump, ('', {('Version', ): (0, 1.5)})),
+                            (marshal.dump, ('', [])),
+                            (pickle.dump, ('', spans))]:
+            fout = open(index_path, 'wb')
+            try:
+                dump(header, fout, 2)
+                dump(value, fout, 2)
+            finally:
+                fout.close()
+            index = XmlPropertyListIndex(self.path)
+            self.assertEqual(index.spans, spans)
+            self.assertLookups(index)
+
+
+class XmlPropertyListWriterTest(unittest.TestCase):
+
+    def write(self, plist):
+        stream = StringIO()
+        XmlPropertyListWriter().write(plist, stream)
+        return stream.getvalue()
+
+    def roundtrip(self, plist):
+        return XmlPropertyListParser().parse(self.write(plist))
+
+    def test_roundtrip_plist(self):
+        for name in ('elements.plist', 'utf8.plist', 'datetime.plist',
+                     'empty_dict.plist', 'empty_array.plist'):
+            plist = XmlPropertyListParser().parse(readPropertyListContents(name))
+            self.assertEqual(self.roundtrip(plist), plist)
+
+    def test_roundtrip_scalars(self):
+        plist = [
+            0, -1, 2 ** 64, 0.1, -0.0, True, False, '', JP_HELLO, '\xff\x00',
+            'a & b <c> \r\n\t', datetime.datetime(2008, 8, 2, 5, 25, 50),
+        ]
+        self.assertEqual(self.roundtrip(plist), plist)
+        self.assertEqual(self.roundtrip({'<&>': 1, JP_JAPANESE: 2}), {'<&>': 1, JP_JAPANESE: 2})
+
+    def test_elements(self):
+        xml = self.write({'a': ['b', [], {}], 'c': '\xff'})
+        self.assert_(xml.startswith('<?xml version="1.0" encoding="UTF-8"?>'))
+        self.assert_('\t\t<string>b</string>\n\t\t<array/>\n\t\t<dict/>\n' in xml)
+        self.assert_('<data>/w==</data>' in xml)
+
+    def test_iterables(self):
+        plist = DictItems(('%d' % i, (j for j in range(i))) for i in range(3))
+        self.assertEqual(self.roundtrip(plist), {'0': [], '1': [0], '2': [0, 1]})
+
+    def test_streaming(self):
+        stream = StringIO()
+        def items():
+            for i in range(20000):
+                yield 'item %d' % i
+            # the preceding items were already written.
+            self.assert_(stream.tell() > XmlPropertyListWriter.BUFFER_SIZE)
+        XmlPropertyListWriter().write(items(), stream)
+        self.assertEqual(len(XmlPropertyListParser().parse(stream.getvalue())), 20000)
+
+    def test_invalid_objects(self):
+        self.assertRaises(TypeError, self.write, {1: 'a'})
+        self.assertRaises(TypeError, self.write, [None])
+        self.assertRaises(ValueError, self.write, ['\x00'])
+
+
+class BinaryPropertyListParserTest(unittest.TestCase):
+
+    def parse(self, binin):
+        return BinaryPropertyListParser().parse(binin)
+
+    def parsePropertyList(self, name):
+        binin = open(getPropertyListFilepath(name), 'rb')
+        try:
+            return self.parse(binin)
+        finally:
+            binin.close()
+
+    def _trailer(self, offset_size, ref_size, count, top, offset_table):
+        return struct.pack('>6xBBQQQ', offset_size, ref_size, count, top, offset_table)
+
+    def _testSameAsXml(self, name):
+        expected = XmlPropertyListParser().parse(readPropertyListContents(name + '.plist'))
+        binary_name = name + '_binary.plist'
+        self.assertEqual(self.parsePropertyList(binary_name), expected)
+        self.assertEqual(self.parse(readPropertyListContents(binary_name)), expected)
+        self.assertEqual(self.parse(StringIO(readPropertyListContents(binary_name))), expected)
+
+    def test_elements_plist(self):
+        self._testSameAsXml('elements')
+
+    def test_non_ascii_plist(self):
+        self._testSameAsXml('utf8')
+        plist = self.parsePropertyList('utf8_binary.plist')
+        self.assertEqual(plist[JP_JAPANESE], JP_HELLO)
+
+    def test_scalars(self):
+        objects = [
+            '\x10\x7f', '\x11\x01\x00', '\x13\xff\xff\xff\xff\xff\xff\xff\xff',
+            '\x22\x3f\xc0\x00\x00', '\x33\x41\xae\x18\x9a\x9a\x00\x00\x00',
+            '\x08', '\x09', '\x43abc', '\x5f\x10\x0f' + 'x' * 15,
+        ]
+        top = '\xaf\x10\x09' + ''.join([chr(i) for i in range(1, 10)])
+        body, offsets = 'bplist00', []
+        for o in [top] + objects:
+            offsets.append(len(body))
+            body += o
+        plist = self.parse(body + ''.join(map(chr, offsets)) +
+            self._trailer(1, 1, len(offsets), 0, len(body)))
+        self.assertEqual(plist, [
+            127, 256, -1, 1.5, datetime.datetime(2009, 1, 1, 1, 1, 1),
+            False, True, 'abc', 'x' * 15])
+
+    def test_not_binary_plist(self):
+        self.assertRaises(
+            PropertyListParseError,
+            self.parsePropertyList, 'elements.plist')
+        self.assertRaises(PropertyListParseError, self.parse, 'bplist00')
+
+    def test_invalid_reference(self):
+        # an array contains itself.
+        self.assertRaises(
+            PropertyListParseError,
+            self.parse, 'bplist00\xa1\x00\x08' + self._trailer(1, 1, 1, 0, 10))
+        # an array contains a missing object.
+        self.assertRaises(
+            PropertyListParseError,
+            self.parse, 'bplist00\xa1\x05\x08' + self._trailer(1, 1, 1, 0, 10))
+
+    def test_shared_containers(self):
+        # Every array refers to the next one twice, which takes 2 ** 40
+        # decodings unless containers are shared.
+        body, offsets = 'bplist00', []
+        for i in range(40):
+            offsets.append(len(body))
+            body += '\xa2' + chr(i + 1) * 2
+        offsets.append(len(body))
+        body += '\xa0'
+        plist = self.parse(body + ''.join(map(chr, offsets)) +
+            self._trailer(1, 1, len(offsets), 0, len(body)))
+        self.assert_(plist[0] is plist[1])
+        for i in range(39):
+            plist = plist[0]
+        self.assertEqual(plist, [[], []])
+
+    def test_truncated_plist(self):
+        contents = readPropertyListContents('elements_binary.plist')
+        self.assertRaises(PropertyListParseError, self.parse, contents[:-8])
+
+
+class BinaryPropertyListWriterTest(unittest.TestCase):
+
+    def write(self, plist):
+        stream = StringIO()
+        BinaryPropertyListWriter().write(plist, stream)
+        return stream.getvalue()
+
+    def roundtrip(self, plist):
+        return BinaryPropertyListParser().parse(self.write(plist))
+
+    def trailer(self, plist):
+        # (offset size, reference size, number of objects, top, offset table)
+        return struct.unpack('>6xBBQQQ', self.write(plist)[-32:])
+
+    def test_roundtrip_plist(self):
+        for name in ('elements.plist', 'utf8.plist', 'datetime.plist',
+                     'empty_dict.plist', 'empty_array.plist'):
+            plist = XmlPropertyListParser().parse(readPropertyListContents(name))
+            self.assertEqual(self.roundtrip(plist), plist)
+
+    def test_roundtrip_scalars(self):
+        plist = [
+            0, 255, 256, 65536, 2 ** 32, -1, -2 ** 63, 2 ** 63, 2 ** 64 - 1,
+            0.0, -0.0, 1.5, True, False, 'x' * 100, JP_HELLO * 20, '\xff\x00',
+            datetime.datetime(2008, 8, 2, 5, 25, 50, 500000),
+        ]
+        result = self.roundtrip(plist)
+        self.assertEqual(result, plist)
+        self.assertEqual(repr(result[10]), '-0.0')
+
+    def test_iterables(self):
+        self.assertEqual(self.roundtrip((1, 2)), [1, 2])
+        self.assertEqual(self.roundtrip({'a': iter(['b'])}), {'a': ['b']})
+
+    def test_deduplication(self):
+        # array, 'a', 1, True and 1.0
+        self.assertEqual(self.trailer(['a', 'a', u'a', 1, 1L, True, 1.0, 1.0])[2], 5)
+        # array, 0.0 and -0.0
+        self.assertEqual(self.trailer([0.0, -0.0, 0.0])[2], 3)
+        d = datetime.datetime(2008, 1, 1)
+        self.assertEqual(self.trailer({'a': d, 'b': [d, 'a']})[2], 5)
+
+    def test_reference_and_offset_size(self):
+        self.assertEqual(self.trailer(range(10))[:2], (1, 1))
+        self.assertEqual(self.trailer(range(300))[:2], (2, 2))
+        self.assertEqual(self.trailer(['x' * 300, 'y'])[:2], (2, 1))
+
+    def test_invalid_objects(self):
+        self.assertRaises(TypeError, self.write, {1: 'a'})
+        self.assertRaises(TypeError, self.write, [object()])
+        self.assertRaises(OverflowError, self.write, 2 ** 64)
+
+
+class AsciiPropertyListParserTest(unittest.TestCase):
+
+    def parse(self, asciiin):
+        return AsciiPropertyListParser().parse(asciiin)
+
+    def parsePropertyList(self, name):
+        asciiin = open(getPropertyListFilepath(name), 'rb')
+        try:
+            return self.parse(asciiin)
+        finally:
+            asciiin.close()
+
+    def test_notxml_plist(self):
+        plist = self.parsePropertyList('notxml.plist')
+        self.assertEqual(plist, {'New item': '', 'New item - 2': ''})
+
+    def test_same_as_xml(self):
+        expected = XmlPropertyListParser().parse(readPropertyListContents('elements.plist'))
+        self.assertEqual(self.parsePropertyList('elements_ascii.plist'), expected)
+
+    def test_strings_file(self):
+        plist = self.parsePropertyList('utf16.strings')
+        self.assertEqual(plist, {'Hello': JP_HELLO, 'Japanese': JP_JAPANESE, 'OK': 'OK'})
+        self.assertEqual(self.parse(''), {})
+        self.assertEqual(self.parse('/* empty */\n'), {})
+
+    def test_scalars(self):
+        self.assertEqual(self.parse('abc'), 'abc')
+        self.assertEqual(self.parse("'a\\tb\\101\\\"'"), 'a\tbA"')
+        self.assertEqual(self.parse('"%s"' % JP_HELLO.encode('utf-8')), JP_HELLO)
+        self.assertEqual(self.parse(u'"%s"' % JP_HELLO), JP_HELLO)
+        self.assertEqual(self.parse('<*R-1.5>'), -1.5)
+        self.assertEqual(self.parse('<*D2008-08-02 05:25:50 -0130>'),
+                         datetime.datetime(2008, 8, 2, 6, 55, 50))
+        self.assertEqual(self.parse('<00 ff>'), '\x00\xff')
+
+    def test_containers(self):
+        self.assertEqual(self.parse('()'), [])
+        self.assertEqual(self.parse('{}'), {})
+        self.assertEqual(self.parse('(a, (b,), {c = d;},)'), ['a', ['b'], {'c': 'd'}])
+        self.assertEqual(self.parse('{a = {b = (c);}; "d" // comment\n = e ;}'),
+                         {'a': {'b': ['c']}, 'd': 'e'})
+
+    def test_invalid_plist(self):
+        for contents in ('(a b)', '(a,,)', '{a = b}', '{a b;}', '{(a) = b;}',
+                         '{a = b;', 'a b', '{} c = d;', '(a = b;)', '<*Bx>',
+                         '<0g>', '@', '"a" = ;', '(a; b = c)', '(a;)', '(a, b;)'):
+            self.assertRaises(PropertyListParseError, self.parse, contents)
+
+
+class ParseManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = [getPropertyListFilepath(name) for name in (
+            'elements.plist', 'elements_binary.plist', 'elements_ascii.plist',
+            'invalid_key.plist', 'nonexistent.plist', 'simple.plist')]
+
+    def assertResults(self, results):
+        expected = XmlPropertyListParser().parse(readPropertyListContents('elements.plist'))
+        self.assertEqual([path for path, plist in results], self.paths)
+        self.assertEqual([plist for path, plist in results[:3]], [expected] * 3)
+        self.assert_(isinstance(results[3][1], PropertyListParseError))
+        self.assert_(isinstance(results[4][1], PropertyListParseError))
+        self.assertEqual(results[5][1], {'item 1': 'Hello'})
+
+    def test_in_process(self):
+        self.assertResults(list(parse_many(self.paths, workers=1)))
+
+    def test_workers(self):
+        self.assertResults(list(parse_many(self.paths, workers=2, chunksize=1)))
+
+    def test_unordered(self):
+        results = list(parse_many(self.paths, workers=2, chunksize=2, ordered=False))
+        results.sort(key=lambda result: self.paths.index(result[0]))
+        self.assertResults(results)
+
+    def test_ascii_data(self):
+        # An old-style property list which starts with ``<`` of data
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'data.plist')
+            fout = open(path, 'wb')
+            try:
+                fout.write(' <0fbd77>\n')
+            finally:
+                fout.close()
+            self.assertEqual(list(parse_many([path], workers=1)), [(path, '\x0f\xbd\x77')])
+        finally:
+            shutil.rmtree(directory)
+
+
+class CachedPlistLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, value):
+        path = os.path.join(self.directory, name)
+        xmlout = open(path, 'wb')
+        try:
+            XmlPropertyListWriter().write(value, xmlout)
+        finally:
+            xmlout.close()
+        return path
+
+    def test_hits_and_misses(self):
+        loader = CachedPlistLoader()
+        path = self.write('a.plist', {'a': ['b']})
+        self.assertEqual(loader.load(path), {'a': ['b']})
+        self.assertEqual(loader.load(path), {'a': ['b']})
+        self.assertEqual(loader.load(os.path.join(self.directory, '.', 'a.plist')), {'a': ['b']})
+        self.assertEqual((loader.hits, loader.misses), (2, 1))
+        # size is changed
+        self.write('a.plist', {'a': ['bc']})
+        self.assertEqual(loader.load(path), {'a': ['bc']})
+        self.assertEqual((loader.hits, loader.misses, len(loader)), (2, 2, 1))
+
+    def test_hash_contents(self):
+        loader = CachedPlistLoader(hash_contents=True)
+        path = self.write('a.plist', ['a'])
+        st = os.stat(path)
+        self.assertEqual(loader.load(path), ['a'])
+        self.write('a.plist', ['b'])
+        os.utime(path, (st.st_atime, st.st_mtime))
+        self.assertEqual(loader.load(path), ['b'])
+        self.assertEqual(loader.misses, 2)
+
+    def test_copy_and_frozen(self):
+        path = self.write('a.plist', {'a': ['b']})
+        loader = CachedPlistLoader()
+        plist = loader.load(path)
+        plist['a'].append('c')
+        self.assertEqual(loader.load(path), {'a': ['b']})
+        self.assertEqual(type(loader.load(path)), dict)
+
+        loader = CachedPlistLoader(frozen=True)
+        plist = loader.load(path)
+        self.assert_(loader.load(path) is plist)
+        self.assert_(isinstance(plist, FrozenDict) and isinstance(plist['a'], FrozenList))
+        self.assertRaises(TypeError, plist.__setitem__, 'a', 1)
+        self.assertRaises(TypeError, plist['a'].append, 'c')
+        self.assertEqual(type(copy.deepcopy(plist)['a']), list)
+
+    def test_max_entries(self):
+        loader = CachedPlistLoader(max_entries=2)
+        paths = [self.write('%d.plist' % i, [i]) for i in range(3)]
+        loader.load(paths[0])
+        loader.load(paths[1])
+        loader.load(paths[0])
+        # evicts the least recently used paths[1]
+        loader.load(paths[2])
+        self.assertEqual(len(loader), 2)
+        loader.load(paths[0])
+        self.assertEqual(loader.hits, 2)
+        loader.load(paths[1])
+        self.assertEqual(loader.misses, 4)
+
+    def test_max_bytes(self):
+        small = self.write('small.plist', ['a'])
+        large = self.write('large.plist', ['a' * 1000] * 100)
+        loader = CachedPlistLoader(max_bytes=1000)
+        loader.load(large)
+        self.assertEqual((len(loader), loader.size), (0, 0))
+        loader.load(small)
+        self.assertEqual(len(loader), 1)
+        self.assert_(0 < loader.size <= 1000)
+        loader.clear()
+        self.assertEqual((len(loader), loader.size), (0, 0))
+
+
+class ParseAsyncTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            import asyncio
+        except ImportError:
+            import trollius as asyncio
+        self.asyncio = asyncio
+        self.loop = asyncio.new_event_loop()
+        self.contents = readPropertyListContents('elements.plist')
+        self.expected = XmlPropertyListParser().parse(self.contents)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def parse(self, xml_input, **options):
+        return self.loop.run_until_complete(
+            parse_async(xml_input, loop=self.loop, **options))
+
+    def test_string_and_file(self):
+        self.assertEqual(self.parse(self.contents), self.expected)
+        self.assertEqual(self.parse(StringIO(self.contents), chunk_size=100),
+                         self.expected)
+        self.assertEqual(self.parse(self.contents, offload=True), self.expected)
+
+    def test_stream_reader(self):
+        reader = self.asyncio.StreamReader(loop=self.loop)
+        for i in range(0, len(self.contents), 100):
+            self.loop.call_soon(reader.feed_data, self.contents[i:i + 100])
+        self.loop.call_soon(reader.feed_eof)
+        self.assertEqual(self.parse(reader, chunk_size=50), self.expected)
+
+    def test_loop_is_not_blocked(self):
+        ticks = []
+        def tick():
+            ticks.append(None)
+            if not parsed.done():
+                self.loop.call_soon(tick)
+        parsed = parse_async('<plist><array>%s</array></plist>' % (
+            '<string>a</string>' * 10000), loop=self.loop, budget=0.001)
+        self.loop.call_soon(tick)
+        self.assertEqual(self.loop.run_until_complete(parsed), ['a'] * 10000)
+        self.assert_(len(ticks) > 1)
+
+    def test_invalid_plist(self):
+        for offload in (False, True):
+            self.assertRaises(PropertyListParseError, self.parse,
+                              '<plist><dict><string/></dict></plist>', offload=offload)
+
+
 if __name__ == "__main__":
     loader = unittest.defaultTestLoader
     suite = unittest.TestSuite()
@@ -191,6 +1572,37 @@ if __name__ == "__main__":
         pass
     else:
         suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListEtreeParserTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListExpatParserTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListIterparseTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListSelectTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListLazyTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListPushParserTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListSidecarTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListParallelTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListInternTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListDateTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListDataTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListArraysTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListColumnsTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListStatsTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListLimitsTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListIndexTest))
+    suite.addTest(loader.loadTestsFromTestCase(XmlPropertyListWriterTest))
+    suite.addTest(loader.loadTestsFromTestCase(BinaryPropertyListParserTest))
+    suite.addTest(loader.loadTestsFromTestCase(BinaryPropertyListWriterTest))
+    suite.addTest(loader.loadTestsFromTestCase(AsciiPropertyListParserTest))
+    suite.addTest(loader.loadTestsFromTestCase(ParseManyTest))
+    suite.addTest(loader.loadTestsFromTestCase(CachedPlistLoaderTest))
+    try:
+        import asyncio
+    except ImportError:
+        try:
+            import trollius
+        except ImportError:
+            trollius = None
+        asyncio = trollius
+    if asyncio is not None:
+        suite.addTest(loader.loadTestsFromTestCase(ParseAsyncTest))
 
     runner = unittest.TextTestRunner(verbosity=1)
     result = runner.run(suite)
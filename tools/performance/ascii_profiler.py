@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#
+# Measure execution time of old-style ASCII Property List parsing,
+# compared with the XML property list of the same contents.
+#
+#   % python ascii_profiler.py [path to XML property list]
+#
+import os
+import sys
+import gc
+import time
+import re
+import binascii
+import datetime
+
+# From timeit module.
+if sys.platform == "win32":
+    # On Windows, the best timer is time.clock()
+    timer = time.clock
+else:
+    # On most other platforms the best timer is time.time()
+    timer = time.time
+
+def timeit(number, func):
+    elapsed = 0.0
+    for i in range(0, number):
+        gc.disable()
+        t = timer()
+        func()
+        elapsed += (timer() - t)
+        gc.enable()
+        gc.collect()
+    return elapsed
+
+# Make libraries visible
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from cStringIO import StringIO
+from plist_parser import XmlPropertyListParser, AsciiPropertyListParser
+
+
+PLIST_FILEPATH = os.path.expanduser('~/Music/iTunes/iTunes Music Library.xml')
+if len(sys.argv) > 1:
+    PLIST_FILEPATH = sys.argv[1]
+
+# number of pre-execution
+WARMUP_TIMES = 1
+REPEAT_TIMES = 5
+
+UNQUOTED_PATTERN = re.compile(r'^[\w$+/:.\-]+$')
+
+
+def to_ascii(plist, out):
+    """Write ``plist`` in old-style ASCII format with GNUstep extensions"""
+    if isinstance(plist, dict):
+        out.append('{')
+        for key, value in plist.iteritems():
+            to_ascii(key, out)
+            out.append(' = ')
+            to_ascii(value, out)
+            out.append(';\n')
+        out.append('}')
+    elif isinstance(plist, list):
+        out.append('(')
+        for i, value in enumerate(plist):
+            if i:
+                out.append(', ')
+            to_ascii(value, out)
+        out.append(')')
+    elif isinstance(plist, bool):
+        out.append(plist and '<*BY>' or '<*BN>')
+    elif isinstance(plist, (int, long)):
+        out.append('<*I%d>' % plist)
+    elif isinstance(plist, float):
+        out.append('<*R%r>' % plist)
+    elif isinstance(plist, datetime.datetime):
+        out.append(plist.strftime('<*D%Y-%m-%d %H:%M:%S +0000>'))
+    elif isinstance(plist, unicode):
+        out.append('"%s"' % plist.encode('utf-8').replace('\\', '\\\\').replace('"', '\\"'))
+    elif UNQUOTED_PATTERN.match(plist):
+        out.append(plist)
+    else:
+        try:
+            plist.decode('ascii')
+        except UnicodeError:
+            out.append('<%s>' % binascii.hexlify(plist))
+        else:
+            out.append('"%s"' % plist.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+# Read the property list contents in memory
+filein = open(PLIST_FILEPATH)
+try:
+    xml_bytes = filein.read()
+finally:
+    filein.close()
+
+out = []
+to_ascii(XmlPropertyListParser().parse(xml_bytes), out)
+ascii_bytes = ''.join(out)
+
+
+def parse_xml():
+    """plist_parser.XmlPropertyListParser"""
+    return XmlPropertyListParser().parse(StringIO(xml_bytes))
+
+def parse_ascii():
+    """plist_parser.AsciiPropertyListParser"""
+    return AsciiPropertyListParser().parse(StringIO(ascii_bytes))
+
+COMMANDS = [
+    parse_xml,
+    parse_ascii,
+]
+
+print "XML: %d bytes, ASCII: %d bytes" % (len(xml_bytes), len(ascii_bytes))
+for f in COMMANDS:
+    timeit(WARMUP_TIMES, f)
+    t = timeit(REPEAT_TIMES, f) / REPEAT_TIMES
+    print "%s: %.2f sec/pass" % (f.__doc__, t)
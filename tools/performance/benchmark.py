@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+#
+# Measure execution time of every XML Property List parsing engine on
+# synthetic property lists generated by ``corpus.py``, and report the
+# statistics as JSON. Unlike ``profiler.py``, it needs neither an iTunes
+# Library nor CoreFoundation, so it runs on any machine.
+#
+#   % python benchmark.py --shapes itunes,dates --size 5000 --repeat 20
+#
+# With ``--memory``, peak and retained memory of each engine are measured
+# in a new process (see ``memory.py``) too.
+#
+# To catch performance regressions, save a baseline, and compare later
+# runs with it. It exits with status 1 if the throughput or peak memory
+# of any engine on any shape is significantly worse than the threshold:
+#
+#   % python benchmark.py --memory --save-baseline baseline.json
+#   % python benchmark.py --memory --baseline baseline.json --threshold 0.1
+#
+# Engines and shapes are measured in turn over ``--rounds`` rounds, and
+# the medians of the rounds are compared, so that the drift of the machine
+# between rounds (CPU frequency, other processes) counts as noise instead
+# of being mistaken for a regression.
+#
+import os
+import sys
+import gc
+import time
+import math
+import platform
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# From timeit module.
+if sys.platform == "win32":
+    # On Windows, the best timer is time.clock()
+    timer = time.clock
+else:
+    # On most other platforms the best timer is time.time()
+    timer = time.time
+
+# Make libraries visible
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from cStringIO import StringIO
+import plistlib
+import corpus
+import memory
+from plist_parser import XmlPropertyListParser
+
+
+def parse_using_expat(contents):
+    """plist_parser with xml.parsers.expat"""
+    return XmlPropertyListParser()._parse_using_expat(StringIO(contents))
+
+def parse_using_etree(contents):
+    """plist_parser with xml.etree.cElementTree"""
+    return XmlPropertyListParser()._parse_using_etree(StringIO(contents))
+
+def parse_using_sax(contents):
+    """plist_parser with SAX parser"""
+    return XmlPropertyListParser()._parse_using_sax_parser(StringIO(contents))
+
+def parse_using_plistlib(contents):
+    """plistlib"""
+    return plistlib.readPlist(StringIO(contents))
+
+ENGINES = {
+    'expat': parse_using_expat,
+    'etree': parse_using_etree,
+    'sax': parse_using_sax,
+    'plistlib': parse_using_plistlib,
+}
+
+
+def percentile(sorted_values, p):
+    """Return the ``p`` percentile of ``sorted_values``, interpolated
+    between the closest ranks"""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100.0
+    f = int(math.floor(k))
+    c = min(f + 1, len(sorted_values) - 1)
+    return sorted_values[f] + (sorted_values[c] - sorted_values[f]) * (k - f)
+
+def summarize(timings, size):
+    """Return statistics of ``timings`` in seconds of parsing ``size`` bytes"""
+    values = sorted(timings)
+    n = len(values)
+    mean = sum(values) / n
+    if n > 1:
+        stdev = math.sqrt(sum([(v - mean) ** 2 for v in values]) / (n - 1))
+    else:
+        stdev = 0.0
+    median = percentile(values, 50)
+    return {
+        'runs': n,
+        'mean': mean,
+        'stdev': stdev,
+        'min': values[0],
+        'max': values[-1],
+        'median': median,
+        'p90': percentile(values, 90),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        # MB/s at the median
+        'throughput': size / median / (1024 * 1024),
+        'timings': timings,
+    }
+
+def measure(func, contents, warmup, repeat):
+    """Return the seconds of each run of ``func(contents)``"""
+    for i in range(warmup):
+        func(contents)
+    timings = []
+    for i in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            t = timer()
+            func(contents)
+            timings.append(timer() - t)
+        finally:
+            gc.enable()
+    return timings
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+# Two-sided 95% critical values of Student's t distribution by degrees
+# of freedom, and the normal distribution beyond them.
+T_95 = [None, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+        2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093,
+        2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045,
+        2.042]
+
+def slowdown_interval(baseline, current):
+    """Return the relative change of the mean time from ``baseline`` to
+    ``current`` medians of rounds, and its 95% confidence interval
+    (Welch's t)"""
+    def mean_var(values):
+        n = len(values)
+        mean = sum(values) / n
+        if n < 2:
+            return n, mean, 0.0
+        return n, mean, sum([(v - mean) ** 2 for v in values]) / (n - 1)
+    nb, mb, vb = mean_var(baseline)
+    nc, mc, vc = mean_var(current)
+    se2 = vb / nb + vc / nc
+    if se2 > 0 and nb > 1 and nc > 1:
+        df = se2 ** 2 / ((vb / nb) ** 2 / (nb - 1) + (vc / nc) ** 2 / (nc - 1))
+        t = T_95[min(max(int(df), 1), len(T_95) - 1)]
+        if df >= len(T_95):
+            t = 1.96
+    else:
+        t = 0.0
+    margin = t * math.sqrt(se2)
+    return (mc - mb) / mb, (mc - mb - margin) / mb, (mc - mb + margin) / mb
+
+def compare(baseline, report, threshold, memory_threshold, memory_floor=1024 * 1024):
+    """Compare ``report`` with ``baseline``, and return a list of the
+    comparisons of each engine on each shape. A comparison is regressed if
+    the time is slower than ``threshold`` even at the lower bound of the
+    confidence interval of the medians of rounds, and in every round of
+    ``report``, or the peak memory is more than ``memory_threshold`` (and
+    ``memory_floor`` bytes) larger."""
+    comparisons = []
+    for shape in report['corpus']['shapes']:
+        result = report['results'][shape]
+        base_result = baseline['results'].get(shape)
+        if base_result is None:
+            continue
+        for name, stats in sorted(result['engines'].items()):
+            base = base_result['engines'].get(name)
+            if base is None:
+                continue
+            # A baseline saved before rounds has only the timings.
+            base_rounds = base.get('rounds', base['timings'])
+            change, low, high = slowdown_interval(base_rounds, stats['rounds'])
+            base_median = percentile(sorted(base_rounds), 50)
+            limit = base_median * (1 + threshold)
+            comparisons.append({
+                'shape': shape, 'engine': name, 'metric': 'time',
+                'baseline': sum(base_rounds) / len(base_rounds),
+                'current': sum(stats['rounds']) / len(stats['rounds']),
+                'change': change, 'low': low, 'high': high,
+                'regressed': low > threshold and min(stats['rounds']) > limit,
+            })
+            if 'memory' in base and 'memory' in stats:
+                b, c = base['memory']['peak'], stats['memory']['peak']
+                comparisons.append({
+                    'shape': shape, 'engine': name, 'metric': 'peak',
+                    'baseline': b, 'current': c,
+                    'change': b and float(c - b) / b or 0.0,
+                    'regressed': c > b * (1 + memory_threshold) and c - b > memory_floor,
+                })
+    return comparisons
+
+def print_comparisons(comparisons, log):
+    for c in comparisons:
+        if c['metric'] == 'time':
+            line = '%-8s %-8s time %+6.1f%% (95%% CI %+.1f%% .. %+.1f%%)' % (
+                c['shape'], c['engine'], c['change'] * 100, c['low'] * 100, c['high'] * 100)
+        else:
+            line = '%-8s %-8s peak %+6.1f%% (%d -> %d bytes)' % (
+                c['shape'], c['engine'], c['change'] * 100, c['baseline'], c['current'])
+        if c['regressed']:
+            line += '  REGRESSED'
+        print >>log, line
+
+def measure_memory(name, contents):
+    """Return the memory of parsing ``contents`` with the engine ``name``"""
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix='.plist')
+    try:
+        fout = os.fdopen(fd, 'wb')
+        try:
+            fout.write(contents)
+        finally:
+            fout.close()
+        return memory.measure(name, path)
+    finally:
+        os.remove(path)
+
+def run(shapes, engines, size, seed, warmup, repeat, log=None, with_memory=False,
+        rounds=1):
+    """Benchmark ``engines`` on the corpus of ``shapes``, and return the
+    result as a dictionary. Every engine on every shape is measured
+    ``repeat`` times in each of ``rounds`` rounds, and the median of each
+    round is reported as ``rounds``."""
+    contents = {}
+    for shape in shapes:
+        contents[shape] = corpus.generate_xml(shape, size, seed)
+    timings = {}
+    for i in range(rounds):
+        for shape in shapes:
+            for name in engines:
+                values = measure(ENGINES[name], contents[shape], warmup, repeat)
+                timings.setdefault((shape, name), []).append(values)
+    results = {}
+    for shape in shapes:
+        result = results[shape] = {'bytes': len(contents[shape]), 'engines': {}}
+        for name in engines:
+            per_round = timings[(shape, name)]
+            values = []
+            for round_timings in per_round:
+                values.extend(round_timings)
+            stats = result['engines'][name] = summarize(values, len(contents[shape]))
+            stats['rounds'] = [percentile(sorted(v), 50) for v in per_round]
+            line = '%-8s %-8s median %.4f sec, %.2f MB/s' % (
+                shape, name, stats['median'], stats['throughput'])
+            if with_memory:
+                usage = stats['memory'] = measure_memory(name, contents[shape])
+                line += ', peak %.2f, retained %.2f bytes/byte' % (
+                    usage['peak_per_byte'], usage['retained_per_byte'])
+            if log is not None:
+                print >>log, line
+    return {
+        'environment': environment(),
+        'corpus': {'size': size, 'seed': seed, 'shapes': shapes},
+        'results': results,
+    }
+
+
+def main(argv):
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--shapes', default=','.join(corpus.SHAPES),
+                      help='comma separated shapes of the corpus [%default]')
+    parser.add_option('--engines', default=','.join(sorted(ENGINES)),
+                      help='comma separated engines to measure [%default]')
+    parser.add_option('--size', type='int', default=2000,
+                      help='size of each property list (see corpus.py) [%default]')
+    parser.add_option('--seed', type='int', default=0,
+                      help='seed of the corpus [%default]')
+    parser.add_option('--warmup', type='int', default=1,
+                      help='number of runs before measuring [%default]')
+    parser.add_option('--repeat', type='int', default=10,
+                      help='number of measured runs in each round [%default]')
+    parser.add_option('--rounds', type='int', default=5,
+                      help='number of rounds measuring every engine on every '
+                           'shape in turn [%default]')
+    parser.add_option('--memory', action='store_true', default=False,
+                      help='measure peak and retained memory too')
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help='write JSON to FILE instead of stdout')
+    parser.add_option('--save-baseline', metavar='FILE',
+                      help='write JSON to FILE as a baseline')
+    parser.add_option('--baseline', metavar='FILE',
+                      help='compare with the baseline FILE, and exit with status 1 '
+                           'if regressed (the corpus and engines of the baseline '
+                           'are used by default)')
+    parser.add_option('--threshold', type='float', default=0.10,
+                      help='allowed slowdown ratio of time [%default]')
+    parser.add_option('--memory-threshold', type='float', default=0.10,
+                      help='allowed increase ratio of peak memory [%default]')
+    options, args = parser.parse_args(argv[1:])
+
+    baseline = None
+    if options.baseline:
+        filein = open(options.baseline)
+        try:
+            baseline = json.load(filein)
+        finally:
+            filein.close()
+        # Measures the same corpus and engines unless specified.
+        defaults = parser.get_default_values()
+        if options.size == defaults.size:
+            options.size = baseline['corpus']['size']
+        if options.seed == defaults.seed:
+            options.seed = baseline['corpus']['seed']
+        if options.shapes == defaults.shapes:
+            # Keeps the order of the baseline.
+            options.shapes = ','.join(baseline['corpus'].get('shapes')
+                                      or sorted(baseline['results']))
+        if options.engines == defaults.engines:
+            names = {}
+            for result in baseline['results'].values():
+                names.update(result['engines'])
+            options.engines = ','.join(sorted(names))
+        if (options.size, options.seed) != (baseline['corpus']['size'], baseline['corpus']['seed']):
+            parser.error('the corpus differs from the baseline')
+        if not options.memory:
+            for result in baseline['results'].values():
+                for stats in result['engines'].values():
+                    options.memory = options.memory or 'memory' in stats
+
+    shapes = options.shapes.split(',')
+    engines = options.engines.split(',')
+    for shape in shapes:
+        if shape not in corpus.SHAPES:
+            parser.error('unknown shape: %s' % shape)
+    for engine in engines:
+        if engine not in ENGINES:
+            parser.error('unknown engine: %s' % engine)
+    if options.repeat < 1:
+        parser.error('--repeat must be positive')
+    if options.rounds < 1:
+        parser.error('--rounds must be positive')
+    if baseline is not None and options.rounds < 2:
+        parser.error('--rounds must be at least 2 to compare with a baseline')
+
+    report = run(shapes, engines, options.size, options.seed,
+                 options.warmup, options.repeat, sys.stderr, options.memory,
+                 options.rounds)
+    regressed = False
+    if baseline is not None:
+        if baseline['environment'] != report['environment']:
+            print >>sys.stderr, 'warning: the baseline was measured in another environment'
+        comparisons = report['comparisons'] = compare(
+            baseline, report, options.threshold, options.memory_threshold)
+        print_comparisons(comparisons, sys.stderr)
+        regressed = [c for c in comparisons if c['regressed']]
+
+    if options.save_baseline:
+        out = open(options.save_baseline, 'w')
+        try:
+            json.dump(report, out, indent=2, sort_keys=True)
+            out.write('\n')
+        finally:
+            out.close()
+    if options.output:
+        out = open(options.output, 'w')
+    elif options.save_baseline:
+        out = None
+    else:
+        out = sys.stdout
+    if out is not None:
+        try:
+            json.dump(report, out, indent=2, sort_keys=True)
+            out.write('\n')
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    if regressed:
+        print >>sys.stderr, '%d regression(s) beyond the threshold' % len(regressed)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#
+# Generate synthetic XML property lists for benchmarks. The same shape,
+# size and seed always generate the same contents, so numbers measured
+# on different machines are comparable.
+#
+#   % python corpus.py itunes 10000 > library.xml
+#
+# Shapes are:
+#
+#   wide    a dictionary of ``size`` keys with scalar values
+#   deep    ``size`` containers nested in chains of ``DEPTH``
+#   dates   an array of ``size`` dictionaries of dates
+#   data    an array of ``size`` data of up to ``DATA_SIZE`` bytes
+#   itunes  an iTunes Music Library like dictionary of ``size`` tracks
+#
+import os
+import sys
+import random
+import binascii
+import datetime
+
+# Make libraries visible
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from cStringIO import StringIO
+from plist_parser import XmlPropertyListWriter, DictItems
+
+
+SHAPES = ('wide', 'deep', 'dates', 'data', 'itunes')
+
+# Nesting depth of ``deep``
+DEPTH = 32
+# Maximum bytes of a ``<data>`` in ``data``
+DATA_SIZE = 16 * 1024
+
+WORDS = ('Love', 'Night', 'Blue', 'Road', 'Heart', 'Summer', 'Rain',
+         'Dream', 'Fire', 'Home', 'Song', 'River', u'\u65e5\u672c\u8a9e',
+         u'Caf\xe9', 'Girl', 'Moon', 'Light', 'Time', 'World', 'Day')
+KINDS = ('MPEG audio file', 'AAC audio file', 'Purchased AAC audio file',
+         'Apple Lossless audio file')
+EPOCH = datetime.datetime(2008, 8, 2, 5, 25, 50)
+
+
+def _words(random, count):
+    return u' '.join([random.choice(WORDS) for i in range(count)])
+
+def _date(random):
+    return EPOCH + datetime.timedelta(seconds=random.randrange(10 * 365 * 86400))
+
+def _bytes(random, size):
+    # Starts with a non-ASCII byte, or ``XmlPropertyListWriter`` writes
+    # it as a string.
+    if size < 2:
+        return '\xff' * size
+    return '\xff' + binascii.unhexlify('%0*x' % (size * 2 - 2, random.getrandbits(size * 8 - 8)))
+
+def _scalar(random):
+    kind = random.randrange(6)
+    if kind == 0:
+        return random.randrange(-2 ** 31, 2 ** 31)
+    elif kind == 1:
+        return random.random() * 1000
+    elif kind == 2:
+        return random.random() < 0.5
+    elif kind == 3:
+        return _date(random)
+    elif kind == 4:
+        return _words(random, random.randrange(1, 8))
+    return _bytes(random, random.randrange(1, 64))
+
+
+def generate_wide(random, size):
+    return DictItems([('Key %d' % i, _scalar(random)) for i in xrange(size)])
+
+def generate_deep(random, size):
+    chains = []
+    for i in xrange(0, size, DEPTH):
+        value = _scalar(random)
+        for depth in xrange(min(DEPTH, size - i)):
+            if depth % 2:
+                value = [value, _scalar(random)]
+            else:
+                value = {'Level': depth, 'Child': value}
+        chains.append(value)
+    return chains
+
+def generate_dates(random, size):
+    # Timestamps often repeat in real property lists
+    dates = [_date(random) for i in xrange(max(1, size // 4))]
+    return [{'Date Added': random.choice(dates),
+             'Date Modified': _date(random),
+             'Play Date UTC': random.choice(dates)} for i in xrange(size)]
+
+def generate_data(random, size):
+    return [_bytes(random, random.randrange(DATA_SIZE)) for i in xrange(size)]
+
+def generate_itunes(random, size):
+    tracks = []
+    for i in xrange(size):
+        track = [
+            ('Track ID', i),
+            ('Name', _words(random, random.randrange(1, 5))),
+            ('Artist', _words(random, 2)),
+            ('Album', _words(random, 3)),
+            ('Kind', random.choice(KINDS)),
+            ('Size', random.randrange(1000000, 20000000)),
+            ('Total Time', random.randrange(60000, 600000)),
+            ('Date Modified', _date(random)),
+            ('Date Added', _date(random)),
+            ('Bit Rate', random.choice((128, 192, 256, 320))),
+            ('Sample Rate', 44100),
+        ]
+        if random.random() < 0.7:
+            track.append(('Play Count', random.randrange(1, 100)))
+            track.append(('Play Date UTC', _date(random)))
+        if random.random() < 0.3:
+            track.append(('Rating', random.randrange(0, 101, 20)))
+        track.append(('Persistent ID', '%016X' % random.getrandbits(64)))
+        track.append(('Location', 'file://localhost/Music/%d.mp3' % i))
+        tracks.append(('%d' % i, dict(track)))
+    playlists = [{
+        'Name': _words(random, 2),
+        'Playlist ID': size + i,
+        'All Items': True,
+        'Playlist Items': [{'Track ID': random.randrange(size or 1)}
+                           for j in xrange(random.randrange(size // 10 + 1))],
+    } for i in xrange(10)]
+    return DictItems([
+        ('Major Version', 1),
+        ('Minor Version', 1),
+        ('Date', EPOCH),
+        ('Application Version', '7.7.1'),
+        ('Tracks', DictItems(tracks)),
+        ('Playlists', playlists),
+    ])
+
+
+def generate(shape, size, seed=0):
+    """Return a python object of ``shape``"""
+    if shape not in SHAPES:
+        raise ValueError('Unknown shape %r (one of %s)' % (shape, ', '.join(SHAPES)))
+    return globals()['generate_' + shape](random.Random(seed), size)
+
+def generate_xml(shape, size, seed=0):
+    """Return a XML property list of ``shape``, without DOCTYPE which
+    makes some parsers fetch the DTD"""
+    stream = StringIO()
+    XmlPropertyListWriter().write(generate(shape, size, seed), stream)
+    header, doctype, contents = stream.getvalue().split('\n', 2)
+    return header + '\n' + contents
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 4):
+        print >>sys.stderr, 'usage: %s (%s) size [seed]' % (sys.argv[0], '|'.join(SHAPES))
+        sys.exit(2)
+    sys.stdout.write(generate_xml(sys.argv[1], int(sys.argv[2]), int((sys.argv[3:] or [0])[0])))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#
+# Measure memory of parsing a XML Property List with an engine of
+# ``benchmark.py``. Each measurement runs in a new process, and the peak
+# RSS is reset before the parse where possible (Linux), so that the peak
+# RSS of the process is the peak of the parse:
+#
+#   % python memory.py expat library.xml
+#   {"peak": 41324544, "retained": 30932992, ...}
+#
+# ``peak`` is the increase of the peak RSS during the parse, which includes
+# the memory of ``xml.parsers.expat`` and other extensions. ``retained``
+# is the total size of the objects in the result. Both are in bytes.
+# ``tracemalloc`` is not available in Python 2, and freed memory is not
+# always returned to the system, so the RSS after the parse tells little
+# about the result.
+#
+import os
+import sys
+import gc
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+def current_rss():
+    """Return the current resident set size in bytes, or ``None``"""
+    try:
+        statm = open('/proc/self/statm')
+    except IOError:
+        return None
+    try:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    finally:
+        statm.close()
+
+def reset_peak_rss():
+    """Reset the peak resident set size to the current one, if possible
+    (Linux only). Return True if it is reset."""
+    try:
+        clear_refs = open('/proc/self/clear_refs', 'w')
+        try:
+            clear_refs.write('5')
+        finally:
+            clear_refs.close()
+    except IOError:
+        return False
+    return True
+
+def peak_rss():
+    """Return the peak resident set size of the process in bytes"""
+    try:
+        status = open('/proc/self/status')
+    except IOError:
+        pass
+    else:
+        try:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    # in kilobytes
+                    return int(line.split()[1]) * 1024
+        finally:
+            status.close()
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak
+    # in kilobytes
+    return peak * 1024
+
+def sizeof(plist):
+    """Return the total size of objects in ``plist`` in bytes, counting
+    shared objects once"""
+    seen = {}
+    total = 0
+    stack = [plist]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen[id(value)] = value
+        total += sys.getsizeof(value)
+        if isinstance(value, dict):
+            stack.extend(value.iterkeys())
+            stack.extend(value.itervalues())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        else:
+            # Wrappers, like ``plistlib.Data`` and ``plist_parser.Data``
+            if hasattr(value, '__dict__'):
+                stack.append(value.__dict__)
+            for name in getattr(type(value), '__slots__', ()):
+                stack.append(getattr(value, name, None))
+    return total
+
+
+def measure(engine, path):
+    """Return the memory of parsing the file ``path`` with ``engine``
+    as a dictionary, measured in a new process"""
+    import subprocess
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), engine, path],
+                             stdout=subprocess.PIPE)
+    output = child.communicate()[0]
+    if child.returncode != 0:
+        raise RuntimeError('Failed to measure memory of %s: exit status %d'
+                           % (engine, child.returncode))
+    return json.loads(output)
+
+
+def main(argv):
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+    from benchmark import ENGINES
+
+    engine, path = argv[1:]
+    parse = ENGINES[engine]
+    filein = open(path, 'rb')
+    try:
+        contents = filein.read()
+    finally:
+        filein.close()
+    gc.collect()
+    before = current_rss()
+    if not reset_peak_rss() or before is None:
+        # Nothing has taken more memory than now, hopefully.
+        before = peak_rss()
+    plist = parse(contents)
+    peak = peak_rss()
+
+    size = len(contents)
+    result = {'bytes': size, 'peak': max(0, peak - before), 'retained': sizeof(plist)}
+    result['peak_per_byte'] = float(result['peak']) / size
+    result['retained_per_byte'] = float(result['retained']) / size
+    json.dump(result, sys.stdout, sort_keys=True)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -81,12 +81,18 @@ def parse_using_plist_parser_etree():
     xmlin = StringIO(bytes)
     return XmlPropertyListParser()._parse_using_etree(xmlin)
 
+def parse_using_plist_parser_expat():
+    """plist_parser with xml.parsers.expat"""
+    xmlin = StringIO(bytes)
+    return XmlPropertyListParser()._parse_using_expat(xmlin)
+
 COMMANDS = [
     parse_using_etree,
     parse_using_cetree,
     parse_using_plistlib,
     parse_using_plist_parser_sax,
     parse_using_plist_parser_etree,
+    parse_using_plist_parser_expat,
 ]
 
 # Measure execution time of c implementation